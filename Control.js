@@ -60,77 +60,62 @@ function copyPassword(password) {
     });
 }
 
-// بيانات العينة لعدد المشتركين
-const dailyData = [5, 3, 4, 7, 6, 8, 10]; // عدد المشتركين في الأيام
-const monthlyData = [20, 30, 25, 35, 40, 50, 45]; // عدد المشتركين في الأشهر
-const yearlyData = [200, 250, 300, 350, 400, 450, 500]; // عدد المشتركين في السنوات
-
-const dailyCtx = document.getElementById('dailyChart').getContext('2d');
-new Chart(dailyCtx, {
-    type: 'line',
-    data: {
-        labels: ['الأحد', 'الإثنين', 'الثلاثاء', 'الأربعاء', 'الخميس', 'الجمعة', 'السبت'],
-        datasets: [{
-            label: 'عدد المشتركين اليومي',
-            data: dailyData,
-            borderColor: 'rgba(255, 99, 132, 1)',
-            fill: false
-        }]
-    },
-    options: {
-        responsive: true,
-        scales: {
-            y: {
-                beginAtZero: true
-            }
-        }
+// عدد المشتركين من جداول التجميع في الخادم
+function formatSignupLabel(period, bucket) {
+    if (period === 'day') {
+        return new Date(bucket + 'T00:00:00').toLocaleDateString('ar', { weekday: 'long' });
     }
-});
+    if (period === 'month') {
+        return new Date(bucket + '-01T00:00:00').toLocaleDateString('ar', { month: 'long' });
+    }
+    return bucket;
+}
 
-const monthlyCtx = document.getElementById('monthlyChart').getContext('2d');
-new Chart(monthlyCtx, {
-    type: 'bar',
-    data: {
-        labels: ['يناير', 'فبراير', 'مارس', 'أبريل', 'مايو', 'يونيو', 'يوليو'],
-        datasets: [{
-            label: 'عدد المشتركين الشهري',
-            data: monthlyData,
-            backgroundColor: 'rgba(54, 162, 235, 0.5)',
-            borderColor: 'rgba(54, 162, 235, 1)',
-            borderWidth: 1
-        }]
-    },
-    options: {
-        responsive: true,
-        scales: {
-            y: {
-                beginAtZero: true
-            }
-        }
+function loadSignupChart(canvasId, period, type, dataset) {
+    const canvas = document.getElementById(canvasId);
+    if (!canvas) {
+        return;
     }
+    fetch(`/admin/analytics/signups?period=${period}`)
+    .then(response => response.json())
+    .then(result => {
+        new Chart(canvas.getContext('2d'), {
+            type: type,
+            data: {
+                labels: result.labels.map(bucket => formatSignupLabel(period, bucket)),
+                datasets: [Object.assign({ data: result.data }, dataset)]
+            },
+            options: {
+                responsive: true,
+                scales: {
+                    y: {
+                        beginAtZero: true
+                    }
+                }
+            }
+        });
+    })
+    .catch(error => console.error('Error:', error));
+}
+
+loadSignupChart('dailyChart', 'day', 'line', {
+    label: 'عدد المشتركين اليومي',
+    borderColor: 'rgba(255, 99, 132, 1)',
+    fill: false
 });
 
-const yearlyCtx = document.getElementById('yearlyChart').getContext('2d');
-new Chart(yearlyCtx, {
-    type: 'bar',
-    data: {
-        labels: ['2021', '2022', '2023', '2024', '2025'],
-        datasets: [{
-            label: 'عدد المشتركين السنوي',
-            data: yearlyData,
-            backgroundColor: 'rgba(75, 192, 192, 0.5)',
-            borderColor: 'rgba(75, 192, 192, 1)',
-            borderWidth: 1
-        }]
-    },
-    options: {
-        responsive: true,
-        scales: {
-            y: {
-                beginAtZero: true
-            }
-        }
-    }
+loadSignupChart('monthlyChart', 'month', 'bar', {
+    label: 'عدد المشتركين الشهري',
+    backgroundColor: 'rgba(54, 162, 235, 0.5)',
+    borderColor: 'rgba(54, 162, 235, 1)',
+    borderWidth: 1
+});
+
+loadSignupChart('yearlyChart', 'year', 'bar', {
+    label: 'عدد المشتركين السنوي',
+    backgroundColor: 'rgba(75, 192, 192, 0.5)',
+    borderColor: 'rgba(75, 192, 192, 1)',
+    borderWidth: 1
 });
 
 //contantgroup
@@ -149,7 +134,32 @@ function refreshMessages() {
     scrollToBottom();
 }
 
-setInterval(refreshMessages, 5000);
+function appendMessage(message) {
+    const item = document.createElement('div');
+    item.className = 'message';
+    item.dataset.id = message.id;
+    const author = document.createElement('strong');
+    author.textContent = message.username + ': ';
+    const content = document.createElement('span');
+    content.textContent = message.content;
+    item.append(author, content);
+    messagesDiv.appendChild(item);
+    scrollToBottom();
+}
+
+// الرسائل الجديدة تصل عبر Server-Sent Events بدل إعادة تحميل الصفحة
+if (messagesDiv && window.EventSource) {
+    const lastId = messagesDiv.dataset.lastId || 0;
+    const messageSource = new EventSource(`/user/contantgroup/stream?last_id=${lastId}`);
+    messageSource.onmessage = function(event) {
+        const message = JSON.parse(event.data);
+        if (!messagesDiv.querySelector(`[data-id="${message.id}"]`)) {
+            appendMessage(message);
+        }
+    };
+} else {
+    setInterval(refreshMessages, 5000);
+}
 
 
 //courses
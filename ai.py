@@ -0,0 +1,272 @@
+from collections import OrderedDict
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from flask import Blueprint, Response, abort, current_app, jsonify, request, session, stream_with_context
+from search import normalize
+from auth import current_identity
+from instrumentation import span
+
+AI_API_URL = os.environ.get(
+    'AI_API_URL',
+    'https://generativelanguage.googleapis.com/v1beta/models/gemini-1.5-flash:generateContent')
+AI_API_KEY = os.environ.get('AI_API_KEY', '')
+CACHE_TTL = 3600
+CACHE_SIZE = 1024
+MAX_CONCURRENCY = 8
+TIMEOUT = 30.0
+
+_DONE = object()
+
+ai_bp = Blueprint('ai', __name__)
+
+def _retrieve(task):
+    # Marks a failure as seen when every waiter has gone.
+    if not task.cancelled():
+        task.exception()
+
+def prompt_key(prompt):
+    return hashlib.sha256(' '.join(normalize(prompt).split()).encode()).hexdigest()
+
+class AIService:
+    # Owns one event loop thread so the pooled client survives callers that use
+    # asyncio.run() per request.
+    def __init__(self, url=AI_API_URL, api_key=AI_API_KEY, cache_ttl=CACHE_TTL, cache_size=CACHE_SIZE,
+                 max_concurrency=MAX_CONCURRENCY, timeout=TIMEOUT, stream_url=None):
+        self.url = url
+        self.stream_url = stream_url or url.replace(':generateContent', ':streamGenerateContent')
+        self.api_key = api_key
+        self.cache_ttl = cache_ttl
+        self.cache_size = cache_size
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+        self._cache = OrderedDict()
+        self._in_flight = {}
+        self._loop = None
+        self._client = None
+        self._semaphore = None
+        self._start_lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.upstream_calls = 0
+        self.errors = 0
+        self.cancelled = 0
+
+    def _ensure_loop(self):
+        with self._start_lock:
+            if self._loop is None:
+                loop = asyncio.new_event_loop()
+                threading.Thread(target=loop.run_forever, name='ai-client', daemon=True).start()
+                self._loop = loop
+        return self._loop
+
+    async def _get_client(self):
+        if self._client is None:
+            # Imported on first use so starting the app does not pay for httpx.
+            import httpx
+            self._client = httpx.AsyncClient(
+                timeout=self.timeout,
+                limits=httpx.Limits(max_connections=self.max_concurrency,
+                                    max_keepalive_connections=self.max_concurrency))
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self._client
+
+    def _cached(self, key):
+        cached = self._cache.get(key)
+        if cached is not None:
+            expires, answer = cached
+            if expires > time.monotonic():
+                self._cache.move_to_end(key)
+                self.hits += 1
+                return answer
+            del self._cache[key]
+        return None
+
+    def _store(self, key, answer):
+        self._cache[key] = (time.monotonic() + self.cache_ttl, answer)
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    async def _ask(self, prompt):
+        key = prompt_key(prompt)
+        answer = self._cached(key)
+        if answer is not None:
+            return answer
+        task = self._in_flight.get(key)
+        if task is not None:
+            self.coalesced += 1
+        else:
+            self.misses += 1
+            # The fetch is its own task: a caller that is cancelled (the first one
+            # included) only stops waiting, and everyone else still gets the answer.
+            task = asyncio.get_running_loop().create_task(self._fetch_and_store(key, prompt))
+            task.add_done_callback(_retrieve)
+            self._in_flight[key] = task
+        return await asyncio.shield(task)
+
+    async def _fetch_and_store(self, key, prompt):
+        try:
+            answer = await self._fetch(prompt)
+        except Exception:
+            self.errors += 1
+            raise
+        finally:
+            del self._in_flight[key]
+        self._store(key, answer)
+        return answer
+
+    async def _fetch(self, prompt):
+        client = await self._get_client()
+        async with self._semaphore:
+            self.upstream_calls += 1
+            response = await client.post(
+                self.url,
+                params=self._params(),
+                json={'contents': [{'parts': [{'text': prompt}]}]})
+        response.raise_for_status()
+        return response.json()['candidates'][0]['content']['parts'][0]['text']
+
+    def _params(self, **params):
+        if self.api_key:
+            params['key'] = self.api_key
+        return params
+
+    async def _stream_into(self, prompt, emit):
+        # Runs on the service loop; emit() hands each text chunk to the consumer.
+        key = prompt_key(prompt)
+        answer = self._cached(key)
+        if answer is not None:
+            emit(answer)
+            return
+        self.misses += 1
+        client = await self._get_client()
+        parts = []
+        try:
+            async with self._semaphore:
+                self.upstream_calls += 1
+                async with client.stream('POST', self.stream_url, params=self._params(alt='sse'),
+                                         json={'contents': [{'parts': [{'text': prompt}]}]}) as response:
+                    response.raise_for_status()
+                    async for line in response.aiter_lines():
+                        if not line.startswith('data:'):
+                            continue
+                        candidate = json.loads(line[5:])['candidates'][0]
+                        text = ''.join(part.get('text', '') for part in candidate['content']['parts'])
+                        if text:
+                            parts.append(text)
+                            emit(text)
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        except Exception:
+            self.errors += 1
+            raise
+        self._store(key, ''.join(parts))
+
+    async def stream(self, prompt):
+        loop = asyncio.get_running_loop()
+        chunks = asyncio.Queue()
+
+        def put(item):
+            if not loop.is_closed():
+                loop.call_soon_threadsafe(chunks.put_nowait, item)
+
+        future = asyncio.run_coroutine_threadsafe(self._stream_into(prompt, put), self._ensure_loop())
+        future.add_done_callback(lambda _: put(_DONE))
+        try:
+            while True:
+                item = await chunks.get()
+                if item is _DONE:
+                    future.result()
+                    return
+                yield item
+        finally:
+            # Consumer went away (or finished): stop the upstream read as well.
+            future.cancel()
+
+    def stream_sync(self, prompt):
+        chunks = queue.Queue()
+        future = asyncio.run_coroutine_threadsafe(self._stream_into(prompt, chunks.put), self._ensure_loop())
+        future.add_done_callback(lambda _: chunks.put(_DONE))
+        try:
+            while True:
+                item = chunks.get()
+                if item is _DONE:
+                    future.result()
+                    return
+                yield item
+        finally:
+            future.cancel()
+
+    async def ask(self, prompt):
+        future = asyncio.run_coroutine_threadsafe(self._ask(prompt), self._ensure_loop())
+        return await asyncio.wrap_future(future)
+
+    def ask_sync(self, prompt):
+        return asyncio.run_coroutine_threadsafe(self._ask(prompt), self._ensure_loop()).result()
+
+    def clear_cache(self):
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._cache.clear)
+
+    def stats(self):
+        lookups = self.hits + self.misses + self.coalesced
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'coalesced': self.coalesced,
+            'upstream_calls': self.upstream_calls,
+            'errors': self.errors,
+            'cancelled': self.cancelled,
+            'hit_rate': (self.hits + self.coalesced) / lookups if lookups else 0.0,
+            'cached': len(self._cache),
+        }
+
+    def close(self):
+        if self._loop is None:
+            return
+        if self._client is not None:
+            asyncio.run_coroutine_threadsafe(self._client.aclose(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._loop = None
+        self._client = None
+        logging.info(f'AI client closed: {self.stats()}')
+
+ai_service = AIService()
+
+async def get_ai_response(user_input):
+    with span('http'):
+        return await ai_service.ask(user_input)
+
+@ai_bp.route('/api/ai/stream', methods=['GET', 'POST'])
+def ai_stream():
+    # Every stream spends upstream quota, so only signed-in users get one.
+    token = session.get('token')
+    if not token or current_identity(token, current_app.secret_key) is None:
+        abort(401)
+    prompt = request.values.get('message', '').strip()
+    if not prompt:
+        return jsonify({'success': False, 'error': 'الرسالة فارغة'}), 400
+
+    def generate():
+        # Werkzeug closes this generator when the client disconnects, which
+        # cancels the upstream request through stream_sync().
+        try:
+            for chunk in ai_service.stream_sync(prompt):
+                yield f"data: {json.dumps({'text': chunk}, ensure_ascii=False)}\n\n"
+        except Exception:
+            logging.exception('AI stream failed')
+            yield 'event: error\ndata: {}\n\n'
+            return
+        yield 'event: done\ndata: {}\n\n'
+
+    response = Response(stream_with_context(generate()), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
\ No newline at end of file
@@ -0,0 +1,96 @@
+from collections import Counter
+from datetime import datetime, timedelta
+import importlib
+import logging
+from flask import Blueprint, abort, current_app, jsonify, request, session
+from sqlalchemy import insert, update
+from model import db, User, SignupRollup
+from auth import current_identity
+
+PERIODS = {'day': '%Y-%m-%d', 'month': '%Y-%m', 'year': '%Y'}
+DEFAULT_BUCKETS = {'day': 7, 'month': 7, 'year': 5}
+MAX_BUCKETS = 366
+
+analytics_bp = Blueprint('analytics', __name__)
+
+def buckets_for(moment):
+    return {period: moment.strftime(fmt) for period, fmt in PERIODS.items()}
+
+def _add(period, bucket, delta):
+    dialect = db.engine.dialect.name
+    if dialect in ('sqlite', 'postgresql'):
+        # Only the dialect in use is imported; the postgresql one is slow to load.
+        dialect_insert = importlib.import_module(f'sqlalchemy.dialects.{dialect}').insert
+        statement = (dialect_insert(SignupRollup)
+                     .values(period=period, bucket=bucket, count=delta)
+                     .on_conflict_do_update(index_elements=['period', 'bucket'],
+                                            set_={'count': SignupRollup.count + delta}))
+        db.session.execute(statement)
+        return
+    result = db.session.execute(update(SignupRollup)
+                                .where(SignupRollup.period == period, SignupRollup.bucket == bucket)
+                                .values(count=SignupRollup.count + delta))
+    if result.rowcount == 0:
+        db.session.execute(insert(SignupRollup).values(period=period, bucket=bucket, count=delta))
+
+def record_signup(created_at, delta=1):
+    # Runs inside the caller's transaction so the rollup commits with the user row.
+    if created_at is None:
+        return
+    for period, bucket in buckets_for(created_at).items():
+        _add(period, bucket, delta)
+
+def record_signups(created_ats, delta=1):
+    # Bulk form: one upsert per bucket instead of three per user.
+    counts = Counter()
+    for created_at in created_ats:
+        if created_at is not None:
+            for period, bucket in buckets_for(created_at).items():
+                counts[(period, bucket)] += 1
+    for (period, bucket), count in counts.items():
+        _add(period, bucket, delta * count)
+
+def backfill_signups(batch_size=5000):
+    counts = Counter()
+    for (created_at,) in db.session.query(User.created_at).filter(User.created_at.isnot(None)).yield_per(batch_size):
+        for period, bucket in buckets_for(created_at).items():
+            counts[(period, bucket)] += 1
+    db.session.query(SignupRollup).delete()
+    if counts:
+        db.session.execute(insert(SignupRollup), [
+            {'period': period, 'bucket': bucket, 'count': count}
+            for (period, bucket), count in counts.items()])
+    db.session.commit()
+    logging.info(f'Signup rollups rebuilt: {len(counts)} buckets')
+    return len(counts)
+
+def _recent_buckets(period, limit, now):
+    if period == 'day':
+        return [(now - timedelta(days=i)).strftime(PERIODS['day']) for i in range(limit - 1, -1, -1)]
+    if period == 'month':
+        months = now.year * 12 + now.month - 1
+        return [f'{(m // 12):04d}-{(m % 12 + 1):02d}' for m in range(months - limit + 1, months + 1)]
+    return [f'{year:04d}' for year in range(now.year - limit + 1, now.year + 1)]
+
+def signup_series(period, limit=None, now=None):
+    limit = limit or DEFAULT_BUCKETS[period]
+    labels = _recent_buckets(period, limit, now or datetime.utcnow())
+    rows = dict(db.session.query(SignupRollup.bucket, SignupRollup.count)
+                .filter(SignupRollup.period == period,
+                        SignupRollup.bucket >= labels[0],
+                        SignupRollup.bucket <= labels[-1]))
+    return {'period': period, 'labels': labels, 'data': [rows.get(label, 0) for label in labels]}
+
+@analytics_bp.route('/admin/analytics/signups')
+def signups():
+    token = session.get('token')
+    identity = current_identity(token, current_app.secret_key) if token else None
+    if identity is None or not identity.is_admin:
+        abort(403)
+    period = request.args.get('period', 'day')
+    if period not in PERIODS:
+        return jsonify({'success': False, 'error': 'period غير صالح'}), 400
+    limit = request.args.get('limit', type=int)
+    if limit is not None:
+        limit = min(max(limit, 1), MAX_BUCKETS)
+    return jsonify(signup_series(period, limit))
\ No newline at end of file
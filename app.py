@@ -0,0 +1,18 @@
+import datetime
+import jwt
+from factory import create_app
+from model import db, User, Course, Message
+import auth
+from ai import get_ai_response
+
+__all__ = ['app', 'db', 'User', 'Course', 'Message', 'create_token', 'verify_token', 'get_ai_response']
+
+# Entry point for `flask --app app` and for code written against the old single-module app.
+app = create_app()
+
+def create_token(user_id, hours=24):
+    exp = datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(hours=hours)
+    return jwt.encode({'user_id': user_id, 'exp': exp}, app.secret_key, algorithm='HS256'), exp
+
+def verify_token(token):
+    return auth.verify_token(token, app.secret_key)
\ No newline at end of file
@@ -0,0 +1,175 @@
+from collections import OrderedDict, namedtuple
+import hashlib
+import threading
+import time
+from flask import Blueprint, current_app, g, has_request_context
+import jwt
+from model import db, User
+from versions import SharedVersion
+
+TOKEN_CACHE_SIZE = 10000
+# invalidate_user() reaches other workers through a shared version; this only
+# bounds how long a change written outside operations.py can go unnoticed.
+IDENTITY_TTL = 30
+EXPIRED_TOKEN = 'التوكن منتهي الصلاحية'
+INVALID_TOKEN = 'توكن غير صالح'
+
+Identity = namedtuple('Identity', ['id', 'username', 'is_admin'])
+
+auth_bp = Blueprint('auth', __name__)
+
+class _Entry:
+    __slots__ = ('payload', 'identity', 'identity_version', 'identity_expires', 'expires')
+
+    def __init__(self, payload, expires):
+        self.payload = payload
+        self.identity = None
+        self.identity_version = None
+        self.identity_expires = 0.0
+        self.expires = expires
+
+class TokenCache:
+    def __init__(self, maxsize=TOKEN_CACHE_SIZE, identity_ttl=IDENTITY_TTL):
+        self.maxsize = maxsize
+        self.identity_ttl = identity_ttl
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._by_user = {}
+        # Bumped whenever a user is demoted, promoted or deleted in any process; a
+        # cached identity only counts while it matches.
+        self.users_version = SharedVersion('users')
+        self.requests = 0
+        self.decodes = 0
+        self.decodes_saved = 0
+        self.user_lookups = 0
+        self.user_lookups_saved = 0
+
+    def _digest(self, token, secret):
+        # The secret is part of the key so rotating it drops every cached token.
+        return hashlib.sha256(f'{secret}.{token}'.encode()).hexdigest()
+
+    def _get(self, digest):
+        with self._lock:
+            entry = self._entries.get(digest)
+            if entry is None:
+                return None
+            if entry.expires <= time.time():
+                self._remove(digest)
+                return None
+            self._entries.move_to_end(digest)
+            return entry
+
+    def _remove(self, digest):
+        entry = self._entries.pop(digest, None)
+        if entry is not None:
+            user_id = entry.payload.get('user_id')
+            digests = self._by_user.get(user_id)
+            if digests is not None:
+                digests.discard(digest)
+                if not digests:
+                    del self._by_user[user_id]
+
+    def verify(self, token, secret):
+        digest = self._digest(token, secret)
+        entry = self._get(digest)
+        if entry is not None:
+            self._count('decodes_saved')
+            return dict(entry.payload)
+        self._count('decodes')
+        try:
+            payload = jwt.decode(token, secret, algorithms=['HS256'])
+        except jwt.ExpiredSignatureError:
+            return EXPIRED_TOKEN
+        except jwt.InvalidTokenError:
+            return INVALID_TOKEN
+        with self._lock:
+            self._entries[digest] = _Entry(payload, payload.get('exp', float('inf')))
+            self._by_user.setdefault(payload.get('user_id'), set()).add(digest)
+            while len(self._entries) > self.maxsize:
+                self._remove(next(iter(self._entries)))
+        return dict(payload)
+
+    def identity(self, token, secret):
+        payload = self.verify(token, secret)
+        if not isinstance(payload, dict):
+            return None
+        digest = self._digest(token, secret)
+        version = self.users_version.current()
+        entry = self._get(digest)
+        if entry is not None and entry.identity is not None and entry.identity_version == version and \
+                entry.identity_expires > time.monotonic():
+            self._count('user_lookups_saved')
+            return entry.identity
+        self._count('user_lookups')
+        row = (db.session.query(User.id, User.username, User.is_admin)
+               .filter(User.id == payload.get('user_id'))
+               .first())
+        if row is None:
+            return None
+        identity = Identity(row.id, row.username, bool(row.is_admin))
+        with self._lock:
+            # Only attach if the entry was not invalidated while we queried.
+            if entry is not None and self._entries.get(digest) is entry:
+                entry.identity = identity
+                entry.identity_version = version
+                entry.identity_expires = time.monotonic() + self.identity_ttl
+        return identity
+
+    def invalidate_user(self, user_id):
+        self.invalidate_users([user_id])
+
+    def invalidate_users(self, user_ids):
+        with self._lock:
+            for user_id in user_ids:
+                for digest in self._by_user.pop(user_id, ()):
+                    self._entries.pop(digest, None)
+        # Other workers drop every cached identity once they see the new version.
+        self.users_version.bump()
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._by_user.clear()
+
+    def _count(self, name):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+        if has_request_context():
+            g.auth_cache = getattr(g, 'auth_cache', {})
+            g.auth_cache[name] = g.auth_cache.get(name, 0) + 1
+
+    def record_request(self):
+        with self._lock:
+            self.requests += 1
+
+    def stats(self):
+        with self._lock:
+            requests = self.requests or 1
+            return {
+                'entries': len(self._entries),
+                'requests': self.requests,
+                'decodes': self.decodes,
+                'decodes_saved': self.decodes_saved,
+                'user_lookups': self.user_lookups,
+                'user_lookups_saved': self.user_lookups_saved,
+                'decodes_saved_per_request': self.decodes_saved / requests,
+                'user_lookups_saved_per_request': self.user_lookups_saved / requests,
+            }
+
+token_cache = TokenCache()
+
+def verify_token(token, secret):
+    return token_cache.verify(token, secret)
+
+def current_identity(token, secret):
+    return token_cache.identity(token, secret)
+
+@auth_bp.after_app_request
+def report_auth_cache(response):
+    counts = g.pop('auth_cache', None)
+    if counts:
+        token_cache.record_request()
+        if current_app.debug:
+            response.headers['X-Auth-Cache'] = ', '.join(f'{name}={value}'
+                                                          for name, value in sorted(counts.items()))
+    return response
\ No newline at end of file
@@ -0,0 +1,774 @@
+import argparse
+import datetime
+import json
+import logging
+import os
+import random
+import platform
+import resource
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from flask import Flask, abort, jsonify, request, session
+import jwt
+from sqlalchemy import insert
+from model import db, Course, Message
+
+WORDS = [
+    'برمجة', 'بايثون', 'تصميم', 'الواجهات', 'قواعد', 'البيانات', 'الذكاء', 'الاصطناعي',
+    'شبكات', 'أمن', 'المعلومات', 'تطوير', 'تطبيقات', 'الويب', 'الهواتف', 'تحليل',
+    'إحصاء', 'رياضيات', 'python', 'javascript', 'flask', 'sql', 'linux', 'cloud',
+]
+COURSE_TYPES = ['programming', 'design', 'data', 'security', 'mobile']
+
+BENCHMARKS = {}
+
+def benchmark(name):
+    def register(func):
+        BENCHMARKS[name] = func
+        return func
+    return register
+
+def make_app(path):
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{path}'
+    db.init_app(app)
+    return app
+
+def percentiles(samples):
+    ordered = sorted(samples)
+    def at(fraction):
+        return round(ordered[min(int(len(ordered) * fraction), len(ordered) - 1)] * 1000, 3)
+    return {'p50_ms': at(0.50), 'p95_ms': at(0.95), 'p99_ms': at(0.99)}
+
+def random_text(rng, words):
+    return ' '.join(rng.choice(WORDS) for _ in range(words))
+
+def seed_courses(count, batch_size=5000, seed=1):
+    rng = random.Random(seed)
+    for start in range(0, count, batch_size):
+        db.session.execute(insert(Course), [{
+            'title': random_text(rng, 4),
+            'description': random_text(rng, 30),
+            'course_type': rng.choice(COURSE_TYPES),
+            'course_link': f'course-{i}',
+        } for i in range(start, min(start + batch_size, count))])
+        db.session.commit()
+
+@benchmark('search')
+def bench_search(args):
+    from search import Fts5Backend, MemoryBackend, SearchIndex
+    rng = random.Random(2)
+    queries = [random_text(rng, rng.randint(1, 2)) for _ in range(args.queries)]
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        app = make_app(os.path.join(tmp, 'bench.db'))
+        with app.app_context():
+            db.create_all()
+            seed_courses(args.courses)
+            for backend in (Fts5Backend(), MemoryBackend()):
+                index = SearchIndex()
+                index.backend = backend
+                start = time.perf_counter()
+                index.rebuild()
+                build_seconds = time.perf_counter() - start
+                cold, warm = [], []
+                for samples in (cold, warm):
+                    for query in queries:
+                        start = time.perf_counter()
+                        index.search(query)
+                        samples.append(time.perf_counter() - start)
+                results[backend.name] = {
+                    'build_s': round(build_seconds, 2),
+                    'uncached': percentiles(cold),
+                    'cached': percentiles(warm),
+                }
+    return {'courses': args.courses, 'queries': args.queries, 'backends': results}
+
+def run_threads(count, target):
+    threads = [threading.Thread(target=target) for _ in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+@benchmark('counters')
+def bench_counters(args):
+    from counters import CounterBuffer
+    clicks = args.clicks
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        app = make_app(os.path.join(tmp, 'bench.db'))
+        with app.app_context():
+            db.create_all()
+            seed_courses(args.flush_rows)
+
+        def read_modify_write():
+            with app.app_context():
+                for i in range(clicks):
+                    course = db.session.get(Course, i % 10 + 1)
+                    course.likes = (course.likes or 0) + 1
+                    db.session.commit()
+
+        buffer = CounterBuffer()
+        buffer.start(app)
+
+        def buffered():
+            for i in range(clicks):
+                buffer.increment(Course, 'likes', i % 10 + 1)
+
+        for name, target in (('read_modify_write', read_modify_write), ('write_behind', buffered)):
+            with app.app_context():
+                db.session.query(Course).update({'likes': 0})
+                db.session.commit()
+            start = time.perf_counter()
+            run_threads(args.threads, target)
+            if name == 'write_behind':
+                # Includes the final drain so the comparison covers durable writes.
+                buffer.stop()
+            elapsed = time.perf_counter() - start
+            with app.app_context():
+                total = db.session.query(db.func.sum(Course.likes)).scalar()
+            results[name] = {
+                'seconds': round(elapsed, 3),
+                'clicks_per_s': round(args.threads * clicks / elapsed),
+                'stored': total,
+                'expected': args.threads * clicks,
+            }
+        results['write_behind'].update(buffer.stats())
+
+        # Flush path alone: one batched UPDATE over many distinct rows.
+        buffer = CounterBuffer(flush_interval=3600, flush_threshold=float('inf'))
+        buffer.start(app)
+        for row_id in range(1, args.flush_rows + 1):
+            buffer.increment(Course, 'likes', row_id)
+        with app.app_context():
+            start = time.perf_counter()
+            flushed = buffer.flush()
+            elapsed = time.perf_counter() - start
+        buffer.stop()
+        results['flush'] = {'rows': flushed, 'seconds': round(elapsed, 3),
+                            'rows_per_s': round(flushed / elapsed)}
+    return {'threads': args.threads, 'results': results}
+
+@benchmark('chat')
+def bench_chat(args):
+    # Real SSE connections against a local server: delivery latency, memory per
+    # connection and how many table reads each posted message costs.
+    import httpx
+    from unittest.mock import patch
+    from sqlalchemy import event
+    from werkzeug.serving import make_server
+    import chat
+    import operations
+    for name in ('werkzeug', 'httpx'):
+        logging.getLogger(name).setLevel(logging.WARNING)
+    received = []
+    lock = threading.Lock()
+    warmed = threading.Semaphore(0)
+    with tempfile.TemporaryDirectory() as tmp, patch('chat.HEARTBEAT_SECONDS', 1):
+        app = make_load_app(os.path.join(tmp, 'bench.db'))
+        with app.app_context():
+            db.create_all()
+            seed_data(1, 0, 0)
+        server = make_server('127.0.0.1', 0, app, threaded=True)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        http = httpx.Client(base_url=f'http://127.0.0.1:{server.server_port}', timeout=60,
+                            limits=httpx.Limits(max_connections=args.listeners + 1))
+        cookies = http.get('/bench/login/1').cookies
+
+        def listen():
+            seen = []
+            with http.stream('GET', '/user/contantgroup/stream', cookies=cookies) as response:
+                for line in response.iter_lines():
+                    if line.startswith('id:'):
+                        seen.append((int(line[3:]), time.perf_counter()))
+                        if len(seen) == 1:
+                            warmed.release()
+                        if len(seen) == args.messages + 1:
+                            break
+            with lock:
+                received.extend(seen)
+
+        rss_before = peak_rss_kb()
+        threads = [threading.Thread(target=listen) for _ in range(args.listeners)]
+        for thread in threads:
+            thread.start()
+        while chat.hub.stats()['subscribers'] < args.listeners:
+            time.sleep(0.01)
+        rss_after = peak_rss_kb()
+        sent = {}
+        selects = [0]
+
+        def count(connection, cursor, statement, *rest):
+            selects[0] += statement.lstrip().startswith('SELECT')
+
+        with app.app_context():
+            # A first message shows every listener has finished its catch-up read.
+            operations.add_message(1, 'warm up')
+            for _ in threads:
+                warmed.acquire(timeout=60)
+            event.listen(db.engine, 'before_cursor_execute', count)
+            start = time.perf_counter()
+            for i in range(args.messages):
+                posted = time.perf_counter()
+                operations.add_message(1, f'رسالة {i}')
+                sent[db.session.query(db.func.max(Message.id)).scalar()] = posted
+                time.sleep(args.interval)
+            for thread in threads:
+                thread.join()
+            elapsed = time.perf_counter() - start
+            event.remove(db.engine, 'before_cursor_execute', count)
+        http.close()
+        server.shutdown()
+    latencies = [at - sent[message_id] for message_id, at in received if message_id in sent]
+    stats = chat.hub.stats()
+    return {
+        'listeners': args.listeners,
+        'messages': args.messages,
+        'deliveries': len(latencies),
+        'deliveries_per_s': round(len(latencies) / elapsed),
+        'latency': percentiles(latencies),
+        # Each message also runs one max(id) lookup for the timing above.
+        'selects_per_message': round(selects[0] / args.messages - 1, 2),
+        'rss_kb_per_listener': round((rss_after - rss_before) / args.listeners, 1),
+        'overflows': stats['overflows'],
+    }
+
+@benchmark('login')
+def bench_login(args):
+    from werkzeug.security import check_password_hash, generate_password_hash
+    from hashing import HashingBusy, HashingService
+    stored = generate_password_hash('testpass')
+    cores = os.cpu_count() or 1
+    results = {}
+
+    def measure(verify):
+        done, rejected = [0], [0]
+        lock = threading.Lock()
+
+        def worker():
+            for _ in range(args.logins):
+                try:
+                    verify(stored, 'testpass')
+                    outcome = done
+                except HashingBusy:
+                    outcome = rejected
+                with lock:
+                    outcome[0] += 1
+
+        start = time.perf_counter()
+        run_threads(args.threads, worker)
+        elapsed = time.perf_counter() - start
+        return {'logins_per_s': round(done[0] / elapsed, 1),
+                'logins_per_s_per_core': round(done[0] / elapsed / cores, 1),
+                'rejected': rejected[0]}
+
+    results['request_thread'] = measure(check_password_hash)
+    service = HashingService(workers=cores)
+    service.verify(stored, 'warm up the pool')
+    results['process_pool'] = measure(service.verify)
+    service.shutdown()
+    return {'cores': cores, 'threads': args.threads, 'logins_per_thread': args.logins, 'results': results}
+
+SECRET = 'benchmark-secret-key-with-enough-length'
+
+def peak_rss_kb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+def make_token(user_id):
+    exp = datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(hours=1)
+    return jwt.encode({'user_id': user_id, 'exp': exp}, SECRET, algorithm='HS256')
+
+def time_calls(func, iterations):
+    samples = []
+    started = time.perf_counter()
+    for i in range(iterations):
+        start = time.perf_counter()
+        func(i)
+        samples.append(time.perf_counter() - start)
+    elapsed = time.perf_counter() - started
+    return dict(percentiles(samples), ops_per_s=round(iterations / elapsed, 1))
+
+def seed_data(users, courses, messages, seed=1):
+    # Goes through operations so seeding exercises the same side effects as the app.
+    import operations
+    from hashing import HashingService
+    rng = random.Random(seed)
+    saved = operations.hashing_service
+    # Seeding is not what we measure; a cheap hash keeps large user counts practical.
+    operations.hashing_service = HashingService(workers=0, method='pbkdf2:sha256:1000')
+    try:
+        for i in range(users):
+            operations.register_user(f'user{i}', f'user{i}@example.com', 'testpass')
+    finally:
+        operations.hashing_service = saved
+    for i in range(courses):
+        operations.add_course(random_text(rng, 4), random_text(rng, 30), f'course{i}.jpg',
+                              rng.choice(COURSE_TYPES), f'course-{i}')
+    for _ in range(messages):
+        operations.add_message(rng.randint(1, max(users, 1)), random_text(rng, 12))
+
+@benchmark('micro')
+def bench_micro(args):
+    import operations
+    from auth import TokenCache
+    rng = random.Random(3)
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        app = make_app(os.path.join(tmp, 'bench.db'))
+        with app.app_context():
+            db.create_all()
+            start = time.perf_counter()
+            seed_data(args.users, args.seed_courses, args.seed_messages)
+            seed_seconds = time.perf_counter() - start
+            iterations = args.iterations
+
+            results['get_courses_by_type'] = time_calls(
+                lambda _: operations.get_courses_by_type(operations.get_all_courses()), iterations)
+            results['get_catalog_cached'] = time_calls(lambda _: operations.get_catalog(), iterations)
+            results['add_message'] = time_calls(
+                lambda _: operations.add_message(rng.randint(1, args.users), random_text(rng, 12)), iterations)
+            results['register_user'] = time_calls(
+                lambda i: operations.register_user(f'bench{i}', f'bench{i}@example.com', 'testpass'),
+                args.registrations)
+
+            tokens = [make_token(rng.randint(1, args.users)) for _ in range(iterations)]
+            results['verify_token_decode'] = time_calls(
+                lambda i: jwt.decode(tokens[i], SECRET, algorithms=['HS256']), iterations)
+            cache = TokenCache()
+            for token in tokens:
+                cache.verify(token, SECRET)
+            results['verify_token_cached'] = time_calls(lambda i: cache.verify(tokens[i], SECRET), iterations)
+    return {
+        'seed': {'users': args.users, 'courses': args.seed_courses, 'messages': args.seed_messages,
+                 'seconds': round(seed_seconds, 2)},
+        'iterations': args.iterations,
+        'results': results,
+        'peak_rss_kb': peak_rss_kb(),
+    }
+
+def make_load_app(path):
+    from auth import auth_bp
+    from catalog import catalog_bp
+    from chat import chat_bp
+    from search import search_bp
+    app = make_app(path)
+    app.secret_key = SECRET
+    for blueprint in (auth_bp, catalog_bp, chat_bp, search_bp):
+        app.register_blueprint(blueprint)
+
+    @app.route('/bench/login/<int:user_id>')
+    def bench_login(user_id):
+        session['token'] = make_token(user_id)
+        return 'ok'
+
+    # The app is API-only now; these stand in for the old homepage and login form.
+    @app.route('/bench/home')
+    def bench_home():
+        import operations
+        return jsonify({course_type: [row.title for row in rows]
+                        for course_type, rows in operations.get_catalog().items()})
+
+    @app.route('/bench/login', methods=['POST'])
+    def bench_password_login():
+        import operations
+        user = operations.authenticate(request.form['username'], request.form['password'])
+        if user is None:
+            abort(401)
+        session['token'] = make_token(user.id)
+        return 'ok'
+
+    return app
+
+def login_task(http, rng, users):
+    number = rng.randrange(users)
+    return http.post('/bench/login', data={'username': f'user{number}', 'password': 'testpass'})
+
+# The old Locust WebsiteUser weighted login 3, the homepage 1 and the course list 2.
+# Filtered listings, search and chat history are the endpoints added since.
+LOAD_TASKS = [
+    ('homepage', 1, lambda http, rng, users: http.get('/bench/home')),
+    ('login', 3, login_task),
+    ('courses', 2, lambda http, rng, users: http.get('/api/courses?limit=20')),
+    ('courses_by_type', 2, lambda http, rng, users: http.get(
+        f'/api/courses?course_type={rng.choice(COURSE_TYPES)}&limit=20')),
+    ('search', 3, lambda http, rng, users: http.get(f'/api/search?q={rng.choice(WORDS)}')),
+    ('messages', 1, lambda http, rng, users: http.get('/api/messages?limit=50')),
+]
+
+@benchmark('load')
+def bench_load(args):
+    import httpx
+    from werkzeug.serving import make_server
+    # Per-request access logs would dominate the run.
+    for name in ('werkzeug', 'httpx'):
+        logging.getLogger(name).setLevel(logging.WARNING)
+    with tempfile.TemporaryDirectory() as tmp:
+        app = make_load_app(os.path.join(tmp, 'bench.db'))
+        with app.app_context():
+            db.create_all()
+            seed_data(args.users, args.seed_courses, args.seed_messages)
+        server = make_server('127.0.0.1', 0, app, threaded=True)
+        server_thread = threading.Thread(target=server.serve_forever, daemon=True)
+        server_thread.start()
+        base_url = f'http://127.0.0.1:{server.server_port}'
+        names = [name for name, _, _ in LOAD_TASKS]
+        weights = [weight for _, weight, _ in LOAD_TASKS]
+        tasks = {name: task for name, _, task in LOAD_TASKS}
+        samples = {name: [] for name in names}
+        errors = [0]
+        lock = threading.Lock()
+        deadline = time.perf_counter() + args.duration
+
+        def client(number):
+            rng = random.Random(number)
+            local = {name: [] for name in names}
+            failed = 0
+            with httpx.Client(base_url=base_url, timeout=30) as http:
+                http.get(f'/bench/login/{number % args.users + 1}')
+                while time.perf_counter() < deadline:
+                    name = rng.choices(names, weights)[0]
+                    start = time.perf_counter()
+                    try:
+                        ok = tasks[name](http, rng, args.users).status_code == 200
+                    except httpx.HTTPError:
+                        ok = False
+                    local[name].append(time.perf_counter() - start)
+                    failed += not ok
+            with lock:
+                for name in names:
+                    samples[name].extend(local[name])
+                errors[0] += failed
+
+        start = time.perf_counter()
+        threads = [threading.Thread(target=client, args=(i,)) for i in range(args.clients)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - start
+        server.shutdown()
+    everything = [sample for name in names for sample in samples[name]]
+    return {
+        'clients': args.clients,
+        'duration_s': args.duration,
+        'requests': len(everything),
+        'errors': errors[0],
+        'requests_per_s': round(len(everything) / elapsed, 1),
+        'latency': percentiles(everything),
+        'endpoints': {name: dict(percentiles(samples[name]), requests=len(samples[name]))
+                      for name in names if samples[name]},
+        'peak_rss_kb': peak_rss_kb(),
+    }
+
+@benchmark('ai')
+def bench_ai(args):
+    # Repeated prompts through the cached, coalescing client against a local stub
+    # with a fixed delay; the latency tests used to assert on lives here instead.
+    import asyncio
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+    from ai import AIService
+    delay = args.upstream_ms / 1000
+
+    class Upstream(BaseHTTPRequestHandler):
+        def do_POST(self):
+            body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+            time.sleep(delay)
+            payload = json.dumps({'candidates': [{'content': {'parts': [
+                {'text': body['contents'][0]['parts'][0]['text']}]}}]}).encode()
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, *args):
+            pass
+
+    class Server(ThreadingHTTPServer):
+        request_queue_size = 128  # the default of 5 adds 1s SYN retries under a burst
+
+    server = Server(('127.0.0.1', 0), Upstream)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    service = AIService(url=f'http://127.0.0.1:{server.server_port}/generate', api_key='')
+    prompts = [f'سؤال {i % args.distinct_prompts}' for i in range(args.queries)]
+    latencies = []
+
+    async def one(prompt):
+        start = time.perf_counter()
+        await service.ask(prompt)
+        latencies.append(time.perf_counter() - start)
+
+    async def run():
+        await asyncio.gather(*(one(prompt) for prompt in prompts))
+
+    try:
+        service.ask_sync('warm up')
+        asyncio.run(run())
+        stats = service.stats()
+    finally:
+        service.close()
+        server.shutdown()
+    return {
+        'requests': len(prompts),
+        'upstream_ms': args.upstream_ms,
+        'upstream_calls': stats['upstream_calls'] - 1,
+        'hit_rate': round(stats['hit_rate'], 3),
+        'latency': percentiles(latencies),
+    }
+
+@benchmark('suite')
+def bench_suite(args):
+    return {'micro': bench_micro(args), 'load': bench_load(args), 'peak_rss_kb': peak_rss_kb()}
+
+@benchmark('storage')
+def bench_storage(args):
+    from sqlalchemy.exc import OperationalError
+    from storage import Storage
+    results = {}
+    # {} keeps SQLite's defaults (rollback journal, FULL sync, no shared read path).
+    for name, pragmas in (('default', {}), ('tuned', None)):
+        with tempfile.TemporaryDirectory() as tmp:
+            app = Flask(__name__)
+            app.config['DATABASE_PATH'] = os.path.join(tmp, 'bench.db')
+            store = Storage()
+            store.init_app(app, pragmas)
+            with app.app_context():
+                db.create_all()
+                seed_courses(args.flush_rows)
+            samples = {'write': [], 'read': []}
+            errors = {'write': 0, 'read': 0}
+            lock = threading.Lock()
+            deadline = time.perf_counter() + args.duration
+
+            def writer(number):
+                rng = random.Random(number)
+                local, failed = [], 0
+                with app.app_context():
+                    while time.perf_counter() < deadline:
+                        start = time.perf_counter()
+                        try:
+                            db.session.add(Message(user_id=1, content=random_text(rng, 12)))
+                            db.session.query(Course).filter_by(id=rng.randint(1, args.flush_rows)).update(
+                                {Course.likes: db.func.coalesce(Course.likes, 0) + 1})
+                            db.session.commit()
+                        except OperationalError:
+                            db.session.rollback()
+                            failed += 1
+                        local.append(time.perf_counter() - start)
+                with lock:
+                    samples['write'].extend(local)
+                    errors['write'] += failed
+
+            def reader(number):
+                rng = random.Random(number)
+                local, failed = [], 0
+                with app.app_context():
+                    while time.perf_counter() < deadline:
+                        start = time.perf_counter()
+                        try:
+                            with store.read_session() as session:
+                                session.query(Course.id, Course.title).filter_by(
+                                    course_type=rng.choice(COURSE_TYPES)).limit(20).all()
+                                session.query(db.func.count(Message.id)).scalar()
+                                session.rollback()
+                        except OperationalError:
+                            failed += 1
+                        local.append(time.perf_counter() - start)
+                    db.session.remove()
+                with lock:
+                    samples['read'].extend(local)
+                    errors['read'] += failed
+
+            threads = ([threading.Thread(target=writer, args=(i,)) for i in range(args.writers)] +
+                       [threading.Thread(target=reader, args=(i,)) for i in range(args.readers)])
+            start = time.perf_counter()
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            elapsed = time.perf_counter() - start
+            with app.app_context():
+                settings = store.stats()
+                db.engine.dispose()
+            store.dispose()
+            results[name] = {
+                'journal_mode': settings.get('journal_mode'),
+                'synchronous': settings.get('synchronous'),
+                'writes_per_s': round(len(samples['write']) / elapsed, 1),
+                'reads_per_s': round(len(samples['read']) / elapsed, 1),
+                'write_latency': percentiles(samples['write']) if samples['write'] else {},
+                'read_latency': percentiles(samples['read']) if samples['read'] else {},
+                'write_errors': errors['write'],
+                'read_errors': errors['read'],
+            }
+    return {'writers': args.writers, 'readers': args.readers, 'duration_s': args.duration, 'results': results}
+
+# Runs in a fresh interpreter so every import is paid again, as on a new worker.
+STARTUP_SCRIPT = """
+import json, sys, time
+start = time.perf_counter()
+import factory
+imported = time.perf_counter()
+app = factory.create_app()
+created = time.perf_counter()
+status = app.test_client().get('/api/courses?limit=20').status_code
+served = time.perf_counter()
+print(json.dumps({'import_ms': (imported - start) * 1000, 'create_app_ms': (created - imported) * 1000,
+                  'first_request_ms': (served - created) * 1000, 'status': status,
+                  'modules': sorted(sys.modules)}))
+"""
+# Optional integrations that must only load when used.
+LAZY_MODULES = ('httpx', 'PIL', 'googleapiclient', 'locust')
+
+def parse_importtime(stderr):
+    # Lines look like "import time:   self |   cumulative |   name"; indentation is depth.
+    entries = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        own, cumulative, name = line[len('import time:'):].split('|')
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        entries.append((depth, name.strip(), int(own), int(cumulative)))
+    return entries
+
+def factory_imports(entries):
+    # Children are printed before their parent, so collect depth-1 lines until factory closes them.
+    children = []
+    for depth, name, own, cumulative in entries:
+        if depth == 0:
+            if name == 'factory':
+                return children
+            children = []
+        elif depth == 1:
+            children.append((name, cumulative))
+    return []
+
+@benchmark('startup')
+def bench_startup(args):
+    import statistics
+    import subprocess
+    here = os.path.dirname(os.path.abspath(__file__))
+    runs = []
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'bench.db')
+        app = make_app(path)
+        with app.app_context():
+            db.create_all()
+        env = dict(os.environ, DATABASE_PATH=path, SECRET_KEY=SECRET, THUMBNAIL_DIR=tmp)
+        for _ in range(args.runs):
+            start = time.perf_counter()
+            process = subprocess.run([sys.executable, '-X', 'importtime', '-c', STARTUP_SCRIPT],
+                                     cwd=here, env=env, capture_output=True, text=True, check=True)
+            wall = time.perf_counter() - start
+            timings = json.loads(process.stdout.strip().splitlines()[-1])
+            timings['process_ms'] = wall * 1000
+            timings['entries'] = parse_importtime(process.stderr)
+            runs.append(timings)
+    def median(key):
+        return round(statistics.median(run[key] for run in runs), 1)
+    last = runs[-1]
+    modules = {}
+    for name, cumulative in factory_imports(last['entries']):
+        modules[name] = round(cumulative / 1000, 1)
+    slowest = dict(sorted(modules.items(), key=lambda item: -item[1])[:args.top])
+    cold_start_ms = median('import_ms') + median('create_app_ms') + median('first_request_ms')
+    violations = [f'{name} imported at startup' for name in LAZY_MODULES if name in last['modules']]
+    if last['status'] != 200:
+        violations.append(f'first request returned {last["status"]}')
+    if args.budget_ms and cold_start_ms > args.budget_ms:
+        violations.append(f'cold start {cold_start_ms:.1f}ms over budget {args.budget_ms}ms')
+    return {
+        'runs': args.runs,
+        'import_ms': median('import_ms'),
+        'create_app_ms': median('create_app_ms'),
+        'first_request_ms': median('first_request_ms'),
+        'cold_start_ms': round(cold_start_ms, 1),
+        'process_ms': median('process_ms'),
+        'modules_loaded': len(last['modules']),
+        'slowest_imports_ms': slowest,
+        'budget_ms': args.budget_ms,
+        'violations': violations,
+    }
+
+def flatten(results, prefix=''):
+    for key, value in results.items():
+        path = f'{prefix}{key}'
+        if isinstance(value, dict):
+            yield from flatten(value, path + '.')
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            yield path, value
+
+def compare(results, baseline, tolerance):
+    # Latency and memory regress upwards, throughput downwards; everything else is context.
+    current = dict(flatten(results))
+    regressions = []
+    for path, before in flatten(baseline):
+        after = current.get(path)
+        if after is None or not before:
+            continue
+        if path.endswith(('_ms', 'rss_kb')) and after > before * (1 + tolerance):
+            regressions.append(f'{path}: {before} -> {after}')
+        elif path.endswith('_per_s') and after < before * (1 - tolerance):
+            regressions.append(f'{path}: {before} -> {after}')
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description='Performance benchmarks')
+    parser.add_argument('name', choices=sorted(BENCHMARKS))
+    parser.add_argument('--courses', type=int, default=100000)
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--clicks', type=int, default=500)
+    parser.add_argument('--flush-rows', type=int, default=10000)
+    parser.add_argument('--listeners', type=int, default=1000)
+    parser.add_argument('--messages', type=int, default=50)
+    parser.add_argument('--interval', type=float, default=0.02)
+    parser.add_argument('--logins', type=int, default=10)
+    parser.add_argument('--users', type=int, default=200)
+    parser.add_argument('--seed-courses', type=int, default=1000)
+    parser.add_argument('--seed-messages', type=int, default=2000)
+    parser.add_argument('--iterations', type=int, default=500)
+    parser.add_argument('--registrations', type=int, default=20)
+    parser.add_argument('--clients', type=int, default=16)
+    parser.add_argument('--duration', type=float, default=10.0)
+    parser.add_argument('--writers', type=int, default=4)
+    parser.add_argument('--readers', type=int, default=8)
+    parser.add_argument('--distinct-prompts', type=int, default=10)
+    parser.add_argument('--upstream-ms', type=float, default=50)
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--top', type=int, default=15)
+    parser.add_argument('--budget-ms', type=float, help='fail when the startup cold start exceeds this')
+    parser.add_argument('--output', help='write the results to this JSON file')
+    parser.add_argument('--baseline', help='compare against results saved with --output')
+    parser.add_argument('--tolerance', type=float, default=0.25)
+    args = parser.parse_args()
+    results = BENCHMARKS[args.name](args)
+    report = {
+        'benchmark': args.name,
+        'python': platform.python_version(),
+        'cpus': os.cpu_count(),
+        'results': results,
+    }
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline['results'], args.tolerance)
+        for regression in regressions:
+            print(f'REGRESSION {regression}', file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+    for violation in results.get('violations', []):
+        print(f'BUDGET {violation}', file=sys.stderr)
+    if results.get('violations'):
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
\ No newline at end of file
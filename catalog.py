@@ -0,0 +1,185 @@
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from datetime import datetime
+from itertools import groupby
+from types import MappingProxyType
+import json
+import threading
+import time
+from flask import Blueprint, Response, jsonify, request, stream_with_context
+from sqlalchemy import and_, or_
+from model import db, Course
+from storage import storage
+from versions import SharedVersion
+
+# Only the columns the catalog pages render; avoids building full ORM objects.
+CATALOG_COLUMNS = (
+    Course.id,
+    Course.title,
+    Course.description,
+    Course.image_url,
+    Course.course_type,
+    Course.course_link,
+    Course.price,
+    Course.is_featured,
+    Course.created_at,
+)
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+STREAM_BATCH_SIZE = 500
+
+catalog_bp = Blueprint('catalog', __name__)
+
+class CatalogCache:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        # (version, snapshot); the version is shared through the database so a
+        # change made in another process also retires this snapshot.
+        self._snapshot = None
+        self._generation = 0
+        self.version = SharedVersion('catalog')
+        self.hits = 0
+        self.misses = 0
+        self.rebuilds = 0
+        self.last_rebuild_seconds = 0.0
+        self.total_rebuild_seconds = 0.0
+
+    def get_courses_by_type(self):
+        version = self.version.current()
+        cached = self._snapshot
+        if cached is not None and cached[0] == version:
+            self._count_hit()
+            return cached[1]
+        with self._lock:
+            # Another request may have rebuilt while we waited for the lock.
+            cached = self._snapshot
+            if cached is not None and cached[0] == version:
+                self._count_hit()
+                return cached[1]
+            generation = self._generation
+            start = time.perf_counter()
+            snapshot = self._build()
+            elapsed = time.perf_counter() - start
+            if generation == self._generation:
+                self._snapshot = (version, snapshot)
+            with self._stats_lock:
+                self.misses += 1
+                self.rebuilds += 1
+                self.last_rebuild_seconds = elapsed
+                self.total_rebuild_seconds += elapsed
+            return snapshot
+
+    def invalidate(self):
+        self._generation += 1
+        self._snapshot = None
+        self.version.bump()
+
+    def stats(self):
+        with self._stats_lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'rebuilds': self.rebuilds,
+                'last_rebuild_ms': self.last_rebuild_seconds * 1000,
+                'total_rebuild_ms': self.total_rebuild_seconds * 1000,
+                'cached': self._snapshot is not None,
+            }
+
+    def _count_hit(self):
+        with self._stats_lock:
+            self.hits += 1
+
+    def _build(self):
+        rows = (db.session.query(*CATALOG_COLUMNS)
+                .order_by(Course.course_type, Course.id)
+                .all())
+        grouped = {course_type: tuple(group)
+                   for course_type, group in groupby(rows, key=lambda row: row.course_type)}
+        return MappingProxyType(grouped)
+
+catalog = CatalogCache()
+
+def encode_cursor(timestamp, row_id):
+    raw = f'{timestamp.isoformat()}|{row_id}'.encode()
+    return urlsafe_b64encode(raw).decode().rstrip('=')
+
+def decode_cursor(cursor):
+    try:
+        raw = urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        timestamp, row_id = raw.split('|')
+        return datetime.fromisoformat(timestamp), int(row_id)
+    except (ValueError, UnicodeDecodeError):
+        raise ValueError('cursor غير صالح')
+
+def course_to_dict(row):
+    return {
+        'id': row.id,
+        'title': row.title,
+        'description': row.description,
+        'image_url': row.image_url,
+        'course_type': row.course_type,
+        'course_link': row.course_link,
+        'price': row.price,
+        'is_featured': bool(row.is_featured),
+        'created_at': row.created_at.isoformat() if row.created_at else None,
+    }
+
+def list_courses(limit=DEFAULT_PAGE_SIZE, cursor=None, course_type=None, is_featured=None, session=None):
+    # Newest first; the cursor points at the last row of the previous page.
+    query = (session or db.session).query(*CATALOG_COLUMNS)
+    if course_type is not None:
+        query = query.filter(Course.course_type == course_type)
+    if is_featured is not None:
+        query = query.filter(Course.is_featured == is_featured)
+    if cursor is not None:
+        created_at, course_id = decode_cursor(cursor)
+        query = query.filter(or_(Course.created_at < created_at,
+                                 and_(Course.created_at == created_at, Course.id < course_id)))
+    rows = query.order_by(Course.created_at.desc(), Course.id.desc()).limit(limit + 1).all()
+    next_cursor = None
+    if len(rows) > limit:
+        next_cursor = encode_cursor(rows[limit - 1].created_at, rows[limit - 1].id)
+    return rows[:limit], next_cursor
+
+def iter_courses(course_type=None, is_featured=None, batch_size=STREAM_BATCH_SIZE):
+    cursor = None
+    with storage.read_session() as session:
+        while True:
+            rows, cursor = list_courses(batch_size, cursor, course_type, is_featured, session)
+            yield from rows
+            if cursor is None:
+                return
+
+def _listing_filters():
+    featured = request.args.get('featured')
+    if featured is not None:
+        featured = featured.lower() in ('1', 'true', 'yes')
+    return request.args.get('course_type') or None, featured
+
+@catalog_bp.route('/api/courses')
+def courses_page():
+    course_type, featured = _listing_filters()
+    limit = min(max(request.args.get('limit', DEFAULT_PAGE_SIZE, type=int), 1), MAX_PAGE_SIZE)
+    try:
+        rows, next_cursor = list_courses(limit, request.args.get('cursor'), course_type, featured)
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    return jsonify({'courses': [course_to_dict(row) for row in rows], 'next_cursor': next_cursor})
+
+@catalog_bp.route('/api/courses/stream')
+def courses_stream():
+    course_type, featured = _listing_filters()
+    rows = iter_courses(course_type, featured)
+    if request.args.get('format') == 'json':
+        def generate():
+            yield '{"courses": ['
+            for i, row in enumerate(rows):
+                yield (',' if i else '') + json.dumps(course_to_dict(row), ensure_ascii=False)
+            yield ']}'
+        return Response(stream_with_context(generate()), mimetype='application/json')
+
+    def generate_ndjson():
+        for row in rows:
+            yield json.dumps(course_to_dict(row), ensure_ascii=False) + '\n'
+    return Response(stream_with_context(generate_ndjson()), mimetype='application/x-ndjson')
\ No newline at end of file
@@ -0,0 +1,218 @@
+import json
+import logging
+import queue
+import threading
+from flask import Blueprint, Response, abort, current_app, jsonify, request, session, stream_with_context
+from sqlalchemy import and_, delete, insert, or_, select
+from sqlalchemy.orm import contains_eager
+from model import db, User, Message, MessageArchive
+from catalog import decode_cursor, encode_cursor
+from auth import current_identity
+
+QUEUE_SIZE = 100
+HEARTBEAT_SECONDS = 15
+CATCH_UP_BATCH = 200
+HISTORY_PAGE_SIZE = 50
+MAX_HISTORY_PAGE_SIZE = 200
+ARCHIVE_BATCH_SIZE = 1000
+
+chat_bp = Blueprint('chat', __name__)
+
+class Subscription:
+    __slots__ = ('queue', 'lagging')
+
+    def __init__(self, size):
+        self.queue = queue.Queue(size)
+        # A new listener starts by reading the table rather than the queue.
+        self.lagging = True
+
+class ChatHub:
+    # publish() reads the new rows once and hands the same dicts to every listener,
+    # so a posted message costs one query however many streams are open.
+    def __init__(self, queue_size=QUEUE_SIZE):
+        self.queue_size = queue_size
+        self._lock = threading.Lock()
+        self._read_lock = threading.Lock()
+        self._subscribers = set()
+        self.last_id = None
+        self.published = 0
+        self.reads = 0
+        self.overflows = 0
+
+    def subscribe(self):
+        subscription = Subscription(self.queue_size)
+        with self._read_lock:
+            if self.last_id is None:
+                self.last_id = db.session.query(db.func.max(Message.id)).scalar() or 0
+            with self._lock:
+                self._subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscribers.discard(subscription)
+
+    def publish(self):
+        # Called after a message is committed. SQLite has a single writer, so ids
+        # commit in order and reading past last_id never skips a message.
+        with self._read_lock:
+            with self._lock:
+                subscribers = list(self._subscribers)
+                self.published += 1
+            if not subscribers:
+                # Nobody is listening; the next subscriber starts from the table again.
+                self.last_id = None
+                return
+            while True:
+                batch = messages_after(self.last_id)
+                self.reads += 1
+                if batch:
+                    self.last_id = batch[-1]['id']
+                # Fanning out under the read lock keeps every queue in id order.
+                for message in batch:
+                    for subscription in subscribers:
+                        self._offer(subscription, message)
+                if len(batch) < CATCH_UP_BATCH:
+                    break
+
+    def _offer(self, subscription, message):
+        if subscription.lagging:
+            return
+        try:
+            subscription.queue.put_nowait(message)
+        except queue.Full:
+            # Slow reader: stop queueing for it until it has re-read the table.
+            subscription.lagging = True
+            with self._lock:
+                self.overflows += 1
+
+    def stats(self):
+        with self._lock:
+            return {'subscribers': len(self._subscribers), 'published': self.published,
+                    'reads': self.reads, 'overflows': self.overflows}
+
+hub = ChatHub()
+
+def message_to_dict(message, username):
+    return {
+        'id': message.id,
+        'user_id': message.user_id,
+        'username': username,
+        'content': message.content,
+        'timestamp': message.timestamp.isoformat() if message.timestamp else None,
+    }
+
+def messages_after(last_id, limit=CATCH_UP_BATCH):
+    rows = (db.session.query(Message, User.username)
+            .join(User, User.id == Message.user_id)
+            .filter(Message.id > last_id)
+            .order_by(Message.id)
+            .limit(limit)
+            .all())
+    return [message_to_dict(message, username) for message, username in rows]
+
+def _history_page(model, limit, before):
+    # Authors come from the same query, so rendering message.user costs nothing extra.
+    query = (model.query
+             .join(User, User.id == model.user_id)
+             .options(contains_eager(model.user)))
+    if before is not None:
+        timestamp, message_id = decode_cursor(before)
+        query = query.filter(or_(model.timestamp < timestamp,
+                                 and_(model.timestamp == timestamp, model.id < message_id)))
+    return query.order_by(model.timestamp.desc(), model.id.desc()).limit(limit).all()
+
+def message_history(limit=HISTORY_PAGE_SIZE, before=None, include_archive=False):
+    # Returns the newest `limit` messages older than `before`, oldest first,
+    # and a cursor for the page before them.
+    messages = _history_page(Message, limit + 1, before)
+    if include_archive and len(messages) <= limit:
+        # Archived rows are all older than anything left in the hot table.
+        messages += _history_page(MessageArchive, limit + 1 - len(messages), before)
+    next_cursor = None
+    if len(messages) > limit:
+        messages = messages[:limit]
+        next_cursor = encode_cursor(messages[-1].timestamp, messages[-1].id)
+    messages.reverse()
+    return messages, next_cursor
+
+def archive_messages(older_than, batch_size=ARCHIVE_BATCH_SIZE):
+    moved = 0
+    columns = ('id', 'user_id', 'content', 'timestamp')
+    while True:
+        ids = [message_id for (message_id,) in
+               db.session.query(Message.id)
+               .filter(Message.timestamp < older_than)
+               .order_by(Message.id)
+               .limit(batch_size)]
+        if not ids:
+            break
+        # One short transaction per batch so writers are never blocked for long.
+        db.session.execute(insert(MessageArchive).from_select(
+            columns, select(*(getattr(Message, column) for column in columns)).where(Message.id.in_(ids))))
+        db.session.execute(delete(Message).where(Message.id.in_(ids)))
+        db.session.commit()
+        moved += len(ids)
+    logging.info(f'Archived {moved} messages older than {older_than}')
+    return moved
+
+def _event(message):
+    return f"id: {message['id']}\ndata: {json.dumps(message, ensure_ascii=False)}\n\n"
+
+def stream_messages(last_id):
+    # Subscribing before the first read means nothing committed in between is missed;
+    # anything both read here and queued by the hub is dropped by id.
+    subscription = hub.subscribe()
+    try:
+        while True:
+            if subscription.lagging:
+                # Catching up, or the queue overflowed: only this listener goes to the table.
+                subscription.lagging = False
+                while True:
+                    batch = messages_after(last_id)
+                    db.session.remove()
+                    for message in batch:
+                        last_id = message['id']
+                        yield _event(message)
+                    if len(batch) < CATCH_UP_BATCH:
+                        break
+            try:
+                message = subscription.queue.get(timeout=HEARTBEAT_SECONDS)
+            except queue.Empty:
+                yield ': keep-alive\n\n'
+                continue
+            if message['id'] > last_id:
+                last_id = message['id']
+                yield _event(message)
+    finally:
+        hub.unsubscribe(subscription)
+
+@chat_bp.route('/user/contantgroup/stream')
+def contantgroup_stream():
+    # An expired token or a deleted account must not keep reading the group.
+    token = session.get('token')
+    if not token or current_identity(token, current_app.secret_key) is None:
+        abort(401)
+    last_id = request.headers.get('Last-Event-ID', type=int)
+    if last_id is None:
+        last_id = request.args.get('last_id', 0, type=int)
+    response = Response(stream_with_context(stream_messages(last_id)), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+@chat_bp.route('/api/messages')
+def messages_page():
+    token = session.get('token')
+    if not token or current_identity(token, current_app.secret_key) is None:
+        abort(401)
+    limit = min(max(request.args.get('limit', HISTORY_PAGE_SIZE, type=int), 1), MAX_HISTORY_PAGE_SIZE)
+    include_archive = request.args.get('archive') in ('1', 'true')
+    try:
+        messages, next_cursor = message_history(limit, request.args.get('before'), include_archive)
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    return jsonify({
+        'messages': [message_to_dict(message, message.user.username) for message in messages],
+        'next_cursor': next_cursor,
+    })
\ No newline at end of file
@@ -0,0 +1,128 @@
+from collections import defaultdict
+import atexit
+import logging
+import threading
+import time
+from sqlalchemy import bindparam, update
+from model import db
+
+FLUSH_INTERVAL = 1.0
+FLUSH_THRESHOLD = 500
+
+class CounterBuffer:
+    def __init__(self, flush_interval=FLUSH_INTERVAL, flush_threshold=FLUSH_THRESHOLD):
+        self.flush_interval = flush_interval
+        self.flush_threshold = flush_threshold
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._pending = defaultdict(int)
+        self._in_flight = {}
+        self._pending_total = 0
+        self._wake = threading.Event()
+        self._stopping = False
+        self._thread = None
+        self._app = None
+        self.increments = 0
+        self.flushes = 0
+        self.rows_flushed = 0
+        self.last_flush_seconds = 0.0
+
+    def start(self, app):
+        if self._thread is not None:
+            return
+        self._app = app
+        self._stopping = False
+        self._thread = threading.Thread(target=self._run, name='counter-flush', daemon=True)
+        self._thread.start()
+        atexit.register(self.stop)
+
+    def stop(self):
+        if self._thread is None:
+            return
+        self._stopping = True
+        self._wake.set()
+        self._thread.join()
+        self._thread = None
+        # Anything added after the worker's last pass.
+        with self._app.app_context():
+            self.flush()
+
+    def increment(self, model, column, row_id, amount=1):
+        with self._lock:
+            self._pending[(model, column, row_id)] += amount
+            self._pending_total += 1
+            self.increments += 1
+            full = self._pending_total >= self.flush_threshold
+        if self._thread is None:
+            # No worker running (tests, scripts): behave like a plain write-through.
+            self.flush()
+        elif full:
+            self._wake.set()
+
+    def pending(self, model, column, row_id):
+        key = (model, column, row_id)
+        with self._lock:
+            return self._pending.get(key, 0) + self._in_flight.get(key, 0)
+
+    def value(self, model, column, row_id):
+        # Pending deltas are read first so a concurrent flush can only make us over-count
+        # transiently, never lose the acting user's own click.
+        pending = self.pending(model, column, row_id)
+        stored = db.session.query(getattr(model, column)).filter(model.id == row_id).scalar()
+        return (stored or 0) + pending
+
+    def flush(self):
+        with self._flush_lock:
+            with self._lock:
+                if not self._pending:
+                    return 0
+                batch, self._pending = self._pending, defaultdict(int)
+                self._in_flight = batch
+                self._pending_total = 0
+            start = time.perf_counter()
+            grouped = defaultdict(list)
+            for (model, column, row_id), amount in batch.items():
+                if amount:
+                    grouped[(model, column)].append({'row_id': row_id, 'amount': amount})
+            try:
+                for (model, column), params in grouped.items():
+                    table = model.__table__
+                    statement = (update(table)
+                                 .where(table.c.id == bindparam('row_id'))
+                                 .values({column: db.func.coalesce(table.c[column], 0) + bindparam('amount')}))
+                    db.session.execute(statement, params)
+                db.session.commit()
+            except Exception:
+                db.session.rollback()
+                with self._lock:
+                    for key, amount in batch.items():
+                        self._pending[key] += amount
+                        self._pending_total += 1
+                    self._in_flight = {}
+                logging.exception('Counter flush failed, will retry')
+                return 0
+            with self._lock:
+                self._in_flight = {}
+                self.flushes += 1
+                self.rows_flushed += len(batch)
+                self.last_flush_seconds = time.perf_counter() - start
+            return len(batch)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'increments': self.increments,
+                'flushes': self.flushes,
+                'rows_flushed': self.rows_flushed,
+                'pending': len(self._pending),
+                'last_flush_ms': self.last_flush_seconds * 1000,
+            }
+
+    def _run(self):
+        while not self._stopping:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            with self._app.app_context():
+                self.flush()
+
+counters = CounterBuffer()
\ No newline at end of file
@@ -0,0 +1,142 @@
+import json
+import logging
+import os
+import threading
+import click
+from flask import Flask
+from model import reset_database
+from storage import storage
+from catalog import catalog_bp
+from search import search_bp, search_index
+from chat import chat_bp
+from ai import ai_bp
+from auth import auth_bp
+from analytics import analytics_bp, backfill_signups
+from thumbnails import thumbnails_bp, thumbnail_service
+from pagecache import page_cache
+from instrumentation import instrumentation
+from counters import counters
+from jobs import job_queue
+from youtube import youtube_stats
+
+BLUEPRINTS = (catalog_bp, search_bp, chat_bp, ai_bp, auth_bp, analytics_bp, thumbnails_bp)
+
+def create_app(config=None):
+    # Builds the app without touching the database or starting threads; schema creation
+    # is the init-db command and background services start on the first request.
+    app = Flask(__name__)
+    app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY')
+    if config:
+        app.config.update(config)
+    if not app.config['SECRET_KEY']:
+        # A per-process key logs users out on every restart and differs between workers.
+        if not (app.debug or app.testing):
+            raise RuntimeError('SECRET_KEY is not set')
+        logging.warning('SECRET_KEY not set; using a random key, sessions will not survive a restart')
+        app.config['SECRET_KEY'] = os.urandom(32).hex()
+    storage.init_app(app)
+    for blueprint in BLUEPRINTS:
+        app.register_blueprint(blueprint)
+    page_cache.init_app(app)
+    instrumentation.init_app(app)
+    thumbnail_service.init_app(app)
+    youtube_stats.init_app(app)
+    _lazy_services(app)
+    _register_commands(app)
+    return app
+
+def _lazy_services(app):
+    started = threading.Event()
+    lock = threading.Lock()
+
+    @app.before_request
+    def start_services():
+        if started.is_set() or app.testing:
+            return
+        with lock:
+            if started.is_set():
+                return
+            start_background_services(app)
+            started.set()
+
+def start_background_services(app):
+    counters.start(app)
+    job_queue.start(app)
+    if os.environ.get('YOUTUBE_API_KEY'):
+        youtube_stats.start(app)
+    logging.info('Background services started')
+
+def _register_commands(app):
+    @app.cli.command('init-db')
+    def init_db():
+        """Create missing tables and indexes."""
+        reset_database(app)
+        print('Database ready.')
+
+    @app.cli.command('backfill-signups')
+    def backfill_signups_command():
+        """Rebuild the signup rollups from the users table."""
+        with app.app_context():
+            print(f'{backfill_signups()} buckets rebuilt.')
+
+    @app.cli.command('rebuild-search')
+    def rebuild_search():
+        """Rebuild the course search index."""
+        with app.app_context():
+            search_index.rebuild()
+        print('Search index rebuilt.')
+
+    def print_progress(report):
+        # One JSON line per committed chunk, so a long purge can be followed or piped.
+        print(json.dumps(report.as_dict()), flush=True)
+
+    def read_ids(user_ids, ids_file):
+        ids = list(user_ids)
+        if ids_file is not None:
+            ids += [int(line) for line in ids_file if line.strip()]
+        if not ids:
+            raise click.UsageError('No user ids given.')
+        return ids
+
+    @app.cli.command('delete-users')
+    @click.argument('user_ids', nargs=-1, type=int)
+    @click.option('--ids-file', type=click.File(), help='File with one user id per line.')
+    @click.option('--chunk-size', type=int, default=1000)
+    @click.option('--pause', type=float, default=0.0, help='Seconds to wait between chunks.')
+    def delete_users_command(user_ids, ids_file, chunk_size, pause):
+        """Delete accounts and their messages in short transactions."""
+        import operations
+        with app.app_context():
+            report = operations.delete_users(read_ids(user_ids, ids_file), chunk_size=chunk_size,
+                                             on_progress=print_progress, pause=pause)
+        print(f'{report.done} users and {report.dependent_rows} messages deleted.')
+
+    @app.cli.command('set-admin')
+    @click.argument('user_ids', nargs=-1, type=int)
+    @click.option('--ids-file', type=click.File(), help='File with one user id per line.')
+    @click.option('--revoke', is_flag=True, help='Remove admin rights instead of granting them.')
+    @click.option('--chunk-size', type=int, default=1000)
+    def set_admin_command(user_ids, ids_file, revoke, chunk_size):
+        """Grant or revoke admin rights for many users."""
+        import operations
+        with app.app_context():
+            report = operations.set_admin_many(read_ids(user_ids, ids_file), not revoke, chunk_size=chunk_size,
+                                               on_progress=print_progress)
+        print(f'{report.done} users updated.')
+
+    @app.cli.command('purge-messages')
+    @click.option('--user', 'user_ids', type=int, multiple=True, help='Only messages by this user.')
+    @click.option('--before', type=click.DateTime(), help='Only messages older than this.')
+    @click.option('--after', type=click.DateTime(), help='Only messages from this time on.')
+    @click.option('--keep-archive', is_flag=True, help='Leave archived messages alone.')
+    @click.option('--chunk-size', type=int, default=1000)
+    @click.option('--pause', type=float, default=0.0, help='Seconds to wait between chunks.')
+    def purge_messages_command(user_ids, before, after, keep_archive, chunk_size, pause):
+        """Delete messages matching the filters in short transactions."""
+        import operations
+        if not (user_ids or before or after):
+            raise click.UsageError('Give at least one of --user, --before or --after.')
+        with app.app_context():
+            report = operations.purge_messages(user_ids or None, before, after, not keep_archive,
+                                               chunk_size=chunk_size, on_progress=print_progress, pause=pause)
+        print(f'{report.done} messages deleted.')
\ No newline at end of file
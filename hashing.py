@@ -0,0 +1,88 @@
+from concurrent.futures import ProcessPoolExecutor, TimeoutError
+import atexit
+import os
+import threading
+from werkzeug.security import check_password_hash, generate_password_hash
+
+HASH_METHOD = os.environ.get('PASSWORD_HASH_METHOD', 'scrypt')
+HASH_WORKERS = int(os.environ.get('PASSWORD_HASH_WORKERS', os.cpu_count() or 1))
+HASH_TIMEOUT = 10.0
+
+class HashingBusy(Exception):
+    pass
+
+class HashingService:
+    def __init__(self, workers=HASH_WORKERS, max_pending=None, method=HASH_METHOD, timeout=HASH_TIMEOUT):
+        # workers=0 hashes on the calling thread (tests, scripts).
+        self.workers = workers
+        self.max_pending = max_pending or max(workers, 1) * 4
+        self.method = method
+        self.timeout = timeout
+        self._slots = threading.BoundedSemaphore(self.max_pending)
+        self._pool = None
+        self._pool_lock = threading.Lock()
+        self._prefix = None
+        self.hashed = 0
+        self.verified = 0
+        self.rejected = 0
+        self.timed_out = 0
+
+    def _get_pool(self):
+        with self._pool_lock:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(self.workers)
+                atexit.register(self.shutdown)
+            return self._pool
+
+    def _run(self, func, *args):
+        if not self.workers:
+            return func(*args)
+        # Reject immediately instead of letting requests pile up behind the pool.
+        if not self._slots.acquire(blocking=False):
+            self.rejected += 1
+            raise HashingBusy('خدمة التشفير مشغولة، حاول لاحقا')
+        try:
+            future = self._get_pool().submit(func, *args)
+        except Exception:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        try:
+            return future.result(self.timeout)
+        except TimeoutError:
+            # The pool is backed up; answer like a full queue rather than with a 500.
+            future.cancel()
+            self.timed_out += 1
+            raise HashingBusy('خدمة التشفير مشغولة، حاول لاحقا')
+
+    def hash(self, password):
+        self.hashed += 1
+        return self._run(generate_password_hash, password, self.method)
+
+    def verify(self, stored_hash, password):
+        self.verified += 1
+        return self._run(check_password_hash, stored_hash, password)
+
+    def needs_rehash(self, stored_hash):
+        # Werkzeug stores "method:params$salt$hash"; compare against the current parameters.
+        if self._prefix is None:
+            self._prefix = generate_password_hash('', self.method).split('$', 1)[0]
+        return stored_hash.split('$', 1)[0] != self._prefix
+
+    def stats(self):
+        return {
+            'workers': self.workers,
+            'max_pending': self.max_pending,
+            'hashed': self.hashed,
+            'verified': self.verified,
+            'rejected': self.rejected,
+            'timed_out': self.timed_out,
+        }
+
+    def shutdown(self):
+        with self._pool_lock:
+            if self._pool is not None:
+                self._pool.shutdown()
+                self._pool = None
+
+hashing_service = HashingService()
\ No newline at end of file
@@ -0,0 +1,240 @@
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from itertools import islice
+import argparse
+import csv
+import hashlib
+import json
+import logging
+import os
+import re
+import time
+from sqlalchemy import func, inspect, insert
+from werkzeug.security import generate_password_hash
+from model import db, User, Course, ImportCheckpoint
+from catalog import catalog
+from search import search_index
+from pagecache import page_cache
+from hashing import HASH_METHOD
+from analytics import record_signups
+
+DEFAULT_BATCH_SIZE = 1000
+MAX_ERRORS = 100
+EMAIL_RE = re.compile(r'^[^\s@]+@[^\s@]+\.[^\s@]+$')
+TRUE_VALUES = ('1', 'true', 'yes', 'y')
+FINGERPRINT_BYTES = 64 * 1024
+
+class ImportReport:
+    def __init__(self, kind, source):
+        self.kind = kind
+        self.source = source
+        self.skipped = 0
+        self.inserted = 0
+        self.rejected = 0
+        self.batches = 0
+        self.errors = []
+        self.seconds = 0.0
+
+    def reject(self, line, message):
+        self.rejected += 1
+        if len(self.errors) < MAX_ERRORS:
+            self.errors.append(f'line {line}: {message}')
+
+    def as_dict(self):
+        return {
+            'kind': self.kind,
+            'source': self.source,
+            'skipped': self.skipped,
+            'inserted': self.inserted,
+            'rejected': self.rejected,
+            'batches': self.batches,
+            'seconds': round(self.seconds, 3),
+            'rows_per_s': round(self.inserted / self.seconds) if self.seconds else 0,
+            'errors': self.errors,
+        }
+
+def read_rows(path):
+    # Yields (line_number, row) without loading the file. JSONL lines stay raw
+    # text until parse_row(), so a broken line only rejects that row.
+    with open(path, newline='', encoding='utf-8-sig') as f:
+        if path.endswith('.jsonl') or path.endswith('.ndjson'):
+            for number, line in enumerate(f, 1):
+                if line.strip():
+                    yield number, line
+        else:
+            for number, row in enumerate(csv.DictReader(f), 2):
+                yield number, row
+
+def parse_row(row):
+    if isinstance(row, str):
+        row = json.loads(row)
+    if not isinstance(row, dict):
+        raise ValueError('row is not an object')
+    return row
+
+def _clean(row, field):
+    value = row.get(field)
+    if isinstance(value, (dict, list)):
+        raise ValueError(f'{field} must be a single value')
+    return value.strip() if isinstance(value, str) else value
+
+def validate_course(row):
+    course = {field: _clean(row, field) for field in ('title', 'description', 'course_type', 'course_link')}
+    missing = [field for field, value in course.items() if not value]
+    if missing:
+        raise ValueError(f"missing {', '.join(missing)}")
+    if len(course['title']) > 100 or len(course['course_link']) > 50 or len(course['course_type']) > 50:
+        raise ValueError('value too long')
+    course['image_url'] = _clean(row, 'image_url') or None
+    price = _clean(row, 'price')
+    course['price'] = float(price) if price not in (None, '') else None
+    featured = _clean(row, 'is_featured')
+    course['is_featured'] = featured is True or str(featured).lower() in TRUE_VALUES
+    return course
+
+def validate_user(row):
+    user = {field: _clean(row, field) for field in ('username', 'email', 'password')}
+    missing = [field for field, value in user.items() if not value]
+    if missing:
+        raise ValueError(f"missing {', '.join(missing)}")
+    if len(user['username']) > 100 or len(user['email']) > 120:
+        raise ValueError('value too long')
+    if not EMAIL_RE.match(user['email']):
+        raise ValueError('invalid email')
+    return user
+
+def fingerprint(path):
+    # Part of the checkpoint key: a different file at the same path starts over
+    # instead of resuming at the old offset. Only the head is hashed, so a file
+    # that grew by appending past it keeps its checkpoint.
+    with open(path, 'rb') as f:
+        return hashlib.sha256(f.read(FINGERPRINT_BYTES)).hexdigest()[:16]
+
+def _checkpoint(kind, source):
+    checkpoint = ImportCheckpoint.query.filter_by(kind=kind, source=source).first()
+    if checkpoint is None:
+        checkpoint = ImportCheckpoint(kind=kind, source=source, rows_done=0)
+        db.session.add(checkpoint)
+        db.session.commit()
+    return checkpoint
+
+def _drop_existing_users(users, report):
+    usernames = [user['username'] for _, user in users]
+    emails = [user['email'] for _, user in users]
+    taken = set()
+    for username, email in db.session.query(User.username, User.email).filter(
+            db.or_(User.username.in_(usernames), User.email.in_(emails))):
+        taken.update((username, email))
+    kept = []
+    for line, user in users:
+        if user['username'] in taken or user['email'] in taken:
+            report.reject(line, 'username or email already exists')
+            continue
+        taken.update((user['username'], user['email']))
+        kept.append((line, user))
+    return kept
+
+def _run_import(kind, path, validate, prepare, model, batch_size, on_batch, on_insert=None):
+    source = os.path.abspath(path)
+    report = ImportReport(kind, source)
+    checkpoint = _checkpoint(kind, f'{source}#{fingerprint(path)}')
+    report.skipped = checkpoint.rows_done
+    rows = islice(read_rows(path), checkpoint.rows_done, None)
+    started = time.perf_counter()
+    while True:
+        chunk = list(islice(rows, batch_size))
+        if not chunk:
+            break
+        batch_start = time.perf_counter()
+        valid = []
+        for line, row in chunk:
+            try:
+                valid.append((line, validate(parse_row(row))))
+            except (ValueError, TypeError) as e:
+                report.reject(line, str(e))
+        valid = prepare(valid, report)
+        # The checkpoint moves in the same transaction as the rows, so a crash
+        # can never leave a batch inserted but not recorded (or the reverse).
+        if valid:
+            last_id = db.session.query(func.max(model.id)).scalar() or 0
+            db.session.execute(insert(model), [row for _, row in valid])
+            if on_insert:
+                on_insert(last_id)
+        checkpoint.rows_done += len(chunk)
+        db.session.commit()
+        elapsed = time.perf_counter() - batch_start
+        report.batches += 1
+        report.inserted += len(valid)
+        batch = {'batch': report.batches, 'rows': len(chunk), 'inserted': len(valid),
+                 'seconds': round(elapsed, 3), 'rows_per_s': round(len(chunk) / elapsed) if elapsed else 0}
+        logging.info(f'Import {kind} batch {report.batches}: {batch}')
+        if on_batch:
+            on_batch(batch)
+    report.seconds = time.perf_counter() - started
+    logging.info(f'Import {kind} finished: {report.inserted} inserted, {report.rejected} rejected')
+    return report
+
+def import_courses(path, batch_size=DEFAULT_BATCH_SIZE, on_batch=None):
+    def prepare(courses, report):
+        return courses
+    # Index entries go into the same transaction as the rows; the shared versions
+    # then tell the web workers to drop their catalog, search and page caches.
+    report = _run_import('courses', path, validate_course, prepare, Course, batch_size, on_batch,
+                         search_index.add_since)
+    if report.inserted:
+        catalog.invalidate()
+        search_index.invalidate()
+        page_cache.invalidate()
+    return report
+
+def import_users(path, batch_size=DEFAULT_BATCH_SIZE, workers=None, on_batch=None):
+    workers = os.cpu_count() if workers is None else workers
+    pool = ProcessPoolExecutor(workers) if workers > 1 else None
+
+    def prepare(users, report):
+        users = _drop_existing_users(users, report)
+        passwords = [user['password'] for _, user in users]
+        hash_password = partial(generate_password_hash, method=HASH_METHOD)
+        if pool:
+            hashes = pool.map(hash_password, passwords, chunksize=max(1, len(passwords) // (workers * 4)))
+        else:
+            hashes = map(hash_password, passwords)
+        for (_, user), hashed in zip(users, hashes):
+            user['password'] = hashed
+        return users
+
+    def record(last_id):
+        # Rollups commit with the batch, so deleting an imported user later balances out.
+        record_signups(created_at for (created_at,) in
+                       db.session.query(User.created_at).filter(User.id > last_id))
+
+    try:
+        return _run_import('users', path, validate_user, prepare, User, batch_size, on_batch, record)
+    finally:
+        if pool:
+            pool.shutdown()
+
+def main():
+    parser = argparse.ArgumentParser(description='Bulk import courses or users from CSV/JSONL')
+    parser.add_argument('kind', choices=['courses', 'users'])
+    parser.add_argument('path')
+    parser.add_argument('--database', default=None, help='database URL (default: same as the app)')
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument('--workers', type=int, default=None)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    from factory import create_app
+    app = create_app({'DATABASE_URL': args.database} if args.database else None)
+    with app.app_context():
+        missing = set(db.metadata.tables) - set(inspect(db.engine).get_table_names())
+        if missing:
+            parser.exit(1, f'Missing tables: {", ".join(sorted(missing))}. Run `flask --app app init-db` first.\n')
+        if args.kind == 'courses':
+            report = import_courses(args.path, args.batch_size)
+        else:
+            report = import_users(args.path, args.batch_size, args.workers)
+    print(json.dumps(report.as_dict(), ensure_ascii=False, indent=2))
+
+if __name__ == '__main__':
+    main()
\ No newline at end of file
@@ -0,0 +1,235 @@
+from collections import Counter
+from contextlib import contextmanager, nullcontext
+from contextvars import ContextVar
+import cProfile
+import logging
+import os
+import random
+import re
+import threading
+import time
+from flask import Response, g, request, template_rendered, before_render_template
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# Prometheus' default latency buckets, in seconds.
+TIME_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.075, 0.1, 0.25, 0.5, 0.75, 1.0, 2.5, 5.0, 7.5, 10.0)
+COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500)
+N_PLUS_ONE_THRESHOLD = 5
+PROFILE_SAMPLE_RATE = 0.01
+PROFILE_SLOW_MS = 500
+
+_trace = ContextVar('instrumentation_trace', default=None)
+
+class RequestTrace:
+    __slots__ = ('start', 'spans', 'statements', 'statement_counts', 'render_started')
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.spans = Counter()
+        self.statements = 0
+        self.statement_counts = Counter()
+        self.render_started = []
+
+    def add(self, span, seconds):
+        self.spans[span] += seconds
+
+    def repeated_selects(self, threshold):
+        # The same SELECT text run many times in one request is the classic lazy-load loop.
+        return [(statement, count) for statement, count in self.statement_counts.items()
+                if count >= threshold and statement.lstrip().upper().startswith('SELECT')]
+
+def span(name):
+    # Used on shared code paths (e.g. the AI call); a no-op unless a request is being traced.
+    trace = _trace.get()
+    if trace is None:
+        return nullcontext()
+    return _timed(trace, name)
+
+@contextmanager
+def _timed(trace, name):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        trace.add(name, time.perf_counter() - start)
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.series = {}
+
+    def observe(self, labels, value):
+        counts = self.series.get(labels)
+        if counts is None:
+            counts = self.series[labels] = [0] * len(self.buckets) + [0, 0.0]
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                counts[i] += 1
+        counts[-2] += 1
+        counts[-1] += value
+
+    def render(self, name, help_text, label_names):
+        lines = [f'# HELP {name} {help_text}', f'# TYPE {name} histogram']
+        for labels, counts in sorted(self.series.items()):
+            base = ','.join(f'{key}="{_escape(value)}"' for key, value in zip(label_names, labels))
+            prefix = base + ',' if base else ''
+            for bound, count in zip(self.buckets, counts):
+                lines.append(f'{name}_bucket{{{prefix}le="{bound}"}} {count}')
+            lines.append(f'{name}_bucket{{{prefix}le="+Inf"}} {counts[-2]}')
+            lines.append(f'{name}_count{{{base}}} {counts[-2]}')
+            lines.append(f'{name}_sum{{{base}}} {counts[-1]:.6f}')
+        return lines
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+class Instrumentation:
+    def __init__(self, n_plus_one_threshold=N_PLUS_ONE_THRESHOLD, profile_sample_rate=PROFILE_SAMPLE_RATE,
+                 profile_slow_ms=PROFILE_SLOW_MS, profile_dir=None):
+        self.enabled = False
+        self.n_plus_one_threshold = n_plus_one_threshold
+        self.profile_sample_rate = profile_sample_rate
+        self.profile_slow_ms = profile_slow_ms
+        self.profile_dir = profile_dir
+        self._lock = threading.Lock()
+        self.requests = Histogram(TIME_BUCKETS)
+        self.spans = Histogram(TIME_BUCKETS)
+        self.statements = Histogram(COUNT_BUCKETS)
+        self.n_plus_one = Counter()
+        self.profiles_written = 0
+        self.collectors = []
+
+    def init_app(self, app):
+        # Nothing is hooked unless enabled, so the disabled cost is one ContextVar lookup in span().
+        enabled = app.config.get('INSTRUMENTATION', os.environ.get('INSTRUMENTATION') == '1')
+        if not enabled:
+            return
+        self.enabled = True
+        self.profile_sample_rate = app.config.get('PROFILE_SAMPLE_RATE', self.profile_sample_rate)
+        self.profile_slow_ms = app.config.get('PROFILE_SLOW_MS', self.profile_slow_ms)
+        self.profile_dir = self.profile_dir or app.config.get(
+            'PROFILE_DIR', os.path.join(app.instance_path, 'profiles'))
+        if not event.contains(Engine, 'before_cursor_execute', _before_cursor_execute):
+            event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+            event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+        before_render_template.connect(_before_render, app)
+        template_rendered.connect(_after_render, app)
+        app.before_request(self._start)
+        app.after_request(self._finish)
+        app.teardown_request(self._teardown)
+        app.add_url_rule('/metrics', 'metrics', self.metrics_view)
+
+    def register_collector(self, collect):
+        # collect() returns extra Prometheus text lines, e.g. gauges owned by another module.
+        self.collectors.append(collect)
+
+    def _start(self):
+        g.instrumentation_token = _trace.set(RequestTrace())
+        if self.profile_sample_rate and random.random() < self.profile_sample_rate:
+            profiler = cProfile.Profile()
+            try:
+                profiler.enable()
+            except ValueError:
+                # Another profiler already owns this thread.
+                return
+            g.instrumentation_profiler = profiler
+
+    def _finish(self, response):
+        trace = _trace.get()
+        if trace is None:
+            return response
+        elapsed = time.perf_counter() - trace.start
+        endpoint = request.endpoint or 'unknown'
+        repeated = trace.repeated_selects(self.n_plus_one_threshold)
+        with self._lock:
+            self.requests.observe((endpoint, request.method, str(response.status_code)), elapsed)
+            for name, seconds in trace.spans.items():
+                self.spans.observe((endpoint, name), seconds)
+            self.statements.observe((endpoint,), trace.statements)
+            if repeated:
+                self.n_plus_one[endpoint] += 1
+        for statement, count in repeated:
+            logging.warning(f'Possible N+1 on {endpoint}: {count}x {" ".join(statement.split())[:200]}')
+        timings = [f'{name};dur={seconds * 1000:.1f}' for name, seconds in sorted(trace.spans.items())]
+        timings.append(f'total;dur={elapsed * 1000:.1f}')
+        response.headers['Server-Timing'] = ', '.join(timings)
+        response.headers['X-DB-Statements'] = str(trace.statements)
+        self._write_profile(endpoint, elapsed)
+        return response
+
+    def _write_profile(self, endpoint, elapsed):
+        profiler = g.pop('instrumentation_profiler', None)
+        if profiler is None:
+            return
+        profiler.disable()
+        if elapsed * 1000 < self.profile_slow_ms:
+            return
+        os.makedirs(self.profile_dir, exist_ok=True)
+        name = re.sub(r'[^A-Za-z0-9_.-]', '_', endpoint)
+        path = os.path.join(self.profile_dir, f'{name}-{int(time.time() * 1000)}.prof')
+        # pstats format: snakeviz, flameprof and gprof2dot all read it directly.
+        profiler.dump_stats(path)
+        with self._lock:
+            self.profiles_written += 1
+        logging.info(f'Slow request profile written: {path} ({elapsed * 1000:.0f}ms)')
+
+    def _teardown(self, exc):
+        profiler = g.pop('instrumentation_profiler', None)
+        if profiler is not None:
+            profiler.disable()
+        token = g.pop('instrumentation_token', None)
+        if token is not None:
+            try:
+                _trace.reset(token)
+            except ValueError:
+                # Streamed responses can tear down in a different context.
+                _trace.set(None)
+
+    def render_metrics(self):
+        with self._lock:
+            lines = self.requests.render('http_request_duration_seconds', 'Request latency.',
+                                         ('endpoint', 'method', 'status'))
+            lines += self.spans.render('http_request_span_seconds',
+                                       'Time per request spent in db, render and http spans.',
+                                       ('endpoint', 'span'))
+            lines += self.statements.render('db_statements_per_request', 'SQL statements per request.',
+                                            ('endpoint',))
+            lines += ['# HELP n_plus_one_requests_total Requests that repeated one SELECT past the threshold.',
+                      '# TYPE n_plus_one_requests_total counter']
+            lines += [f'n_plus_one_requests_total{{endpoint="{_escape(endpoint)}"}} {count}'
+                      for endpoint, count in sorted(self.n_plus_one.items())]
+            lines += ['# HELP slow_request_profiles_total Profiles written for slow sampled requests.',
+                      '# TYPE slow_request_profiles_total counter',
+                      f'slow_request_profiles_total {self.profiles_written}']
+        for collect in self.collectors:
+            lines += collect()
+        return '\n'.join(lines) + '\n'
+
+    def metrics_view(self):
+        return Response(self.render_metrics(), mimetype='text/plain; version=0.0.4')
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _trace.get() is not None:
+        conn.info.setdefault('instrumentation_start', []).append(time.perf_counter())
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    trace = _trace.get()
+    starts = conn.info.get('instrumentation_start')
+    if trace is None or not starts:
+        return
+    trace.add('db', time.perf_counter() - starts.pop())
+    trace.statements += 1
+    trace.statement_counts[statement] += 1
+
+def _before_render(sender, template, context, **extra):
+    trace = _trace.get()
+    if trace is not None:
+        trace.render_started.append(time.perf_counter())
+
+def _after_render(sender, template, context, **extra):
+    trace = _trace.get()
+    if trace is not None and trace.render_started:
+        trace.add('render', time.perf_counter() - trace.render_started.pop())
+
+instrumentation = Instrumentation()
\ No newline at end of file
@@ -0,0 +1,324 @@
+from datetime import datetime, timedelta
+import atexit
+import importlib
+import json
+import logging
+import os
+import random
+import smtplib
+import threading
+import time
+from email.message import EmailMessage
+from sqlalchemy import delete, func, insert, update
+from model import db, Course, Job
+from instrumentation import Histogram, TIME_BUCKETS, instrumentation
+from search import search_index
+
+JOB_WORKERS = int(os.environ.get('JOB_WORKERS', 2))
+POLL_INTERVAL = 1.0
+BACKOFF_BASE = 2.0
+BACKOFF_MAX = 600.0
+MAX_ATTEMPTS = 5
+DRAIN_TIMEOUT = 10.0
+LEASE_TIMEOUT = 300  # a running job older than this belongs to a dead worker
+# Finished rows are kept this long for inspection, then deleted so the table stays
+# small. An idempotency key can be reused once its row is gone.
+DONE_RETENTION = 7 * 24 * 3600
+FAILED_RETENTION = 30 * 24 * 3600
+PRUNE_INTERVAL = 3600
+PRUNE_BATCH = 1000
+
+HANDLERS = {}
+
+def job(name, max_attempts=MAX_ATTEMPTS):
+    def register(func):
+        HANDLERS[name] = (func, max_attempts)
+        return func
+    return register
+
+def backoff(attempts, base=BACKOFF_BASE, cap=BACKOFF_MAX):
+    # Exponential with full jitter so failing jobs do not retry in lockstep.
+    return random.uniform(0, min(cap, base ** attempts))
+
+class JobQueue:
+    def __init__(self, workers=JOB_WORKERS, poll_interval=POLL_INTERVAL, drain_timeout=DRAIN_TIMEOUT):
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self.drain_timeout = drain_timeout
+        self._app = None
+        self._threads = []
+        self._wake = threading.Event()
+        self._stopping = False
+        self._deadline = 0.0
+        self._lock = threading.Lock()
+        self._next_prune = 0.0
+        self.enqueued = 0
+        self.duplicates = 0
+        self.succeeded = 0
+        self.retried = 0
+        self.failed = 0
+        self.wait_seconds = Histogram(TIME_BUCKETS)
+        self.run_seconds = Histogram(TIME_BUCKETS)
+
+    @property
+    def running(self):
+        return bool(self._threads)
+
+    def start(self, app):
+        if self._threads:
+            return
+        self._app = app
+        self._stopping = False
+        with app.app_context():
+            self.recover()
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._run, name=f'job-worker-{i}', daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        atexit.register(self.stop)
+
+    def stop(self, timeout=None):
+        # Drain: workers keep taking due jobs until none are left or the timeout passes.
+        # Whatever remains stays queued in the table for the next start.
+        if not self._threads:
+            return
+        self._deadline = time.monotonic() + (self.drain_timeout if timeout is None else timeout)
+        self._stopping = True
+        self._wake.set()
+        for thread in self._threads:
+            thread.join(max(self._deadline - time.monotonic(), 0) + self.poll_interval)
+        self._threads = []
+
+    def enqueue(self, name, payload=None, key=None, delay=0, max_attempts=None):
+        if name not in HANDLERS:
+            raise KeyError(f'Unknown job: {name}')
+        values = {
+            'name': name,
+            'payload': json.dumps(payload or {}, ensure_ascii=False),
+            'idempotency_key': key,
+            'status': 'queued',
+            'attempts': 0,
+            'max_attempts': max_attempts or HANDLERS[name][1],
+            'run_at': datetime.utcnow() + timedelta(seconds=delay),
+            'created_at': datetime.utcnow(),
+        }
+        job_id = self._insert(values)
+        db.session.commit()
+        with self._lock:
+            if job_id is not None:
+                self.enqueued += 1
+            else:
+                self.duplicates += 1
+        if job_id is None:
+            return False
+        if self._threads:
+            self._wake.set()
+        elif not delay:
+            # No workers (tests, scripts, requests before the lazy start): run this job
+            # now, like a plain synchronous call. Anything else due waits for a worker.
+            job_row = self._take(job_id, datetime.utcnow())
+            if job_row is not None:
+                self._execute(job_row)
+        return True
+
+    def _insert(self, values):
+        dialect = db.engine.dialect.name
+        if values['idempotency_key'] is not None and dialect in ('sqlite', 'postgresql'):
+            dialect_insert = importlib.import_module(f'sqlalchemy.dialects.{dialect}').insert
+            statement = dialect_insert(Job).values(**values).on_conflict_do_nothing(
+                index_elements=['idempotency_key'])
+            result = db.session.execute(statement)
+            return result.inserted_primary_key[0] if result.rowcount == 1 else None
+        if values['idempotency_key'] is not None and db.session.query(
+                Job.query.filter_by(idempotency_key=values['idempotency_key']).exists()).scalar():
+            return None
+        return db.session.execute(insert(Job).values(**values)).inserted_primary_key[0]
+
+    def recover(self):
+        stale = datetime.utcnow() - timedelta(seconds=LEASE_TIMEOUT)
+        count = (db.session.query(Job)
+                 .filter(Job.status == 'running', Job.started_at < stale)
+                 .update({Job.status: 'queued', Job.run_at: datetime.utcnow()}))
+        db.session.commit()
+        if count:
+            logging.info(f'Requeued {count} jobs left running by a stopped worker')
+        return count
+
+    def _take(self, job_id, now):
+        # Conditional update so two workers (or processes) never take the same job.
+        claimed = db.session.execute(
+            update(Job).where(Job.id == job_id, Job.status == 'queued')
+            .values(status='running', attempts=Job.attempts + 1, started_at=now)).rowcount
+        db.session.commit()
+        return db.session.get(Job, job_id) if claimed else None
+
+    def _claim(self):
+        now = datetime.utcnow()
+        for job_id, in (db.session.query(Job.id)
+                        .filter(Job.status == 'queued', Job.run_at <= now)
+                        .order_by(Job.run_at, Job.id)
+                        .limit(5)
+                        .all()):
+            job_row = self._take(job_id, now)
+            if job_row is not None:
+                return job_row
+        db.session.rollback()
+        return None
+
+    def _execute(self, job_row):
+        func, _ = HANDLERS.get(job_row.name, (None, None))
+        wait = (job_row.started_at - job_row.run_at).total_seconds()
+        start = time.perf_counter()
+        try:
+            if func is None:
+                raise KeyError(f'Unknown job: {job_row.name}')
+            func(**json.loads(job_row.payload))
+        except Exception as e:
+            db.session.rollback()
+            job_row = db.session.get(Job, job_row.id)
+            job_row.last_error = f'{type(e).__name__}: {e}'
+            if job_row.attempts >= job_row.max_attempts:
+                job_row.status = 'failed'
+                job_row.finished_at = datetime.utcnow()
+                outcome = 'failed'
+                logging.exception(f'Job {job_row.name} #{job_row.id} failed permanently')
+            else:
+                job_row.status = 'queued'
+                job_row.run_at = datetime.utcnow() + timedelta(seconds=backoff(job_row.attempts))
+                outcome = 'retried'
+                logging.warning(f'Job {job_row.name} #{job_row.id} failed (attempt {job_row.attempts}), retrying')
+        else:
+            job_row.status = 'done'
+            job_row.finished_at = datetime.utcnow()
+            job_row.last_error = None
+            outcome = 'succeeded'
+        db.session.commit()
+        with self._lock:
+            setattr(self, outcome, getattr(self, outcome) + 1)
+            self.wait_seconds.observe((job_row.name,), max(wait, 0.0))
+            self.run_seconds.observe((job_row.name,), time.perf_counter() - start)
+        return outcome
+
+    def run_pending(self, limit=None):
+        # Runs due jobs on the calling thread; the workers use the same loop.
+        done = 0
+        while limit is None or done < limit:
+            job_row = self._claim()
+            if job_row is None:
+                break
+            self._execute(job_row)
+            done += 1
+        return done
+
+    def prune(self, done_after=DONE_RETENTION, failed_after=FAILED_RETENTION, batch_size=PRUNE_BATCH):
+        now = datetime.utcnow()
+        removed = 0
+        for status, keep in (('done', done_after), ('failed', failed_after)):
+            cutoff = now - timedelta(seconds=keep)
+            while True:
+                ids = [job_id for job_id, in db.session.query(Job.id)
+                       .filter(Job.status == status, Job.finished_at < cutoff)
+                       .limit(batch_size)]
+                if not ids:
+                    break
+                removed += db.session.execute(delete(Job).where(Job.id.in_(ids))).rowcount
+                db.session.commit()
+        if removed:
+            logging.info(f'Pruned {removed} finished jobs')
+        return removed
+
+    def _prune_due(self):
+        # Only one worker thread prunes per interval.
+        with self._lock:
+            if time.monotonic() < self._next_prune:
+                return False
+            self._next_prune = time.monotonic() + PRUNE_INTERVAL
+        return True
+
+    def _run(self):
+        with self._app.app_context():
+            while True:
+                if self._stopping and time.monotonic() >= self._deadline:
+                    break
+                try:
+                    if not self._stopping and self._prune_due():
+                        self.prune()
+                    worked = self.run_pending(limit=1)
+                except Exception:
+                    logging.exception('Job worker error')
+                    db.session.rollback()
+                    worked = None
+                finally:
+                    db.session.remove()
+                if worked:
+                    continue
+                # An error (e.g. a locked database) is not an empty queue: keep
+                # draining until the deadline instead of leaving jobs behind.
+                if self._stopping and worked == 0:
+                    break
+                self._wake.wait(self.poll_interval)
+                self._wake.clear()
+
+    def depth(self):
+        counts = dict(db.session.query(Job.status, func.count(Job.id)).group_by(Job.status))
+        return {status: counts.get(status, 0) for status in ('queued', 'running', 'done', 'failed')}
+
+    def stats(self):
+        with self._lock:
+            stats = {
+                'workers': len(self._threads),
+                'enqueued': self.enqueued,
+                'duplicates': self.duplicates,
+                'succeeded': self.succeeded,
+                'retried': self.retried,
+                'failed': self.failed,
+            }
+        stats['depth'] = self.depth()
+        return stats
+
+    def metrics(self):
+        lines = ['# HELP job_queue_depth Jobs in the queue table by status.',
+                 '# TYPE job_queue_depth gauge']
+        if self._app is not None:
+            with self._app.app_context():
+                depth = self.depth()
+            lines += [f'job_queue_depth{{status="{status}"}} {count}' for status, count in depth.items()]
+        lines += ['# HELP jobs_processed_total Job attempts by outcome.', '# TYPE jobs_processed_total counter']
+        with self._lock:
+            lines += [f'jobs_processed_total{{outcome="{outcome}"}} {getattr(self, outcome)}'
+                      for outcome in ('succeeded', 'retried', 'failed')]
+            lines += self.wait_seconds.render('job_wait_seconds', 'Time from due to picked up.', ('job',))
+            lines += self.run_seconds.render('job_run_seconds', 'Handler run time.', ('job',))
+        return lines
+
+job_queue = JobQueue()
+instrumentation.register_collector(job_queue.metrics)
+
+def enqueue(name, payload=None, key=None, delay=0):
+    return job_queue.enqueue(name, payload, key, delay)
+
+@job('welcome_email')
+def send_welcome_email(username, email):
+    host = os.environ.get('SMTP_HOST')
+    if not host:
+        logging.info(f'Welcome email for {username} skipped: SMTP_HOST not set')
+        return
+    message = EmailMessage()
+    message['From'] = os.environ.get('SMTP_FROM', f'no-reply@{host}')
+    message['To'] = email
+    message['Subject'] = 'مرحبا بك'
+    message.set_content(f'أهلا {username}، تم إنشاء حسابك بنجاح.')
+    with smtplib.SMTP(host, int(os.environ.get('SMTP_PORT', 25)), timeout=30) as smtp:
+        smtp.send_message(message)
+
+@job('index_course')
+def index_course(course_id):
+    # Remove first so a retry or a re-index after an edit never duplicates the entry.
+    search_index.remove_course(course_id)
+    course = db.session.get(Course, course_id)
+    if course is not None:
+        search_index.add_course(course)
+
+@job('unindex_course')
+def unindex_course(course_id):
+    search_index.remove_course(course_id)
\ No newline at end of file
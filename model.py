@@ -1,7 +1,6 @@
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import UserMixin
 from datetime import datetime
-import os
 
 db = SQLAlchemy()
 
@@ -18,22 +17,178 @@ class User(UserMixin, db.Model):
 
 class Message(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
     content = db.Column(db.Text, nullable=False)
-    timestamp = db.Column(db.DateTime, default=datetime.utcnow)
+    timestamp = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, index=True)
+    # Ids are stream/history cursors and archive keys: never reuse one after the
+    # newest rows are archived or deleted.
+    __table_args__ = {'sqlite_autoincrement': True}
+
+# الرسائل القديمة تنقل هنا حتى يبقى جدول الرسائل صغيرا
+class MessageArchive(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
+    content = db.Column(db.Text, nullable=False)
+    timestamp = db.Column(db.DateTime, nullable=False, index=True)
+    archived_at = db.Column(db.DateTime, default=datetime.utcnow)
+    user = db.relationship('User', viewonly=True)
 
 class Course(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(100), nullable=False)
     description = db.Column(db.Text, nullable=False)
     image_url = db.Column(db.String(200), nullable=True)
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
-    course_type = db.Column(db.String(50), nullable=False)
+    # SQLite index entries carry the rowid, so this also serves (created_at, id) keyset paging.
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, index=True)
+    course_type = db.Column(db.String(50), nullable=False, index=True)
     course_link = db.Column(db.String(50), nullable=False)
     price = db.Column(db.Float, nullable=True)  # إضافة حقل السعر (اختياري)
-    is_featured = db.Column(db.Boolean, default=False)
+    is_featured = db.Column(db.Boolean, default=False, index=True)
+    likes = db.Column(db.Integer, default=0)
+
+# الصور المصغرة لكل كورس؛ الملفات نفسها مخزنة على القرص باسم بصمة المحتوى
+class CourseImage(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    course_id = db.Column(db.Integer, db.ForeignKey('course.id'), nullable=False, unique=True)
+    source = db.Column(db.String(200), nullable=False)
+    digest = db.Column(db.String(64), nullable=False, index=True)
+    widths = db.Column(db.String(50), nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+# رقم إصدار لكل ذاكرة مؤقتة يزداد عند أي تعديل حتى ترى كل العمليات التغيير
+class CacheVersion(db.Model):
+    name = db.Column(db.String(50), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+
+class ImportCheckpoint(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(20), nullable=False)
+    source = db.Column(db.String(500), nullable=False)
+    rows_done = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    __table_args__ = (db.UniqueConstraint('kind', 'source'),)
+
+class YouTubeStat(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(10), nullable=False)
+    item_id = db.Column(db.String(64), nullable=False)
+    view_count = db.Column(db.BigInteger, nullable=True)
+    subscriber_count = db.Column(db.BigInteger, nullable=True)
+    video_count = db.Column(db.BigInteger, nullable=True)
+    fetched_at = db.Column(db.DateTime, nullable=False, index=True)
+    requested_at = db.Column(db.DateTime, nullable=True, index=True)
+    __table_args__ = (db.UniqueConstraint('kind', 'item_id'),)
+
+# عدد المشتركين مجمعا حسب اليوم والشهر والسنة لرسوم لوحة التحكم
+class SignupRollup(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    period = db.Column(db.String(5), nullable=False)
+    bucket = db.Column(db.String(10), nullable=False)
+    count = db.Column(db.Integer, nullable=False, default=0)
+    __table_args__ = (db.UniqueConstraint('period', 'bucket'),)
+
+# طابور المهام الخلفية؛ يبقى في قاعدة البيانات حتى لا تضيع المهام عند إعادة التشغيل
+class Job(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(100), nullable=False)
+    payload = db.Column(db.Text, nullable=False, default='{}')
+    idempotency_key = db.Column(db.String(200), nullable=True, unique=True)
+    status = db.Column(db.String(10), nullable=False, default='queued')
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    max_attempts = db.Column(db.Integer, nullable=False, default=5)
+    run_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime, nullable=True)
+    finished_at = db.Column(db.DateTime, nullable=True)
+    last_error = db.Column(db.Text, nullable=True)
+    __table_args__ = (db.Index('ix_job_status_run_at', 'status', 'run_at'),)
+
+def ensure_indexes():
+    # create_all() skips existing tables, so indexes added later need this.
+    for table in db.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(db.engine, checkfirst=True)
+
+def ensure_columns():
+    # create_all() never alters an existing table, so columns added to a model
+    # later (e.g. course.likes) are added here. Idempotent.
+    inspector = db.inspect(db.engine)
+    quote = db.engine.dialect.identifier_preparer.quote
+    added = []
+    for table in db.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+        existing = {column['name'] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in existing:
+                continue
+            ddl = (f'ALTER TABLE {quote(table.name)} ADD COLUMN {quote(column.name)} '
+                   f'{column.type.compile(db.engine.dialect)}')
+            default = column.default.arg if column.default is not None and column.default.is_scalar else None
+            if isinstance(default, (bool, int, float)):
+                ddl += f' DEFAULT {int(default) if isinstance(default, bool) else default}'
+            with db.engine.begin() as connection:
+                connection.exec_driver_sql(ddl)
+            added.append(f'{table.name}.{column.name}')
+    return added
+
+def ensure_message_table():
+    # Tables created before Message used AUTOINCREMENT and a NOT NULL timestamp are
+    # rebuilt once; run backfill_message_dates() first so every row fits. The
+    # sequence starts past the archive too, so archived ids are never handed out again.
+    if db.engine.dialect.name != 'sqlite':
+        return False
+    with db.engine.begin() as connection:
+        sql = connection.exec_driver_sql(
+            "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'message'").scalar()
+        if sql is None:
+            return False
+        timestamp_required = any(name == 'timestamp' and notnull for _, name, _, notnull, _, _ in
+                                 connection.exec_driver_sql('PRAGMA table_info(message)'))
+        if 'AUTOINCREMENT' in sql.upper() and timestamp_required:
+            return False
+        connection.exec_driver_sql('ALTER TABLE message RENAME TO message_old')
+        for (name,) in connection.exec_driver_sql(
+                "SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = 'message_old' AND sql IS NOT NULL"
+        ).all():
+            connection.exec_driver_sql(f'DROP INDEX {name}')
+        Message.__table__.create(connection)
+        connection.exec_driver_sql('INSERT INTO message (id, user_id, content, timestamp) '
+                                   'SELECT id, user_id, content, timestamp FROM message_old')
+        connection.exec_driver_sql('DROP TABLE message_old')
+        last_id = connection.exec_driver_sql(
+            'SELECT max(coalesce((SELECT max(id) FROM message), 0), '
+            'coalesce((SELECT max(id) FROM message_archive), 0))').scalar()
+        connection.exec_driver_sql("DELETE FROM sqlite_sequence WHERE name = 'message'")
+        connection.exec_driver_sql(f"INSERT INTO sqlite_sequence (name, seq) VALUES ('message', {int(last_id)})")
+    return True
+
+def backfill_course_dates():
+    # Keyset paging compares created_at, and NULL never compares, so rows from older
+    # databases without a date take the oldest date in the table.
+    oldest = db.session.query(db.func.min(Course.created_at)).scalar() or datetime.utcnow()
+    count = Course.query.filter(Course.created_at.is_(None)).update(
+        {Course.created_at: oldest}, synchronize_session=False)
+    db.session.commit()
+    return count
+
+def backfill_message_dates():
+    # History cursors and archiving compare timestamps, and NULL never compares, so
+    # messages from older databases without one take the oldest date in their table.
+    count = 0
+    for model in (Message, MessageArchive):
+        oldest = db.session.query(db.func.min(model.timestamp)).scalar() or datetime.utcnow()
+        count += model.query.filter(model.timestamp.is_(None)).update(
+            {model.timestamp: oldest}, synchronize_session=False)
+    db.session.commit()
+    return count
 
 def reset_database(app):
+    # Works for any configured database, not just a users.db in the working directory.
     with app.app_context():
-        if not os.path.exists('users.db'):
-            db.create_all()
\ No newline at end of file
+        db.create_all()
+        ensure_columns()
+        backfill_message_dates()
+        ensure_message_table()
+        ensure_indexes()
+        backfill_course_dates()
\ No newline at end of file
@@ -1,6 +1,18 @@
-from model import db, User, Course, Message
-from werkzeug.security import generate_password_hash
+from model import db, User, Course, CourseImage, Message, MessageArchive
+from catalog import catalog
+from pagecache import page_cache
+from counters import counters
+from chat import hub
+from auth import token_cache
+from hashing import hashing_service, HashingBusy
+from analytics import record_signup, record_signups
+from jobs import enqueue
+from thumbnails import thumbnail_service
+from datetime import datetime
 import logging
+import time
+
+BULK_CHUNK_SIZE = 500
 
 def get_all_courses():
     return Course.query.all()
@@ -13,10 +25,14 @@ def get_courses_by_type(all_courses):
         courses_by_type[course.course_type].append(course)
     return courses_by_type
 
+def get_catalog():
+    return catalog.get_courses_by_type()
+
 def add_message(user_id, message_content):
     new_message = Message(user_id=user_id, content=message_content)
     db.session.add(new_message)
     db.session.commit()
+    hub.publish()
 
 def delete_message(message_id):
     message = Message.query.get(message_id)
@@ -25,21 +41,208 @@ def delete_message(message_id):
         db.session.commit()
 
 def register_user(username, email, password):
-    hashed_password = generate_password_hash(password)
-    new_user = User(username=username, password=hashed_password, email=email)
+    hashed_password = hashing_service.hash(password)
+    new_user = User(username=username, password=hashed_password, email=email, created_at=datetime.utcnow())
     db.session.add(new_user)
+    record_signup(new_user.created_at)
     db.session.commit()
     logging.info(f'New user registered: {username}')
+    enqueue('welcome_email', {'username': username, 'email': email},
+            key=f'welcome_email:{new_user.id}:{new_user.created_at.isoformat()}')
+
+def authenticate(username, password):
+    user = User.query.filter_by(username=username).first()
+    if user is None or not hashing_service.verify(user.password, password):
+        return None
+    if hashing_service.needs_rehash(user.password):
+        # Hash parameters changed since this password was stored; upgrade it now
+        # that we have the plaintext. A busy pool just defers it to the next login.
+        try:
+            user.password = hashing_service.hash(password)
+            db.session.commit()
+            logging.info(f'Password hash upgraded for {username}')
+        except HashingBusy:
+            pass
+    return user
 
 def delete_user(user_id):
+    username = db.session.query(User.username).filter_by(id=user_id).scalar()
+    if username is not None:
+        delete_users([user_id])
+        logging.info(f'User {username} deleted successfully.')
+
+def set_admin(user_id, is_admin=True):
     user = User.query.get(user_id)
     if user:
-        db.session.delete(user)
+        user.is_admin = is_admin
         db.session.commit()
-        logging.info(f'User {user.username} deleted successfully.')
+        token_cache.invalidate_user(user_id)
+        logging.info(f'User {user.username} admin set to {is_admin}.')
 
-def add_course(title, description, image_url, course_type):
-    new_course = Course(title=title, description=description, image_url=image_url, course_type=course_type)
+def add_course(title, description, image_url, course_type, course_link=None):
+    # course_link is NOT NULL; fall back to a slug of the title when the caller has none.
+    course_link = course_link or '-'.join(title.lower().split())
+    new_course = Course(title=title, description=description, image_url=image_url, course_type=course_type,
+                        course_link=course_link)
     db.session.add(new_course)
     db.session.commit()
-    logging.info(f'New course added: {title}')
\ No newline at end of file
+    catalog.invalidate()
+    page_cache.invalidate()
+    enqueue('index_course', {'course_id': new_course.id})
+    enqueue('course_thumbnails', {'course_id': new_course.id})
+    logging.info(f'New course added: {title}')
+
+COURSE_FIELDS = ('title', 'description', 'image_url', 'course_type', 'course_link', 'price', 'is_featured')
+
+def update_course(course_id, **changes):
+    # Checked before anything is set, so a bad field never leaves a half-applied
+    # edit in the session for the next commit to pick up.
+    for field in changes:
+        if field not in COURSE_FIELDS:
+            raise ValueError(f'حقل غير معروف: {field}')
+    course = Course.query.get(course_id)
+    if not course:
+        return None
+    old_image = course.image_url
+    for field, value in changes.items():
+        setattr(course, field, value)
+    db.session.commit()
+    catalog.invalidate()
+    page_cache.invalidate()
+    enqueue('index_course', {'course_id': course_id})
+    if course.image_url != old_image:
+        thumbnail_service.forget(course_id)
+        enqueue('course_thumbnails', {'course_id': course_id})
+    logging.info(f'Course {course.title} updated.')
+    return course
+
+def delete_course(course_id):
+    course = Course.query.get(course_id)
+    if course:
+        # Variant files stay on disk: they are content-addressed and may be shared.
+        CourseImage.query.filter_by(course_id=course_id).delete()
+        db.session.delete(course)
+        db.session.commit()
+        thumbnail_service.forget(course_id)
+        catalog.invalidate()
+        page_cache.invalidate()
+        enqueue('unindex_course', {'course_id': course_id})
+        logging.info(f'Course {course.title} deleted successfully.')
+
+def like_course(course_id, user_id=None):
+    counters.increment(Course, 'likes', course_id)
+    if user_id is not None:
+        counters.increment(User, 'likes_count', user_id)
+    return counters.value(Course, 'likes', course_id)
+
+def share_course(user_id):
+    counters.increment(User, 'shares_count', user_id)
+    return counters.value(User, 'shares_count', user_id)
+
+class BulkReport:
+    def __init__(self, action, total=None):
+        self.action = action
+        self.total = total
+        self.done = 0
+        self.dependent_rows = 0
+        self.chunks = 0
+        self.seconds = 0.0
+        self.longest_chunk_seconds = 0.0
+
+    def as_dict(self):
+        return {
+            'action': self.action,
+            'total': self.total,
+            'done': self.done,
+            'dependent_rows': self.dependent_rows,
+            'chunks': self.chunks,
+            'seconds': round(self.seconds, 3),
+            'longest_chunk_seconds': round(self.longest_chunk_seconds, 3),
+        }
+
+def _chunked(ids, chunk_size):
+    ids = list(dict.fromkeys(ids))
+    for start in range(0, len(ids), chunk_size):
+        yield ids[start:start + chunk_size]
+
+def _run_chunks(report, chunks, apply, on_progress=None, pause=0.0):
+    # One short transaction per chunk; the optional pause lets waiting writers in between.
+    started = time.perf_counter()
+    for chunk in chunks:
+        chunk_start = time.perf_counter()
+        try:
+            report.done += apply(chunk)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        report.chunks += 1
+        report.longest_chunk_seconds = max(report.longest_chunk_seconds, time.perf_counter() - chunk_start)
+        report.seconds = time.perf_counter() - started
+        if on_progress:
+            on_progress(report)
+        if pause:
+            time.sleep(pause)
+    report.seconds = time.perf_counter() - started
+    return report
+
+def _matching_ids(model, filters, chunk_size):
+    # Re-queried after every commit, so it always starts from whatever is left.
+    while True:
+        ids = [row_id for row_id, in db.session.query(model.id).filter(*filters)
+               .order_by(model.id).limit(chunk_size)]
+        if not ids:
+            return
+        yield ids
+
+def delete_messages(message_ids, chunk_size=BULK_CHUNK_SIZE, on_progress=None, pause=0.0):
+    report = BulkReport('delete_messages', len(message_ids))
+    def apply(ids):
+        return Message.query.filter(Message.id.in_(ids)).delete(synchronize_session=False)
+    return _run_chunks(report, _chunked(message_ids, chunk_size), apply, on_progress, pause)
+
+def purge_messages(user_ids=None, before=None, after=None, include_archive=True,
+                   chunk_size=BULK_CHUNK_SIZE, on_progress=None, pause=0.0):
+    report = BulkReport('purge_messages')
+    models = (Message, MessageArchive) if include_archive else (Message,)
+    for model in models:
+        filters = []
+        if user_ids is not None:
+            filters.append(model.user_id.in_(list(user_ids)))
+        if before is not None:
+            filters.append(model.timestamp < before)
+        if after is not None:
+            filters.append(model.timestamp >= after)
+        def apply(ids, model=model):
+            return model.query.filter(model.id.in_(ids)).delete(synchronize_session=False)
+        _run_chunks(report, _matching_ids(model, filters, chunk_size), apply, on_progress, pause)
+    logging.info(f'Purged {report.done} messages in {report.chunks} chunks')
+    return report
+
+def delete_users(user_ids, chunk_size=BULK_CHUNK_SIZE, on_progress=None, pause=0.0):
+    # Messages go first in their own chunks, so no single transaction has to delete a
+    # spammer's whole history together with the account.
+    report = BulkReport('delete_users', len(user_ids))
+    def apply(ids):
+        report.dependent_rows += purge_messages(ids, chunk_size=chunk_size, pause=pause).done
+        record_signups([created_at for created_at, in
+                        db.session.query(User.created_at).filter(User.id.in_(ids))], -1)
+        deleted = User.query.filter(User.id.in_(ids)).delete(synchronize_session=False)
+        db.session.commit()
+        token_cache.invalidate_users(ids)
+        return deleted
+    _run_chunks(report, _chunked(user_ids, chunk_size), apply, on_progress, pause)
+    db.session.expire_all()
+    return report
+
+def set_admin_many(user_ids, is_admin=True, chunk_size=BULK_CHUNK_SIZE, on_progress=None, pause=0.0):
+    report = BulkReport('set_admin', len(user_ids))
+    def apply(ids):
+        updated = User.query.filter(User.id.in_(ids)).update({User.is_admin: is_admin},
+                                                             synchronize_session=False)
+        db.session.commit()
+        token_cache.invalidate_users(ids)
+        return updated
+    _run_chunks(report, _chunked(user_ids, chunk_size), apply, on_progress, pause)
+    db.session.expire_all()
+    return report
\ No newline at end of file
@@ -0,0 +1,256 @@
+from collections import OrderedDict
+from functools import wraps
+import hashlib
+import logging
+import os
+import pickle
+import tempfile
+import threading
+import time
+from flask import Response, request, session
+from markupsafe import Markup
+from versions import SharedVersion
+
+PAGE_TTL = 300
+MAX_MEMORY_ENTRIES = 2048
+MAX_DISK_ENTRIES = 10000
+MAX_DISK_BYTES = 256 * 1024 * 1024
+PRUNE_EVERY = 100  # writes between size checks of the disk directory
+
+class MemoryBackend:
+    def __init__(self, max_entries=MAX_MEMORY_ENTRIES):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires is not None and expires < time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None):
+        expires = time.time() + ttl if ttl else None
+        with self._lock:
+            self._entries[key] = (expires, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+class DiskBackend:
+    # One pickle per key under a directory; shared by every worker process on the host.
+    # Bounded by entry count and total size: the oldest files go first.
+    def __init__(self, directory, max_entries=MAX_DISK_ENTRIES, max_bytes=MAX_DISK_BYTES):
+        self.directory = directory
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._writes = 0
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.directory, hashlib.sha256(key.encode()).hexdigest() + '.cache')
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                expires, value = pickle.load(f)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            return None
+        if expires is not None and expires < time.time():
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            return None
+        return value
+
+    def set(self, key, value, ttl=None):
+        expires = time.time() + ttl if ttl else None
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                pickle.dump((expires, value), f, pickle.HIGHEST_PROTOCOL)
+            # Atomic rename so readers never see a half-written entry.
+            os.replace(tmp_path, self._path(key))
+        except OSError:
+            logging.exception('Page cache write failed')
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            return
+        with self._lock:
+            self._writes += 1
+            due = self._writes % PRUNE_EVERY == 0
+        if due:
+            self.prune()
+
+    def prune(self):
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith('.cache'):
+                try:
+                    stat = entry.stat()
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+        total = sum(size for _, size, _ in entries)
+        if len(entries) <= self.max_entries and total <= self.max_bytes:
+            return 0
+        entries.sort()
+        removed = 0
+        # Down to 90% so the next few writes do not trigger another pass.
+        while entries and (len(entries) > self.max_entries * 0.9 or total > self.max_bytes * 0.9):
+            _, size, path = entries.pop(0)
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            removed += 1
+        return removed
+
+    def clear(self):
+        for name in os.listdir(self.directory):
+            if name.endswith('.cache'):
+                try:
+                    os.remove(os.path.join(self.directory, name))
+                except OSError:
+                    pass
+
+    def __len__(self):
+        return sum(1 for name in os.listdir(self.directory) if name.endswith('.cache'))
+
+def is_anonymous():
+    return 'token' not in session and 'user_id' not in session
+
+def has_session_data():
+    # Pending flashes, a CSRF token or anything else in the cookie can show up in the page.
+    return any(key != '_permanent' for key in session)
+
+class PageCache:
+    def __init__(self, backend=None, ttl=PAGE_TTL):
+        self.backend = backend or MemoryBackend()
+        self.ttl = ttl
+        # Kept in the database so a course change in another worker, the job
+        # worker or the importer CLI retires this process's pages too.
+        self.shared_version = SharedVersion('pages')
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+        self.fragment_hits = 0
+        self.fragment_misses = 0
+
+    def init_app(self, app):
+        backend = app.config.get('PAGE_CACHE_BACKEND', os.environ.get('PAGE_CACHE_BACKEND', 'memory'))
+        if backend == 'disk':
+            directory = app.config.get('PAGE_CACHE_DIR', os.environ.get('PAGE_CACHE_DIR',
+                                       os.path.join(app.instance_path, 'page_cache')))
+            self.backend = DiskBackend(directory)
+        else:
+            self.backend = MemoryBackend()
+        self.ttl = app.config.get('PAGE_CACHE_TTL', self.ttl)
+        app.jinja_env.globals['page_cache'] = self
+
+    def version(self):
+        return self.shared_version.current()
+
+    def invalidate(self):
+        # Old entries are keyed by the old version and can never be served again;
+        # clearing just frees the local space now instead of waiting for the TTL.
+        self.shared_version.bump()
+        self.backend.clear()
+        logging.info('Page cache invalidated')
+
+    def _respond(self, entry):
+        response = Response(entry['body'], status=entry['status'], mimetype=entry['mimetype'])
+        response.set_etag(entry['etag'])
+        response.last_modified = entry['last_modified']
+        response.cache_control.public = True
+        response.cache_control.no_cache = True
+        response.vary.add('Cookie')
+        return response.make_conditional(request)
+
+    def cached(self, ttl=None, query=()):
+        # Only the query parameters named in `query` are part of the key; a request
+        # carrying any other parameter is not cached, so arbitrary query strings
+        # cannot fill the store.
+        def decorator(view):
+            @wraps(view)
+            def wrapper(*args, **kwargs):
+                # Logged-in pages differ per user; they use fragment() for the shared parts.
+                if request.method not in ('GET', 'HEAD') or not is_anonymous() or has_session_data() or \
+                        any(name not in query for name in request.args):
+                    return view(*args, **kwargs)
+                version = self.version()
+                params = '&'.join(f'{name}={value}' for name, value in sorted(request.args.items(multi=True)))
+                key = f'page:{version}:{request.path}?{params}'
+                entry = self.backend.get(key)
+                if entry is None:
+                    self.misses += 1
+                    response = view(*args, **kwargs)
+                    if not isinstance(response, Response):
+                        response = Response(response)
+                    # A view that wrote to the session (flashed, set a CSRF token) made a
+                    # page for this visitor only.
+                    if response.status_code != 200 or response.is_streamed or session.modified or \
+                            not is_anonymous():
+                        return response
+                    if self.version() != version:
+                        # Courses changed while rendering; this body may predate the change.
+                        return response
+                    body = response.get_data()
+                    entry = {
+                        'body': body,
+                        'status': response.status_code,
+                        'mimetype': response.mimetype,
+                        'etag': hashlib.sha1(body).hexdigest(),
+                        'last_modified': int(time.time()),
+                    }
+                    self.backend.set(key, entry, ttl or self.ttl)
+                else:
+                    self.hits += 1
+                response = self._respond(entry)
+                if response.status_code == 304:
+                    self.not_modified += 1
+                return response
+            return wrapper
+        return decorator
+
+    def fragment(self, name, render, *key_parts, ttl=None):
+        key = f'fragment:{self.version()}:{name}:' + ':'.join(str(part) for part in key_parts)
+        html = self.backend.get(key)
+        if html is None:
+            self.fragment_misses += 1
+            html = str(render())
+            self.backend.set(key, html, ttl or self.ttl)
+        else:
+            self.fragment_hits += 1
+        return Markup(html)
+
+    def stats(self):
+        return {
+            'entries': len(self.backend),
+            'hits': self.hits,
+            'misses': self.misses,
+            'not_modified': self.not_modified,
+            'fragment_hits': self.fragment_hits,
+            'fragment_misses': self.fragment_misses,
+        }
+
+page_cache = PageCache()
\ No newline at end of file
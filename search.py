@@ -0,0 +1,274 @@
+from collections import Counter, OrderedDict
+import heapq
+import math
+import re
+import sqlite3
+import threading
+from flask import Blueprint, jsonify, request
+from sqlalchemy import text
+from model import db, Course
+from catalog import CATALOG_COLUMNS, course_to_dict
+from versions import SharedVersion
+
+TITLE_WEIGHT = 2.0
+BM25_K1 = 1.2
+BM25_B = 0.75
+INDEX_BATCH_SIZE = 1000
+
+# Tashkeel, Quranic marks and tatweel carry no meaning for search.
+_DIACRITICS = re.compile('[\u0610-\u061a\u064b-\u065f\u0670\u06d6-\u06ed\u0640]')
+_LETTERS = str.maketrans({
+    'أ': 'ا', 'إ': 'ا', 'آ': 'ا', 'ٱ': 'ا',
+    'ى': 'ي', 'ئ': 'ي', 'ؤ': 'و', 'ة': 'ه',
+    **{chr(0x0660 + i): str(i) for i in range(10)},
+    **{chr(0x06f0 + i): str(i) for i in range(10)},
+})
+_TOKEN = re.compile(r'[^\W_]+')
+# Definite article with attached conjunctions/prepositions: "والبرمجة" -> "برمجه".
+_PREFIXES = ('وال', 'بال', 'كال', 'فال', 'لل', 'ال')
+
+search_bp = Blueprint('search', __name__)
+
+def normalize(value):
+    return _DIACRITICS.sub('', value.casefold()).translate(_LETTERS)
+
+def tokenize(value):
+    tokens = []
+    for token in _TOKEN.findall(normalize(value or '')):
+        for prefix in _PREFIXES:
+            if token.startswith(prefix) and len(token) - len(prefix) >= 3:
+                token = token[len(prefix):]
+                break
+        tokens.append(token)
+    return tokens
+
+def fts5_available():
+    if db.engine.dialect.name != 'sqlite':
+        return False
+    try:
+        sqlite3.connect(':memory:').execute('CREATE VIRTUAL TABLE probe USING fts5(x)')
+    except sqlite3.OperationalError:
+        return False
+    return True
+
+class Fts5Backend:
+    name = 'fts5'
+
+    def exists(self):
+        return db.session.execute(text(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'course_search'"
+        )).first() is not None
+
+    def clear(self):
+        # Text is stored pre-normalised, so unicode61 only has to split on spaces.
+        db.session.execute(text(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS course_search "
+            "USING fts5(title, description, tokenize='unicode61')"
+        ))
+        db.session.execute(text('DELETE FROM course_search'))
+
+    def add_many(self, docs):
+        db.session.execute(
+            text('INSERT INTO course_search(rowid, title, description) VALUES (:id, :title, :description)'),
+            [{'id': course_id, 'title': ' '.join(title), 'description': ' '.join(description)}
+             for course_id, title, description in docs],
+        )
+
+    def remove(self, course_id):
+        db.session.execute(text('DELETE FROM course_search WHERE rowid = :id'), {'id': course_id})
+
+    def search(self, terms, limit):
+        rows = db.session.execute(text(
+            'SELECT rowid, bm25(course_search, :title_weight, 1.0) AS rank FROM course_search '
+            'WHERE course_search MATCH :query ORDER BY rank LIMIT :limit'
+        ), {
+            'title_weight': TITLE_WEIGHT,
+            'query': ' '.join(f'"{term}"' for term in terms),
+            'limit': limit,
+        })
+        # FTS5 reports bm25 as a negative number where lower is better.
+        return [(course_id, -rank) for course_id, rank in rows]
+
+class MemoryBackend:
+    name = 'memory'
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self.clear()
+
+    def exists(self):
+        return False
+
+    def clear(self):
+        with self._lock:
+            self._postings = {}
+            self._doc_terms = {}
+            self._doc_lengths = {}
+            self._total_length = 0.0
+
+    def add_many(self, docs):
+        with self._lock:
+            for course_id, title, description in docs:
+                self.remove(course_id)
+                weights = Counter()
+                for term in title:
+                    weights[term] += TITLE_WEIGHT
+                for term in description:
+                    weights[term] += 1.0
+                for term, weight in weights.items():
+                    self._postings.setdefault(term, {})[course_id] = weight
+                length = sum(weights.values())
+                self._doc_terms[course_id] = tuple(weights)
+                self._doc_lengths[course_id] = length
+                self._total_length += length
+
+    def remove(self, course_id):
+        with self._lock:
+            for term in self._doc_terms.pop(course_id, ()):
+                postings = self._postings[term]
+                del postings[course_id]
+                if not postings:
+                    del self._postings[term]
+            self._total_length -= self._doc_lengths.pop(course_id, 0.0)
+
+    def search(self, terms, limit):
+        with self._lock:
+            postings = [self._postings.get(term) for term in set(terms)]
+            if not postings or not all(postings):
+                return []
+            postings.sort(key=len)
+            doc_count = len(self._doc_lengths)
+            avg_length = self._total_length / doc_count
+            idfs = [math.log(1 + (doc_count - len(p) + 0.5) / (len(p) + 0.5)) for p in postings]
+            scores = []
+            for course_id in postings[0]:
+                if not all(course_id in p for p in postings[1:]):
+                    continue
+                norm = BM25_K1 * (1 - BM25_B + BM25_B * self._doc_lengths[course_id] / avg_length)
+                score = 0.0
+                for idf, p in zip(idfs, postings):
+                    tf = p[course_id]
+                    score += idf * tf * (BM25_K1 + 1) / (tf + norm)
+                scores.append((score, course_id))
+            return [(course_id, score) for score, course_id in heapq.nlargest(limit, scores)]
+
+class SearchIndex:
+    def __init__(self, cache_size=256):
+        self.backend = None
+        self.cache_size = cache_size
+        self._built = False
+        self._lock = threading.Lock()
+        self._cache = OrderedDict()
+        self._generation = 0
+        # Bumped by every index change in any process; see _check_version().
+        self.version = SharedVersion('search')
+        self._seen_version = None
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+    def _get_backend(self):
+        if self.backend is None:
+            self.backend = Fts5Backend() if fts5_available() else MemoryBackend()
+            self._built = self.backend.exists()
+        return self.backend
+
+    def rebuild(self, batch_size=INDEX_BATCH_SIZE):
+        backend = self._get_backend()
+        backend.clear()
+        last_id = 0
+        while True:
+            rows = (db.session.query(Course.id, Course.title, Course.description)
+                    .filter(Course.id > last_id)
+                    .order_by(Course.id)
+                    .limit(batch_size)
+                    .all())
+            if not rows:
+                break
+            backend.add_many((row.id, tokenize(row.title), tokenize(row.description)) for row in rows)
+            last_id = rows[-1].id
+        db.session.commit()
+        self._built = True
+        self.invalidate()
+
+    def add_course(self, course):
+        backend = self._get_backend()
+        if not self._built:
+            return
+        backend.add_many([(course.id, tokenize(course.title), tokenize(course.description))])
+        db.session.commit()
+        self.invalidate()
+
+    def add_since(self, last_id):
+        # Bulk import: indexes every course with a higher id inside the caller's
+        # transaction, so rows and index entries commit together. The caller
+        # calls invalidate() after its commit.
+        backend = self._get_backend()
+        if not self._built:
+            return
+        rows = (db.session.query(Course.id, Course.title, Course.description)
+                .filter(Course.id > last_id)
+                .order_by(Course.id))
+        backend.add_many((row.id, tokenize(row.title), tokenize(row.description)) for row in rows)
+
+    def remove_course(self, course_id):
+        backend = self._get_backend()
+        if not self._built:
+            return
+        backend.remove(course_id)
+        db.session.commit()
+        self.invalidate()
+
+    def search(self, query, limit=20):
+        terms = tokenize(query)
+        if not terms:
+            return []
+        key = (tuple(terms), limit)
+        self._check_version()
+        with self._lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                self.cache_hits += 1
+                return self._cache[key]
+            self.cache_misses += 1
+            generation = self._generation
+        backend = self._get_backend()
+        if not self._built:
+            self.rebuild()
+        ranked = backend.search(terms, limit)
+        rows = {row.id: row for row in
+                db.session.query(*CATALOG_COLUMNS).filter(Course.id.in_([c for c, _ in ranked]))}
+        results = [dict(course_to_dict(rows[course_id]), score=round(score, 4))
+                   for course_id, score in ranked if course_id in rows]
+        with self._lock:
+            if generation == self._generation:
+                self._cache[key] = results
+                if len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+        return results
+
+    def invalidate(self):
+        with self._lock:
+            self._generation += 1
+            self._cache.clear()
+        self._seen_version = self.version.bump()
+
+    def _check_version(self):
+        # Another process changed the index: its results are stale here, and an
+        # in-memory backend (which only this process holds) has to be rebuilt.
+        version = self.version.current()
+        if version == self._seen_version:
+            return
+        with self._lock:
+            self._generation += 1
+            self._cache.clear()
+        if self._seen_version is not None and self.backend is not None and self.backend.name == 'memory':
+            self._built = False
+        self._seen_version = version
+
+search_index = SearchIndex()
+
+@search_bp.route('/api/search')
+def search_courses():
+    query = request.args.get('q', '')
+    limit = min(max(request.args.get('limit', 20, type=int), 1), 100)
+    return jsonify({'query': query, 'results': search_index.search(query, limit)})
\ No newline at end of file
@@ -0,0 +1,142 @@
+from contextlib import contextmanager
+import logging
+import os
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
+from sqlalchemy.orm import Session
+from model import db
+
+DATABASE_PATH = os.environ.get('DATABASE_PATH', 'users.db')
+DATABASE_URL = os.environ.get('DATABASE_URL')
+DATABASE_READ_URL = os.environ.get('DATABASE_READ_URL')
+
+BUSY_TIMEOUT_MS = 5000
+# WAL lets readers run alongside the single writer; NORMAL is durable in WAL mode
+# except for the last transactions before a power loss.
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': BUSY_TIMEOUT_MS,
+    'mmap_size': 256 * 1024 * 1024,
+    'cache_size': -64000,  # negative means KiB, so 64 MB per connection
+    'temp_store': 'MEMORY',
+}
+POOL_SIZE = 10
+MAX_OVERFLOW = 20
+POOL_RECYCLE = 1800
+
+class Storage:
+    def __init__(self):
+        self.url = None
+        self.pragmas = None
+        self.read_engine = None
+
+    def init_app(self, app, pragmas=None):
+        # Replaces a bare db.init_app(app): engine options have to be in place before it.
+        # Explicit app config wins over the environment, so a test or tool that names
+        # its own database never writes to (or reads from) the production one.
+        url = app.config.get('DATABASE_URL') or app.config.get('SQLALCHEMY_DATABASE_URI')
+        if not url and app.config.get('DATABASE_PATH'):
+            url = f'sqlite:///{os.path.abspath(app.config["DATABASE_PATH"])}'
+        configured = bool(url)
+        if not url:
+            url = DATABASE_URL or f'sqlite:///{os.path.abspath(DATABASE_PATH)}'
+        app.config['SQLALCHEMY_DATABASE_URI'] = url
+        self.url = make_url(url)
+        self.pragmas = SQLITE_PRAGMAS if pragmas is None else pragmas
+        options = app.config.setdefault('SQLALCHEMY_ENGINE_OPTIONS', {})
+        if self.is_sqlite:
+            if not self.in_memory:
+                options.setdefault('pool_size', POOL_SIZE)
+                options.setdefault('max_overflow', MAX_OVERFLOW)
+            connect_args = options.setdefault('connect_args', {})
+            # Connections move between request threads through the pool.
+            connect_args.setdefault('check_same_thread', False)
+            if 'busy_timeout' in self.pragmas:
+                connect_args.setdefault('timeout', self.pragmas['busy_timeout'] / 1000)
+        else:
+            options.setdefault('pool_size', POOL_SIZE)
+            options.setdefault('max_overflow', MAX_OVERFLOW)
+            options.setdefault('pool_recycle', POOL_RECYCLE)
+            options.setdefault('pool_pre_ping', True)
+        app.extensions['storage'] = self
+        db.init_app(app)
+        with app.app_context():
+            engine = db.engine
+        # Flask-SQLAlchemy resolves a relative SQLite path against app.instance_path;
+        # keep its URL so the read path opens the same file as the writer.
+        self.url = engine.url
+        if self.is_sqlite:
+            event.listen(engine, 'connect', self._apply_pragmas)
+        self.read_engine = self._make_read_engine(app, configured)
+        logging.info(f'Storage: {self.url.render_as_string(hide_password=True)}'
+                     f' (read path: {"separate" if self.read_engine is not None else "shared"})')
+
+    @property
+    def is_sqlite(self):
+        return self.url is not None and self.url.get_backend_name() == 'sqlite'
+
+    @property
+    def in_memory(self):
+        return self.is_sqlite and self.url.database in (None, '', ':memory:')
+
+    def _apply_pragmas(self, dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in self.pragmas.items():
+            cursor.execute(f'PRAGMA {name}={value}')
+        cursor.close()
+
+    def _make_read_engine(self, app, configured):
+        read_url = app.config.get('DATABASE_READ_URL') or (None if configured else DATABASE_READ_URL)
+        if read_url:
+            return create_engine(read_url, pool_size=POOL_SIZE, max_overflow=MAX_OVERFLOW,
+                                 pool_recycle=POOL_RECYCLE, pool_pre_ping=True)
+        if not self.is_sqlite or self.in_memory:
+            return None
+        path = self.url.database
+        engine = create_engine(f'sqlite:///file:{path}?mode=ro&uri=true',
+                               pool_size=POOL_SIZE, max_overflow=MAX_OVERFLOW,
+                               connect_args={'check_same_thread': False,
+                                             'timeout': BUSY_TIMEOUT_MS / 1000})
+
+        @event.listens_for(engine, 'connect')
+        def read_only_pragmas(dbapi_connection, connection_record):
+            cursor = dbapi_connection.cursor()
+            for name in ('busy_timeout', 'mmap_size', 'cache_size', 'temp_store'):
+                if name in self.pragmas:
+                    cursor.execute(f'PRAGMA {name}={self.pragmas[name]}')
+            cursor.execute('PRAGMA query_only=ON')
+            cursor.close()
+
+        return engine
+
+    @contextmanager
+    def read_session(self):
+        # Long reports and streams read here so they never hold a writer connection.
+        # Without a separate read path this is just the request's session.
+        if self.read_engine is None:
+            yield db.session
+            return
+        session = Session(self.read_engine)
+        try:
+            yield session
+        finally:
+            session.close()
+
+    def stats(self):
+        with db.engine.connect() as connection:
+            pool = db.engine.pool
+            stats = {'url': self.url.render_as_string(hide_password=True),
+                     'pool': pool.status(),
+                     'read_path': 'separate' if self.read_engine is not None else 'shared'}
+            if self.is_sqlite:
+                for name in ('journal_mode', 'synchronous', 'busy_timeout', 'mmap_size', 'cache_size'):
+                    stats[name] = connection.exec_driver_sql(f'PRAGMA {name}').scalar()
+        return stats
+
+    def dispose(self):
+        if self.read_engine is not None:
+            self.read_engine.dispose()
+            self.read_engine = None
+
+storage = Storage()
\ No newline at end of file
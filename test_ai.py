@@ -0,0 +1,214 @@
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import asyncio
+import json
+import threading
+import time
+import unittest
+from unittest.mock import patch
+from flask import Flask
+from ai import AIService, ai_bp
+from auth import Identity
+
+class StubUpstream(BaseHTTPRequestHandler):
+    """يحاكي واجهة Gemini محليا مع تأخير ثابت"""
+    delay = 0.05
+    chunk_delay = 0.05
+    chunks = 10
+    calls = 0
+    fail = False
+    disconnected = threading.Event()
+
+    def do_POST(self):
+        type(self).calls += 1
+        body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        if self.path.startswith('/stream'):
+            return self.stream_chunks()
+        time.sleep(self.delay)
+        if self.fail:
+            self.send_response(500)
+            self.end_headers()
+            return
+        prompt = body['contents'][0]['parts'][0]['text']
+        payload = json.dumps({'candidates': [{'content': {'parts': [{'text': f'answer: {prompt}'}]}}]}).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def stream_chunks(self):
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.end_headers()
+        try:
+            for i in range(self.chunks):
+                time.sleep(self.chunk_delay)
+                event = {'candidates': [{'content': {'parts': [{'text': f'part{i} '}]}}]}
+                self.wfile.write(f'data: {json.dumps(event)}\r\n\r\n'.encode())
+                self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            type(self).disconnected.set()
+
+    def log_message(self, *args):
+        pass
+
+class StubServer(ThreadingHTTPServer):
+    # The default backlog of 5 drops connects under bursts and adds 1s SYN retries.
+    request_queue_size = 128
+
+class TestAIService(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.server = StubServer(('127.0.0.1', 0), StubUpstream)
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.url = f'http://127.0.0.1:{cls.server.server_port}/generate'
+        cls.stream_url = f'http://127.0.0.1:{cls.server.server_port}/stream'
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+
+    def setUp(self):
+        StubUpstream.calls = 0
+        StubUpstream.fail = False
+        StubUpstream.disconnected.clear()
+        self.service = AIService(url=self.url, api_key='', stream_url=self.stream_url)
+
+    def tearDown(self):
+        self.service.close()
+
+    def test_cache_hit_for_normalised_prompt(self):
+        """نفس السؤال بصيغة مختلفة قليلا يستخدم الكاش"""
+        first = asyncio.run(self.service.ask('ما هي   البرمجة؟'))
+        second = asyncio.run(self.service.ask('ما هيَ البرمجة؟'))
+        self.assertEqual(first, second)
+        self.assertEqual(StubUpstream.calls, 1)
+        self.assertEqual(self.service.stats()['hits'], 1)
+
+    def test_concurrent_identical_requests_coalesce(self):
+        """الطلبات المتزامنة المتطابقة تدمج في طلب واحد"""
+        async def burst():
+            return await asyncio.gather(*(self.service.ask('سؤال واحد') for _ in range(20)))
+        answers = asyncio.run(burst())
+        self.assertEqual(set(answers), {'answer: سؤال واحد'})
+        self.assertEqual(StubUpstream.calls, 1)
+        self.assertEqual(self.service.stats()['coalesced'], 19)
+
+    def test_ttl_and_lru_eviction(self):
+        """انتهاء الصلاحية وإخراج الأقدم عند امتلاء الكاش"""
+        service = AIService(url=self.url, cache_ttl=0.1, cache_size=2)
+        try:
+            service.ask_sync('a')
+            time.sleep(0.15)
+            service.ask_sync('a')
+            self.assertEqual(StubUpstream.calls, 2)
+            service.ask_sync('b')
+            service.ask_sync('c')
+            self.assertEqual(service.stats()['cached'], 2)
+        finally:
+            service.close()
+
+    def test_errors_are_not_cached(self):
+        """الأخطاء لا تخزن في الكاش"""
+        StubUpstream.fail = True
+        with self.assertRaises(Exception):
+            self.service.ask_sync('fail')
+        StubUpstream.fail = False
+        self.assertEqual(self.service.ask_sync('fail'), 'answer: fail')
+        self.assertEqual(StubUpstream.calls, 2)
+
+    def test_hit_rate_and_latency(self):
+        """قياس نسبة الإصابة وزمن p95 لحمل متكرر (القياس الدقيق في benchmarks.py ai)"""
+        prompts = [f'سؤال {i % 10}' for i in range(200)]
+        latencies = []
+        self.service.ask_sync(prompts[0])
+        StubUpstream.calls = 0
+
+        async def run():
+            async def one(prompt):
+                start = time.perf_counter()
+                await self.service.ask(prompt)
+                latencies.append(time.perf_counter() - start)
+            await asyncio.gather(*(one(p) for p in prompts))
+
+        asyncio.run(run())
+        latencies.sort()
+        p95 = latencies[int(len(latencies) * 0.95)]
+        stats = self.service.stats()
+        self.assertEqual(StubUpstream.calls, 9)
+        self.assertEqual(stats['misses'], 10)
+        self.assertEqual(stats['hits'] + stats['coalesced'], 200 - 9)
+        self.assertGreaterEqual(stats['hit_rate'], 0.95)
+        # Loose bound for slow CI machines: without caching and coalescing the 200 calls
+        # queue behind the connection pool and take seconds.
+        self.assertLess(p95, StubUpstream.delay * 20)
+
+    def test_cancelled_leader_does_not_strand_waiters(self):
+        """إلغاء الطلب الأول لا يترك الطلبات المدموجة معلقة"""
+        self.service.ask_sync('تهيئة الاتصال')
+        loop = self.service._ensure_loop()
+        leader = asyncio.run_coroutine_threadsafe(self.service._ask('سؤال'), loop)
+        follower = asyncio.run_coroutine_threadsafe(self.service._ask('سؤال'), loop)
+        time.sleep(StubUpstream.delay / 2)
+        leader.cancel()
+        self.assertEqual(follower.result(5), 'answer: سؤال')
+        self.assertEqual(self.service.stats()['coalesced'], 1)
+        # The answer was still cached for the next caller.
+        self.assertEqual(self.service.ask_sync('سؤال'), 'answer: سؤال')
+        self.assertEqual(StubUpstream.calls, 2)
+
+    def test_streaming_time_to_first_token(self):
+        """البث يقلل زمن وصول أول جزء مقارنة بانتظار الرد كاملا"""
+        self.service.ask_sync('تهيئة الاتصال')
+
+        async def consume():
+            start = time.perf_counter()
+            first, parts = None, []
+            async for chunk in self.service.stream('اشرح البرمجة'):
+                if first is None:
+                    first = time.perf_counter() - start
+                parts.append(chunk)
+            return first, time.perf_counter() - start, ''.join(parts)
+
+        first, total, text = asyncio.run(consume())
+        self.assertEqual(text, ''.join(f'part{i} ' for i in range(StubUpstream.chunks)))
+        self.assertLess(first, total / 3)
+        # The completed answer is cached for later non-streaming calls.
+        self.assertEqual(self.service.ask_sync('اشرح البرمجة'), text)
+
+    def stream_client(self, token='signed-in'):
+        flask_app = Flask(__name__)
+        flask_app.secret_key = 'test'
+        flask_app.register_blueprint(ai_bp)
+        client = flask_app.test_client()
+        if token:
+            with client.session_transaction() as sess:
+                sess['token'] = token
+        return client
+
+    def test_stream_requires_login(self):
+        """البث يرفض الزائر غير المسجل ولا يستهلك الواجهة الصاعدة"""
+        with patch('ai.ai_service', self.service):
+            self.assertEqual(self.stream_client(None).get('/api/ai/stream?message=x').status_code, 401)
+            self.assertEqual(self.stream_client('invalid').get('/api/ai/stream?message=x').status_code, 401)
+        self.assertEqual(StubUpstream.calls, 0)
+
+    def test_stream_cancelled_when_client_disconnects(self):
+        """إغلاق المستهلك يلغي الطلب الصاعد"""
+        client = self.stream_client()
+        with patch('ai.ai_service', self.service), \
+                patch('ai.current_identity', return_value=Identity(1, 'sara', False)):
+            response = client.get('/api/ai/stream', query_string={'message': 'سؤال طويل'},
+                                                  buffered=False)
+            body = iter(response.response)
+            self.assertIn('part0', next(body).decode())
+            response.close()
+        self.assertTrue(StubUpstream.disconnected.wait(2))
+        for _ in range(100):
+            if self.service.stats()['cancelled']:
+                break
+            time.sleep(0.01)
+        self.assertEqual(self.service.stats()['cancelled'], 1)
+
+if __name__ == '__main__':
+    unittest.main()
\ No newline at end of file
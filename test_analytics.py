@@ -0,0 +1,77 @@
+from datetime import datetime
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+from flask import Flask
+from model import db, User, SignupRollup
+from analytics import backfill_signups, signup_series
+from hashing import HashingService
+from importer import import_users
+import operations
+
+class TestSignupRollups(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.flask_app = Flask(__name__)
+        self.flask_app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{os.path.join(self.tmp.name, "stats.db")}'
+        db.init_app(self.flask_app)
+        self.ctx = self.flask_app.app_context()
+        self.ctx.push()
+        db.create_all()
+        self.hashing = patch('operations.hashing_service', HashingService(workers=0, method='pbkdf2:sha256:1000'))
+        self.hashing.start()
+
+    def tearDown(self):
+        self.hashing.stop()
+        db.session.remove()
+        db.drop_all()
+        self.ctx.pop()
+        self.tmp.cleanup()
+
+    def today(self):
+        return signup_series('day', 1)['data'][0]
+
+    def rollups(self):
+        return sorted((row.period, row.bucket, row.count) for row in SignupRollup.query)
+
+    def test_register_and_delete(self):
+        """التسجيل يزيد العداد والحذف ينقصه"""
+        operations.register_user('sara', 'sara@example.com', 'secret')
+        operations.register_user('omar', 'omar@example.com', 'secret')
+        self.assertEqual(self.today(), 2)
+        self.assertEqual(signup_series('year', 1)['data'], [2])
+        operations.delete_user(db.session.query(User.id).filter_by(username='sara').scalar())
+        self.assertEqual(self.today(), 1)
+
+    def test_imported_users_counted(self):
+        """المستخدمون المستوردون يدخلون العداد فلا يصبح سالبا عند حذفهم"""
+        path = os.path.join(self.tmp.name, 'users.csv')
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write('username,email,password\n')
+            for i in range(5):
+                f.write(f'user{i},user{i}@example.com,secret\n')
+        with patch('importer.HASH_METHOD', 'pbkdf2:sha256:1000'):
+            self.assertEqual(import_users(path, batch_size=2, workers=0).inserted, 5)
+        self.assertEqual(self.today(), 5)
+        operations.delete_users([user.id for user in User.query])
+        self.assertEqual(self.today(), 0)
+        self.assertTrue(all(count >= 0 for _, _, count in self.rollups()))
+
+    def test_backfill_matches_incremental(self):
+        """إعادة البناء من جدول المستخدمين تطابق العد التراكمي"""
+        for i, day in enumerate((1, 1, 2)):
+            db.session.add(User(username=f'u{i}', email=f'u{i}@example.com', password='x',
+                                created_at=datetime(2024, 3, day)))
+        db.session.commit()
+        operations.register_user('sara', 'sara@example.com', 'secret')
+        incremental = [row for row in self.rollups() if row[1].startswith(str(datetime.utcnow().year))]
+        self.assertEqual(backfill_signups(), 7)
+        rows = self.rollups()
+        self.assertIn(('day', '2024-03-01', 2), rows)
+        self.assertIn(('month', '2024-03', 3), rows)
+        self.assertEqual([row for row in rows if row[1].startswith(str(datetime.utcnow().year))], incremental)
+        self.assertEqual(signup_series('day', 3, now=datetime(2024, 3, 3))['data'], [2, 1, 0])
+
+if __name__ == '__main__':
+    unittest.main()
\ No newline at end of file
@@ -1,19 +1,29 @@
+import os
+import tempfile
 import unittest
 from flask import url_for, session
 from werkzeug.security import generate_password_hash
 import jwt
 import datetime
-from unittest.mock import patch, MagicMock
+from unittest.mock import patch, AsyncMock, MagicMock
 import time
 import pytest
-from locust import HttpUser, task, between
-import multiprocessing
-from app import app, db, User, Course, Message, create_token, verify_token, get_ai_response
+# app.py builds the app at import time, which needs a key outside debug mode, and binds
+# the database then; point it at a scratch file so drop_all never touches users.db.
+os.environ.setdefault('SECRET_KEY', 'test-secret-key')
+_tmp = tempfile.TemporaryDirectory()
+with patch('storage.DATABASE_PATH', os.path.join(_tmp.name, 'app.db')):
+    from app import app, db, User, Course, Message, create_token, verify_token, get_ai_response
+import operations
+from ai import ai_service
+
+# The HTML pages these tests drive (/user/*, /admin/*, /course/*, /like/*) belonged to the old
+# single-module app; the JSON APIs that replaced them are tested in the per-module files.
+old_pages = unittest.skip('الصفحات القديمة غير موجودة في هذه النسخة من التطبيق')
 
 class TestFlaskApp(unittest.TestCase):
     def setUp(self):
         app.config['TESTING'] = True
-        app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
         app.config['WTF_CSRF_ENABLED'] = False
         self.app = app.test_client()
         
@@ -83,31 +93,22 @@ class TestFlaskApp(unittest.TestCase):
         result = verify_token('invalidtoken')
         self.assertEqual(result, 'توكن غير صالح')
 
-    @patch('app.httpx.AsyncClient')
-    def test_ai_response_function(self, mock_client):
+    @patch.object(ai_service, 'ask', new_callable=AsyncMock)
+    def test_ai_response_function(self, mock_ask):
         """اختبار وحدة الذكاء الاصطناعي باستخدام mock"""
-        # Setup mock response
-        mock_response = MagicMock()
-        mock_response.json.return_value = {
-            "candidates": [{
-                "content": {
-                    "parts": [{
-                        "text": "Mocked AI Response"
-                    }]
-                }
-            }]
-        }
-        mock_client.return_value.__aenter__.return_value.post.return_value = mock_response
-        
+        mock_ask.return_value = "Mocked AI Response"
+
         # Test the function
         import asyncio
         response = asyncio.run(get_ai_response("test input"))
         self.assertEqual(response, "Mocked AI Response")
+        mock_ask.assert_awaited_once_with("test input")
 
     ####################################
     # 2. اختبارات التكامل (Integration Tests)
     ####################################
     
+    @old_pages
     def test_user_registration_flow(self):
         """اختبار تكامل سير عمل تسجيل المستخدم"""
         # Registration
@@ -129,6 +130,7 @@ class TestFlaskApp(unittest.TestCase):
         self.assertEqual(response.status_code, 200)
         self.assertIn(b'newuser', response.data)
 
+    @old_pages
     def test_course_management_flow(self):
         """اختبار تكامل إدارة الكورسات"""
         self.login('admin', 'adminpass')
@@ -160,6 +162,7 @@ class TestFlaskApp(unittest.TestCase):
     # 3. اختبارات النظام (System Tests)
     ####################################
     
+    @old_pages
     def test_full_application_flow(self):
         """اختبار النظام ككل من البداية للنهاية"""
         # Home page
@@ -197,6 +200,7 @@ class TestFlaskApp(unittest.TestCase):
     # 4. اختبارات القبول (Acceptance Tests)
     ####################################
     
+    @old_pages
     def test_business_requirements(self):
         """اختبار متطلبات العمل الأساسية"""
         # Requirement: Users can register
@@ -241,6 +245,7 @@ class TestFlaskApp(unittest.TestCase):
     ####################################
     
     @pytest.mark.performance
+    @old_pages
     def test_response_time(self):
         """قياس زمن استجابة الصفحات الرئيسية"""
         start_time = time.time()
@@ -258,36 +263,13 @@ class TestFlaskApp(unittest.TestCase):
     # 6. اختبارات الحمل (Load Tests)
     ####################################
     
-    class WebsiteUser(HttpUser):
-        """اختبار الحمل باستخدام Locust"""
-        wait_time = between(1, 5)
-        
-        @task
-        def load_test_homepage(self):
-            self.client.get("/")
-            
-        @task(3)
-        def load_test_login(self):
-            self.client.post("/user/login", data={
-                "username": "testuser",
-                "password": "testpass"
-            })
-            
-        @task(2)
-        def load_test_courses(self):
-            self.client.get("/courses")
-
-    def run_load_test(self):
-        """تشغيل اختبار الحمل في عملية منفصلة"""
-        from locust.main import main
-        import sys
-        sys.argv = ['locust', '-f', __file__, '--headless', '-u', '100', '-r', '10', '--run-time', '1m']
-        main()
+    # اختبار الحمل أصبح في benchmarks.py: python benchmarks.py load
 
     ####################################
     # 7. اختبارات الأمان (Security Tests)
     ####################################
     
+    @old_pages
     def test_security_measures(self):
         """اختبارات الأمان الأساسية"""
         # SQL Injection attempt
@@ -314,6 +296,7 @@ class TestFlaskApp(unittest.TestCase):
     # 8. اختبارات التراجع (Regression Tests)
     ####################################
     
+    @old_pages
     def test_regression_after_changes(self):
         """اختبار التراجع للتأكد من أن التغييرات الجديدة لم تكسر الوظائف القديمة"""
         # Test old registration still works
@@ -335,6 +318,7 @@ class TestFlaskApp(unittest.TestCase):
         self.assertEqual(response.status_code, 200)
 
     # باقي الاختبارات الموجودة سابقاً
+    @old_pages
     def test_user_login_logout(self):
         # Successful login
         response = self.login('testuser', 'testpass')
@@ -350,6 +334,7 @@ class TestFlaskApp(unittest.TestCase):
         self.assertIn('زائر', response.data)
         self.assertIsNone(session.get('token'))
 
+    @old_pages
     def test_course_operations(self):
         self.login('admin', 'adminpass')
         
@@ -375,6 +360,7 @@ class TestFlaskApp(unittest.TestCase):
         self.assertEqual(response.status_code, 200)
         self.assertNotIn(b'New Course', response.data)
 
+    @old_pages
     def test_message_operations(self):
         self.login('testuser', 'testpass')
         
@@ -391,6 +377,7 @@ class TestFlaskApp(unittest.TestCase):
         self.assertEqual(response.status_code, 200)
         self.assertNotIn(b'Hello World', response.data)
 
+    @old_pages
     def test_admin_functions(self):
         self.login('admin', 'adminpass')
         
@@ -411,17 +398,16 @@ class TestFlaskApp(unittest.TestCase):
         self.assertIsNone(User.query.get(user.id))
 
     def test_like_course_api(self):
-        self.login('testuser', 'testpass')
-        course = Course.query.first()
-        
-        response = self.app.post(f'/like/{course.id}')
-        self.assertEqual(response.status_code, 200)
-        self.assertEqual(response.json['success'], True)
-        
-        # Verify like count increased
-        updated_course = Course.query.get(course.id)
-        self.assertEqual(updated_course.likes, 1)
+        with app.app_context():
+            course = Course.query.first()
+            self.assertEqual(operations.like_course(course.id, user_id=1), 1)
+
+            # Verify like count increased
+            updated_course = db.session.get(Course, course.id)
+            self.assertEqual(updated_course.likes, 1)
+            self.assertEqual(db.session.get(User, 1).likes_count, 1)
 
+    @old_pages
     def test_protected_routes(self):
         # Try to access profile without login
         response = self.app.get('/user/profile', follow_redirects=True)
@@ -439,5 +425,5 @@ if __name__ == '__main__':
     # لتشغيل اختبارات الأداء (يتطلب pytest)
     # pytest.main([__file__])
     
-    # لتشغيل اختبارات الحمل (يتطلب locust)
-    # TestFlaskApp().run_load_test()
\ No newline at end of file
+    # لتشغيل اختبارات الحمل وقياس الأداء
+    # python benchmarks.py suite --output results.json --baseline baseline.json
\ No newline at end of file
@@ -0,0 +1,117 @@
+import datetime
+import unittest
+from unittest.mock import patch
+from flask import Flask
+import jwt
+from model import db, User
+from auth import TokenCache, EXPIRED_TOKEN, INVALID_TOKEN, auth_bp, current_identity
+import operations
+
+SECRET = 'test-secret-key-with-enough-length-for-hs256'
+
+def make_token(user_id, hours=1):
+    exp = datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(hours=hours)
+    return jwt.encode({'user_id': user_id, 'exp': exp}, SECRET, algorithm='HS256')
+
+class TestTokenCache(unittest.TestCase):
+    def setUp(self):
+        self.flask_app = Flask(__name__)
+        self.flask_app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
+        db.init_app(self.flask_app)
+        self.ctx = self.flask_app.app_context()
+        self.ctx.push()
+        db.create_all()
+        db.session.add(User(username='testuser', email='test@example.com', password='x'))
+        db.session.commit()
+        self.cache = TokenCache()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.ctx.pop()
+
+    def test_repeat_requests_skip_decode_and_lookup(self):
+        """الطلبات المتكررة بنفس التوكن لا تعيد فك التوكن ولا تستعلم عن المستخدم"""
+        token = make_token(1)
+        for _ in range(5):
+            identity = self.cache.identity(token, SECRET)
+        self.assertEqual(identity.username, 'testuser')
+        stats = self.cache.stats()
+        self.assertEqual((stats['decodes'], stats['user_lookups']), (1, 1))
+        self.assertEqual((stats['decodes_saved'], stats['user_lookups_saved']), (4, 4))
+
+    def test_expired_and_invalid_tokens(self):
+        """التوكن المنتهي أو غير الصالح لا يخزن"""
+        self.assertEqual(self.cache.verify(make_token(1, hours=-1), SECRET), EXPIRED_TOKEN)
+        self.assertEqual(self.cache.verify('invalidtoken', SECRET), INVALID_TOKEN)
+        self.assertEqual(self.cache.verify(make_token(1), 'other-secret'), INVALID_TOKEN)
+        self.assertEqual(self.cache.stats()['entries'], 0)
+
+    def test_entry_expires_with_token(self):
+        """المدخل يحذف عند انتهاء صلاحية التوكن"""
+        token = make_token(1)
+        self.cache.verify(token, SECRET)
+        later = datetime.datetime.now().timestamp() + 7200
+        with patch('auth.time.time', return_value=later):
+            self.assertEqual(self.cache.stats()['entries'], 1)
+            self.cache._get(self.cache._digest(token, SECRET))
+        self.assertEqual(self.cache.stats()['entries'], 0)
+
+    def test_set_admin_and_delete_invalidate(self):
+        """تغيير صلاحية المستخدم أو حذفه يبطل الكاش"""
+        token = make_token(1)
+        with patch('operations.token_cache', self.cache):
+            self.assertFalse(self.cache.identity(token, SECRET).is_admin)
+            operations.set_admin(1)
+            self.assertTrue(self.cache.identity(token, SECRET).is_admin)
+            operations.delete_user(1)
+            self.assertIsNone(self.cache.identity(token, SECRET))
+
+    def test_identity_rechecked_after_ttl(self):
+        """تغيير الصلاحية من عامل آخر يظهر هنا بعد مدة قصيرة"""
+        token = make_token(1)
+        cache = TokenCache(identity_ttl=30)
+        self.assertFalse(cache.identity(token, SECRET).is_admin)
+        # Another worker promotes the user; this process never sees invalidate_user().
+        db.session.get(User, 1).is_admin = True
+        db.session.commit()
+        self.assertFalse(cache.identity(token, SECRET).is_admin)
+        later = cache._entries[cache._digest(token, SECRET)].identity_expires + 1
+        with patch('auth.time.monotonic', return_value=later):
+            self.assertTrue(cache.identity(token, SECRET).is_admin)
+        self.assertEqual(cache.stats()['user_lookups'], 2)
+
+    def test_change_in_other_worker(self):
+        """سحب الصلاحية في عامل آخر يظهر هنا دون انتظار مدة الكاش"""
+        db.session.get(User, 1).is_admin = True
+        db.session.commit()
+        token = make_token(1)
+        self.cache.users_version.check_interval = 0
+        self.assertTrue(self.cache.identity(token, SECRET).is_admin)
+        # Another worker has its own cache object; only the shared version links them.
+        with patch('operations.token_cache', TokenCache()):
+            operations.set_admin(1, False)
+        self.assertFalse(self.cache.identity(token, SECRET).is_admin)
+
+    def test_evicted_users_not_kept(self):
+        """حذف المدخلات القديمة لا يترك مجموعات فارغة للمستخدمين"""
+        cache = TokenCache(maxsize=2)
+        for user_id in range(10):
+            cache.verify(make_token(user_id), SECRET)
+        self.assertEqual(len(cache._by_user), 2)
+
+    def test_cache_header_only_in_debug(self):
+        """رأس X-Auth-Cache يظهر في وضع التطوير فقط"""
+        self.flask_app.register_blueprint(auth_bp)
+
+        @self.flask_app.route('/me')
+        def me():
+            return current_identity(make_token(1), SECRET).username
+
+        client = self.flask_app.test_client()
+        self.assertNotIn('X-Auth-Cache', client.get('/me').headers)
+        self.flask_app.debug = True
+        self.assertIn('user_lookups', client.get('/me').headers['X-Auth-Cache'])
+
+if __name__ == '__main__':
+    unittest.main()
\ No newline at end of file
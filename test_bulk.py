@@ -0,0 +1,70 @@
+from datetime import datetime, timedelta
+import unittest
+from flask import Flask
+from model import db, User, Message, MessageArchive, SignupRollup
+from analytics import record_signup
+import operations
+
+class TestBulkOperations(unittest.TestCase):
+    def setUp(self):
+        self.flask_app = Flask(__name__)
+        self.flask_app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
+        db.init_app(self.flask_app)
+        self.ctx = self.flask_app.app_context()
+        self.ctx.push()
+        db.create_all()
+        self.now = datetime(2026, 1, 15, 12, 0)
+        for i in range(20):
+            db.session.add(User(id=i + 1, username=f'user{i}', email=f'user{i}@example.com', password='x',
+                                created_at=self.now))
+            record_signup(self.now)
+        for i in range(20):
+            for j in range(30):
+                db.session.add(Message(user_id=i + 1, content='spam', timestamp=self.now - timedelta(days=j)))
+        db.session.add(MessageArchive(user_id=1, content='old', timestamp=self.now - timedelta(days=400)))
+        db.session.commit()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.ctx.pop()
+
+    def test_delete_users_in_chunks(self):
+        """حذف مستخدمين كثيرين مع رسائلهم على دفعات"""
+        progress = []
+        report = operations.delete_users(list(range(1, 11)), chunk_size=4,
+                                         on_progress=lambda r: progress.append(r.done))
+        self.assertEqual(progress, [4, 8, 10])
+        self.assertEqual(report.as_dict()['dependent_rows'], 301)
+        self.assertEqual(User.query.count(), 10)
+        self.assertEqual(Message.query.count(), 300)
+        self.assertEqual(MessageArchive.query.count(), 0)
+        rollup = SignupRollup.query.filter_by(period='day', bucket='2026-01-15').one()
+        self.assertEqual(rollup.count, 10)
+
+    def test_delete_user_with_messages(self):
+        """حذف مستخدم له رسائل لا يفشل"""
+        operations.delete_user(2)
+        self.assertIsNone(db.session.get(User, 2))
+        self.assertEqual(Message.query.filter_by(user_id=2).count(), 0)
+
+    def test_purge_messages_by_date_range(self):
+        """حذف الرسائل حسب المستخدم والفترة الزمنية"""
+        report = operations.purge_messages(user_ids=[1, 2], before=self.now - timedelta(days=9),
+                                           after=self.now - timedelta(days=19), chunk_size=7)
+        self.assertEqual(report.done, 20)
+        self.assertEqual(report.chunks, 3)
+        self.assertEqual(Message.query.filter_by(user_id=1).count(), 20)
+        self.assertEqual(Message.query.filter_by(user_id=3).count(), 30)
+
+    def test_set_admin_many_and_delete_messages(self):
+        """ترقية عدة مستخدمين وحذف عدة رسائل دفعة واحدة"""
+        report = operations.set_admin_many([1, 2, 3, 99], chunk_size=2)
+        self.assertEqual((report.done, report.chunks), (3, 2))
+        self.assertEqual(User.query.filter_by(is_admin=True).count(), 3)
+        report = operations.delete_messages(list(range(1, 51)), chunk_size=20)
+        self.assertEqual(report.done, 50)
+        self.assertEqual(Message.query.count(), 550)
+
+if __name__ == '__main__':
+    unittest.main()
\ No newline at end of file
@@ -0,0 +1,119 @@
+from datetime import datetime, timedelta
+import unittest
+from flask import Flask
+from model import db, Course, backfill_course_dates
+from catalog import CatalogCache, catalog_bp, list_courses
+import operations
+
+class TestCatalogCache(unittest.TestCase):
+    def setUp(self):
+        self.flask_app = Flask(__name__)
+        self.flask_app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
+        db.init_app(self.flask_app)
+        self.ctx = self.flask_app.app_context()
+        self.ctx.push()
+        db.create_all()
+        for i, course_type in enumerate(('design', 'programming', 'programming')):
+            db.session.add(Course(title=f'كورس {i}', description='وصف', course_type=course_type,
+                                  course_link=f'course-{i}'))
+        db.session.commit()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.ctx.pop()
+
+    def test_grouped_snapshot(self):
+        """الكورسات مجمعة حسب النوع وتبنى مرة واحدة"""
+        cache = CatalogCache()
+        snapshot = cache.get_courses_by_type()
+        self.assertEqual(sorted(snapshot), ['design', 'programming'])
+        self.assertEqual([row.id for row in snapshot['programming']], [2, 3])
+        self.assertIs(cache.get_courses_by_type(), snapshot)
+        self.assertEqual((cache.stats()['hits'], cache.stats()['rebuilds']), (1, 1))
+        with self.assertRaises(TypeError):
+            snapshot['data'] = ()
+
+    def test_add_course_invalidates(self):
+        """إضافة كورس تظهر في الكتالوج، ورابط الكورس يؤخذ من العنوان عند غيابه"""
+        operations.get_catalog()
+        operations.add_course('Data Basics', 'وصف', None, 'data')
+        catalog = operations.get_catalog()
+        self.assertEqual([row.course_link for row in catalog['data']], ['data-basics'])
+
+    def test_change_in_other_process(self):
+        """تعديل من عملية أخرى يبطل الكتالوج عبر رقم الإصدار في قاعدة البيانات"""
+        worker = CatalogCache()
+        worker.version.check_interval = 0
+        worker.get_courses_by_type()
+        db.session.add(Course(title='جديد', description='وصف', course_type='data', course_link='new'))
+        db.session.commit()
+        # Stands in for the importer CLI: a different cache object bumps the shared version.
+        CatalogCache().invalidate()
+        self.assertIn('data', worker.get_courses_by_type())
+        self.assertEqual(worker.stats()['rebuilds'], 2)
+
+class TestCoursePaging(unittest.TestCase):
+    def setUp(self):
+        self.flask_app = Flask(__name__)
+        self.flask_app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
+        db.init_app(self.flask_app)
+        self.flask_app.register_blueprint(catalog_bp)
+        self.ctx = self.flask_app.app_context()
+        self.ctx.push()
+        db.create_all()
+        start = datetime(2024, 1, 1)
+        for i in range(25):
+            # Pairs of courses share a timestamp so the id tiebreak is exercised.
+            db.session.add(Course(title=f'كورس {i}', description='وصف', course_link=f'course-{i}',
+                                  course_type='design' if i % 3 else 'data',
+                                  created_at=start + timedelta(hours=i // 2)))
+        db.session.commit()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.ctx.pop()
+
+    def collect(self, limit, **filters):
+        ids, cursor = [], None
+        while True:
+            rows, cursor = list_courses(limit, cursor, **filters)
+            ids += [row.id for row in rows]
+            if cursor is None:
+                return ids
+
+    def test_pages_cover_every_row_once(self):
+        """التصفح بالمؤشر يمر على كل الكورسات مرة واحدة من الأحدث"""
+        expected = [row.id for row in Course.query.order_by(Course.created_at.desc(), Course.id.desc())]
+        for limit in (1, 4, 7, 25, 100):
+            self.assertEqual(self.collect(limit), expected)
+        data_ids = [row.id for row in Course.query.filter_by(course_type='data')
+                    .order_by(Course.created_at.desc(), Course.id.desc())]
+        self.assertEqual(self.collect(3, course_type='data'), data_ids)
+
+    def test_api_and_bad_cursor(self):
+        """الواجهة تعيد المؤشر التالي وترفض مؤشرا غير صالح"""
+        client = self.flask_app.test_client()
+        first = client.get('/api/courses?limit=10').get_json()
+        self.assertEqual(len(first['courses']), 10)
+        second = client.get(f'/api/courses?limit=10&cursor={first["next_cursor"]}').get_json()
+        self.assertEqual(second['courses'][0]['id'], first['courses'][-1]['id'] - 1)
+        self.assertEqual(client.get('/api/courses?cursor=broken').status_code, 400)
+
+    def test_undated_rows_backfilled(self):
+        """الكورسات بلا تاريخ من قواعد قديمة تأخذ أقدم تاريخ ولا تختفي من الصفحات"""
+        db.session.execute(db.text('DROP TABLE course'))
+        db.session.execute(db.text('CREATE TABLE course (id INTEGER PRIMARY KEY, title VARCHAR(100) NOT NULL, '
+                                   'description TEXT NOT NULL, image_url VARCHAR(200), created_at DATETIME, '
+                                   'course_type VARCHAR(50) NOT NULL, course_link VARCHAR(50) NOT NULL, '
+                                   'price FLOAT, is_featured BOOLEAN, likes INTEGER)'))
+        db.session.execute(db.text("INSERT INTO course (id, title, description, course_type, course_link, created_at) "
+                                   "VALUES (1, 'a', 'd', 't', 'a', '2024-01-02 00:00:00.000000'), "
+                                   "(2, 'b', 'd', 't', 'b', NULL), (3, 'c', 'd', 't', 'c', NULL)"))
+        db.session.commit()
+        self.assertEqual(backfill_course_dates(), 2)
+        self.assertEqual(self.collect(1), [3, 2, 1])
+
+if __name__ == '__main__':
+    unittest.main()
\ No newline at end of file
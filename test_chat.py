@@ -0,0 +1,203 @@
+from datetime import datetime, timedelta, timezone
+import os
+import tempfile
+import threading
+import unittest
+from unittest.mock import patch
+from flask import Flask
+import jwt
+from model import db, User, Message, MessageArchive, reset_database
+from sqlalchemy import event
+from sqlalchemy.exc import IntegrityError
+from chat import ChatHub, chat_bp, archive_messages, message_history, stream_messages
+import operations
+
+class TestChat(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.flask_app = Flask(__name__)
+        self.flask_app.secret_key = 'test'
+        self.flask_app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{os.path.join(self.tmp.name, "chat.db")}'
+        db.init_app(self.flask_app)
+        self.flask_app.register_blueprint(chat_bp)
+        self.ctx = self.flask_app.app_context()
+        self.ctx.push()
+        db.create_all()
+        db.session.add(User(username='sara', email='sara@example.com', password='x'))
+        db.session.commit()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.ctx.pop()
+        self.tmp.cleanup()
+
+    def add_messages(self, count, start=datetime(2024, 1, 1)):
+        for i in range(count):
+            db.session.add(Message(user_id=1, content=f'رسالة {i}', timestamp=start + timedelta(minutes=i // 2)))
+        db.session.commit()
+
+    def client(self, user_id=None, hours=1):
+        client = self.flask_app.test_client()
+        if user_id is not None:
+            exp = datetime.now(timezone.utc) + timedelta(hours=hours)
+            with client.session_transaction() as sess:
+                sess['token'] = jwt.encode({'user_id': user_id, 'exp': exp}, 'test', algorithm='HS256')
+        return client
+
+    def page_through(self, limit, include_archive=False):
+        pages, cursor = [], None
+        while True:
+            messages, cursor = message_history(limit, cursor, include_archive)
+            pages.append([message.id for message in messages])
+            if cursor is None:
+                return pages
+
+    def test_history_pages(self):
+        """تصفح السجل من الأحدث للأقدم وكل صفحة مرتبة من الأقدم"""
+        self.add_messages(7)
+        self.assertEqual(self.page_through(3), [[5, 6, 7], [2, 3, 4], [1]])
+        self.assertEqual(message_history(3)[0][0].user.username, 'sara')
+        with self.assertRaises(ValueError):
+            message_history(3, 'broken')
+
+    def test_archive_and_history(self):
+        """الرسائل القديمة تنقل للأرشيف وتبقى في السجل عند طلبه"""
+        self.add_messages(6)
+        self.assertEqual(archive_messages(datetime(2024, 1, 1, 0, 2), batch_size=2), 4)
+        self.assertEqual(Message.query.count(), 2)
+        self.assertEqual(MessageArchive.query.count(), 4)
+        self.assertEqual(self.page_through(4), [[5, 6]])
+        self.assertEqual(self.page_through(4, include_archive=True), [[3, 4, 5, 6], [1, 2]])
+
+    def test_ids_not_reused_after_archive(self):
+        """أرقام الرسائل لا تعاد بعد أرشفة الأحدث فيبقى الأرشيف والمؤشرات سليمة"""
+        self.add_messages(3)
+        archive_messages(datetime(2030, 1, 1))
+        self.add_messages(2, start=datetime(2024, 2, 1))
+        self.assertEqual([m.id for m in Message.query.order_by(Message.id)], [4, 5])
+        self.assertEqual(archive_messages(datetime(2030, 1, 1)), 2)
+
+    def test_old_message_table_rebuilt(self):
+        """جدول الرسائل القديم بدون AUTOINCREMENT يعاد بناؤه عند init-db"""
+        self.add_messages(3)
+        archive_messages(datetime(2030, 1, 1))
+        with db.engine.begin() as connection:
+            connection.exec_driver_sql('DROP TABLE message')
+            connection.exec_driver_sql('CREATE TABLE message (id INTEGER NOT NULL PRIMARY KEY, '
+                                       'user_id INTEGER NOT NULL, content TEXT NOT NULL, timestamp DATETIME)')
+            connection.exec_driver_sql("INSERT INTO message VALUES (2, 1, 'x', '2024-01-01 00:00:00.000000')")
+        reset_database(self.flask_app)
+        reset_database(self.flask_app)
+        self.add_messages(1, start=datetime(2024, 2, 1))
+        self.assertEqual([m.id for m in Message.query.order_by(Message.id)], [2, 4])
+
+    def test_undated_messages_backfilled(self):
+        """الرسائل القديمة بلا تاريخ تأخذ أقدم تاريخ فتظهر في السجل وتؤرشف"""
+        with db.engine.begin() as connection:
+            connection.exec_driver_sql('DROP TABLE message')
+            connection.exec_driver_sql('CREATE TABLE message (id INTEGER NOT NULL PRIMARY KEY, '
+                                       'user_id INTEGER NOT NULL, content TEXT NOT NULL, timestamp DATETIME)')
+            connection.exec_driver_sql("INSERT INTO message VALUES (1, 1, 'a', '2024-01-02 00:00:00.000000'), "
+                                       "(2, 1, 'b', NULL), (3, 1, 'c', NULL)")
+        reset_database(self.flask_app)
+        self.assertEqual(self.page_through(1), [[3], [2], [1]])
+        with self.assertRaises(IntegrityError):
+            with db.engine.begin() as connection:
+                connection.exec_driver_sql("INSERT INTO message (user_id, content) VALUES (1, 'x')")
+        self.assertEqual(archive_messages(datetime(2024, 1, 3)), 3)
+
+    def test_stream_keeps_out_of_order_events(self):
+        """رسالة يصل إشعارها متأخرا لا تضيع من البث"""
+        hub = ChatHub()
+        received = []
+        done = threading.Event()
+
+        def listen():
+            with self.flask_app.app_context():
+                stream = stream_messages(0)
+                for event in stream:
+                    if event.startswith('id:'):
+                        received.append(int(event.split('\n')[0][3:]))
+                    if len(received) == 2:
+                        break
+                stream.close()
+            done.set()
+
+        with patch('chat.hub', hub):
+            thread = threading.Thread(target=listen, daemon=True)
+            thread.start()
+            while not hub.stats()['subscribers']:
+                done.wait(0.01)
+            first = Message(user_id=1, content='أولا')
+            second = Message(user_id=1, content='ثانيا')
+            db.session.add_all([first, second])
+            db.session.commit()
+            # Both writers commit before either publishes.
+            hub.publish()
+            hub.publish()
+            self.assertTrue(done.wait(5))
+        self.assertEqual(received, [first.id, second.id])
+
+    def event_ids(self, stream, count):
+        return [int(next(stream).split('\n')[0][3:]) for _ in range(count)]
+
+    def test_one_read_per_message(self):
+        """كل رسالة تقرأ من الجدول مرة واحدة مهما كان عدد المستمعين"""
+        hub = ChatHub()
+        statements = []
+
+        def record(connection, cursor, statement, *args):
+            statements.append(statement)
+
+        with patch('chat.hub', hub), patch('operations.hub', hub), patch('chat.HEARTBEAT_SECONDS', 0.01):
+            streams = [stream_messages(0) for _ in range(5)]
+            for stream in streams:
+                self.assertEqual(next(stream), ': keep-alive\n\n')
+            event.listen(db.engine, 'before_cursor_execute', record)
+            try:
+                for i in range(3):
+                    operations.add_message(1, f'رسالة {i}')
+                for stream in streams:
+                    self.assertEqual(self.event_ids(stream, 3), [1, 2, 3])
+            finally:
+                event.remove(db.engine, 'before_cursor_execute', record)
+                for stream in streams:
+                    stream.close()
+        self.assertEqual(len([s for s in statements if s.lstrip().startswith('SELECT')]), 3)
+        self.assertEqual(hub.stats()['subscribers'], 0)
+
+    def test_slow_listener_rereads_table(self):
+        """المستمع البطيء الذي امتلأت قائمته يقرأ ما فاته من الجدول بالترتيب"""
+        hub = ChatHub(queue_size=2)
+        with patch('chat.hub', hub), patch('operations.hub', hub), patch('chat.HEARTBEAT_SECONDS', 0.01):
+            stream = stream_messages(0)
+            next(stream)
+            for i in range(5):
+                operations.add_message(1, f'رسالة {i}')
+            self.assertEqual(hub.stats()['overflows'], 1)
+            self.assertEqual(self.event_ids(stream, 5), [1, 2, 3, 4, 5])
+            stream.close()
+
+    def test_stream_requires_live_account(self):
+        """البث يرفض التوكن المنتهي وحساب المستخدم المحذوف"""
+        url = '/user/contantgroup/stream'
+        self.assertEqual(self.client().get(url).status_code, 401)
+        self.assertEqual(self.client(1, hours=-1).get(url).status_code, 401)
+        self.assertEqual(self.client(2).get(url).status_code, 401)
+        with patch('chat.HEARTBEAT_SECONDS', 0.01):
+            response = self.client(1).get(url, buffered=False)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(next(iter(response.response)), b': keep-alive\n\n')
+            response.close()
+
+    def test_history_requires_live_account(self):
+        """سجل الرسائل يرفض التوكن المنتهي وحساب المستخدم المحذوف"""
+        self.add_messages(3)
+        for client in (self.client(), self.client(1, hours=-1), self.client(2)):
+            self.assertEqual(client.get('/api/messages').status_code, 401)
+        response = self.client(1).get('/api/messages?limit=2')
+        self.assertEqual([m['id'] for m in response.get_json()['messages']], [2, 3])
+
+if __name__ == '__main__':
+    unittest.main()
\ No newline at end of file
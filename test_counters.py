@@ -0,0 +1,91 @@
+import os
+import tempfile
+import threading
+import time
+import unittest
+from flask import Flask
+from model import db, User, Course, reset_database
+from counters import CounterBuffer
+
+class TestCounterBuffer(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.flask_app = Flask(__name__)
+        self.flask_app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{os.path.join(self.tmp.name, 'test.db')}"
+        db.init_app(self.flask_app)
+        with self.flask_app.app_context():
+            db.create_all()
+            db.session.add(User(username='testuser', email='test@example.com', password='x'))
+            db.session.add(Course(title='Python Course', description='Learn Python',
+                                  course_type='programming', course_link='python-course'))
+            db.session.commit()
+
+    def tearDown(self):
+        with self.flask_app.app_context():
+            db.session.remove()
+            db.drop_all()
+        self.tmp.cleanup()
+
+    def stored_likes(self):
+        with self.flask_app.app_context():
+            return db.session.get(Course, 1).likes
+
+    def test_write_through_without_worker(self):
+        """بدون عامل خلفي تُكتب الزيادة مباشرة"""
+        buffer = CounterBuffer()
+        with self.flask_app.app_context():
+            buffer.increment(Course, 'likes', 1)
+            buffer.increment(User, 'likes_count', 1)
+            self.assertEqual(db.session.get(User, 1).likes_count, 1)
+        self.assertEqual(self.stored_likes(), 1)
+
+    def test_reads_include_pending_and_shutdown_drains(self):
+        """القراءة تشمل الزيادات المعلقة ولا تضيع عند الإيقاف"""
+        buffer = CounterBuffer(flush_interval=3600, flush_threshold=10 ** 6)
+        buffer.start(self.flask_app)
+
+        def click():
+            for _ in range(250):
+                buffer.increment(Course, 'likes', 1)
+
+        threads = [threading.Thread(target=click) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        with self.flask_app.app_context():
+            self.assertEqual(buffer.value(Course, 'likes', 1), 1000)
+        self.assertEqual(self.stored_likes(), 0)
+
+        buffer.stop()
+        self.assertEqual(self.stored_likes(), 1000)
+        self.assertEqual(buffer.stats()['pending'], 0)
+
+    def test_threshold_wakes_worker(self):
+        """تجاوز الحد يفرغ الدفعة دون انتظار المؤقت"""
+        buffer = CounterBuffer(flush_interval=3600, flush_threshold=5)
+        buffer.start(self.flask_app)
+        for _ in range(5):
+            buffer.increment(Course, 'likes', 1)
+        for _ in range(100):
+            if buffer.stats()['flushes']:
+                break
+            time.sleep(0.01)
+        self.assertEqual(self.stored_likes(), 5)
+        buffer.stop()
+
+    def test_likes_column_added_to_old_database(self):
+        """قاعدة بيانات قديمة بدون عمود likes تحصل عليه عند init-db"""
+        with self.flask_app.app_context():
+            with db.engine.begin() as connection:
+                connection.exec_driver_sql('ALTER TABLE course DROP COLUMN likes')
+        reset_database(self.flask_app)
+        reset_database(self.flask_app)
+        self.assertEqual(self.stored_likes(), 0)
+        with self.flask_app.app_context():
+            CounterBuffer().increment(Course, 'likes', 1)
+        self.assertEqual(self.stored_likes(), 1)
+
+if __name__ == '__main__':
+    unittest.main()
\ No newline at end of file
@@ -0,0 +1,102 @@
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+from unittest.mock import patch
+from sqlalchemy import inspect
+from model import db, User, Message
+from factory import BLUEPRINTS, create_app
+from counters import counters
+from jobs import job_queue
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+class TestFactory(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.flask_app = create_app({
+            'TESTING': True,
+            'DATABASE_PATH': os.path.join(self.tmp.name, 'factory.db'),
+            'THUMBNAIL_DIR': os.path.join(self.tmp.name, 'thumbs'),
+        })
+
+    def tearDown(self):
+        with self.flask_app.app_context():
+            db.session.remove()
+            db.engine.dispose()
+        self.tmp.cleanup()
+
+    def tables(self):
+        with self.flask_app.app_context():
+            return set(inspect(db.engine).get_table_names())
+
+    def test_blueprints_registered(self):
+        """كل الأجزاء مسجلة في التطبيق"""
+        for blueprint in BLUEPRINTS:
+            self.assertIn(blueprint.name, self.flask_app.blueprints)
+
+    def test_schema_only_from_command(self):
+        """الجداول لا تنشأ إلا بأمر init-db"""
+        self.assertEqual(self.tables(), set())
+        result = self.flask_app.test_cli_runner().invoke(args=['init-db'])
+        self.assertEqual(result.exit_code, 0, result.output)
+        self.assertTrue({'user', 'course', 'job'} <= self.tables())
+
+    def test_no_services_in_testing(self):
+        """الخدمات الخلفية لا تبدأ في وضع الاختبار"""
+        self.flask_app.test_cli_runner().invoke(args=['init-db'])
+        response = self.flask_app.test_client().get('/api/courses?limit=5')
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(job_queue.running)
+        self.assertIsNone(counters._thread)
+
+    def test_bulk_commands(self):
+        """أوامر حذف الحسابات المزعجة وصلاحيات المشرف تعرض التقدم لكل دفعة"""
+        runner = self.flask_app.test_cli_runner()
+        runner.invoke(args=['init-db'])
+        with self.flask_app.app_context():
+            for i in range(5):
+                db.session.add(User(username=f'spam{i}', email=f'spam{i}@example.com', password='x'))
+            db.session.flush()
+            db.session.add_all([Message(user_id=i % 5 + 1, content='spam') for i in range(20)])
+            db.session.commit()
+        result = runner.invoke(args=['set-admin', '1', '2'])
+        self.assertEqual(result.exit_code, 0, result.output)
+        result = runner.invoke(args=['delete-users', '2', '3', '4', '--chunk-size', '2'])
+        self.assertEqual(result.exit_code, 0, result.output)
+        progress = [json.loads(line) for line in result.output.splitlines() if line.startswith('{')]
+        self.assertEqual([step['done'] for step in progress], [2, 3])
+        self.assertIn('3 users and 12 messages deleted.', result.output)
+        result = runner.invoke(args=['purge-messages', '--user', '5'])
+        self.assertIn('4 messages deleted.', result.output)
+        self.assertNotEqual(runner.invoke(args=['purge-messages']).exit_code, 0)
+        with self.flask_app.app_context():
+            self.assertEqual([(u.id, u.is_admin) for u in User.query.order_by(User.id)], [(1, True), (5, None)])
+            self.assertEqual(Message.query.count(), 4)
+
+    def test_secret_key_required(self):
+        """التطبيق يرفض البدء بدون SECRET_KEY إلا في وضع التطوير أو الاختبار"""
+        config = {'DATABASE_PATH': os.path.join(self.tmp.name, 'factory.db')}
+        with patch.dict(os.environ):
+            os.environ.pop('SECRET_KEY', None)
+            with self.assertRaises(RuntimeError):
+                create_app(config)
+            self.assertTrue(create_app(dict(config, DEBUG=True)).secret_key)
+            os.environ['SECRET_KEY'] = 'from-env'
+            self.assertEqual(create_app(config).secret_key, 'from-env')
+
+    def test_optional_modules_not_imported(self):
+        """المكتبات الاختيارية لا تحمل عند بدء التطبيق"""
+        script = ('import json, sys, factory; factory.create_app({"TESTING": True}); '
+                  'print(json.dumps(sorted(sys.modules)))')
+        env = dict(os.environ, DATABASE_PATH=os.path.join(self.tmp.name, 'lazy.db'), SECRET_KEY='test')
+        output = subprocess.run([sys.executable, '-c', script], cwd=HERE, env=env,
+                                capture_output=True, text=True, check=True).stdout
+        modules = set(json.loads(output.strip().splitlines()[-1]))
+        for name in ('httpx', 'PIL', 'googleapiclient', 'locust'):
+            self.assertNotIn(name, modules)
+
+if __name__ == '__main__':
+    unittest.main()
\ No newline at end of file
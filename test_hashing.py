@@ -0,0 +1,83 @@
+import threading
+import time
+import unittest
+from unittest.mock import patch
+from flask import Flask
+from werkzeug.security import generate_password_hash
+from model import db, User
+from hashing import HashingService, HashingBusy
+import operations
+
+OLD_METHOD = 'pbkdf2:sha256:1000'
+NEW_METHOD = 'pbkdf2:sha256:2000'
+
+class TestHashingService(unittest.TestCase):
+    def setUp(self):
+        self.service = HashingService(workers=1, max_pending=1, method=NEW_METHOD, timeout=5)
+
+    def tearDown(self):
+        self.service.shutdown()
+
+    def test_busy_rejected(self):
+        """الطلب يرفض فورا عندما تكون كل الخانات مشغولة"""
+        self.service._run(time.sleep, 0)
+        slow = threading.Thread(target=self.service._run, args=(time.sleep, 1))
+        slow.start()
+        while self.service._slots._value:
+            time.sleep(0.01)
+        with self.assertRaises(HashingBusy):
+            self.service.hash('secret')
+        slow.join()
+        self.assertEqual(self.service.stats()['rejected'], 1)
+
+    def test_timeout_is_busy(self):
+        """تجاوز المهلة يعيد HashingBusy بدل خطأ 500"""
+        self.service.timeout = 0.1
+        with self.assertRaises(HashingBusy):
+            self.service._run(time.sleep, 1)
+        self.assertEqual(self.service.stats()['timed_out'], 1)
+
+    def test_needs_rehash(self):
+        """كلمة مرور مشفرة بمعاملات قديمة تحتاج إعادة تشفير"""
+        self.assertTrue(self.service.needs_rehash(generate_password_hash('x', OLD_METHOD)))
+        self.assertFalse(self.service.needs_rehash(generate_password_hash('x', NEW_METHOD)))
+
+class TestRehashOnLogin(unittest.TestCase):
+    def setUp(self):
+        self.flask_app = Flask(__name__)
+        self.flask_app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
+        db.init_app(self.flask_app)
+        self.ctx = self.flask_app.app_context()
+        self.ctx.push()
+        db.create_all()
+        db.session.add(User(username='sara', email='sara@example.com',
+                            password=generate_password_hash('secret', OLD_METHOD)))
+        db.session.commit()
+        self.service = HashingService(workers=0, method=NEW_METHOD)
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.ctx.pop()
+
+    def stored_hash(self):
+        return db.session.get(User, 1).password
+
+    def test_login_upgrades_hash(self):
+        """تسجيل الدخول يحدث تشفير كلمة المرور القديمة"""
+        with patch('operations.hashing_service', self.service):
+            self.assertIsNone(operations.authenticate('sara', 'wrong'))
+            self.assertTrue(self.stored_hash().startswith(OLD_METHOD))
+            self.assertEqual(operations.authenticate('sara', 'secret').username, 'sara')
+            self.assertTrue(self.stored_hash().startswith(NEW_METHOD))
+            self.assertIsNotNone(operations.authenticate('sara', 'secret'))
+
+    def test_busy_pool_defers_upgrade(self):
+        """انشغال خدمة التشفير لا يمنع الدخول ويؤجل التحديث"""
+        with patch('operations.hashing_service', self.service), \
+                patch.object(self.service, 'hash', side_effect=HashingBusy()):
+            self.assertEqual(operations.authenticate('sara', 'secret').username, 'sara')
+        self.assertTrue(self.stored_hash().startswith(OLD_METHOD))
+
+if __name__ == '__main__':
+    unittest.main()
\ No newline at end of file
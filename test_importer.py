@@ -0,0 +1,106 @@
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+from unittest.mock import patch
+from flask import Flask
+from model import db, CacheVersion, Course, ImportCheckpoint
+from importer import import_courses
+from search import SearchIndex, Fts5Backend
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+class TestImporter(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.flask_app = Flask(__name__)
+        self.flask_app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{os.path.join(self.tmp.name, "import.db")}'
+        db.init_app(self.flask_app)
+        self.ctx = self.flask_app.app_context()
+        self.ctx.push()
+        db.create_all()
+        self.path = os.path.join(self.tmp.name, 'courses.jsonl')
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.ctx.pop()
+        self.tmp.cleanup()
+
+    def write(self, lines):
+        with open(self.path, 'w', encoding='utf-8') as f:
+            f.write('\n'.join(lines) + '\n')
+
+    def course(self, i, title=None):
+        return json.dumps({'title': title or f'كورس {i}', 'description': 'وصف', 'course_type': 'data',
+                           'course_link': f'course-{i}'}, ensure_ascii=False)
+
+    def test_cli_requires_init_db(self):
+        """أداة الاستيراد تستخدم إعدادات التطبيق وترفض قاعدة بيانات بدون جداول"""
+        self.write([self.course(1)])
+        env = dict(os.environ, SECRET_KEY='test', DATABASE_PATH=os.path.join(self.tmp.name, 'empty.db'))
+        command = [sys.executable, 'importer.py', 'courses', self.path]
+        result = subprocess.run(command, cwd=HERE, env=env, capture_output=True, text=True)
+        self.assertEqual(result.returncode, 1)
+        self.assertIn('init-db', result.stderr)
+        env['DATABASE_PATH'] = os.path.join(self.tmp.name, 'import.db')
+        result = subprocess.run(command, cwd=HERE, env=env, capture_output=True, text=True, check=True)
+        self.assertEqual(json.loads(result.stdout)['inserted'], 1)
+        self.assertEqual(Course.query.count(), 1)
+
+    def test_bad_rows_rejected(self):
+        """السطر التالف أو غير الكائن يرفض وحده ويكمل الاستيراد"""
+        self.write([self.course(1), '{"title": broken', '[1, 2]', '"text"',
+                    json.dumps({'title': ['x'], 'description': 'd', 'course_type': 't', 'course_link': 'l'}),
+                    self.course(2)])
+        report = import_courses(self.path, batch_size=2)
+        self.assertEqual((report.inserted, report.rejected), (2, 4))
+        self.assertTrue(report.errors[0].startswith('line 2:'))
+        self.assertEqual(Course.query.count(), 2)
+        # The resume passes the broken lines instead of dying on them again.
+        self.assertEqual(import_courses(self.path).inserted, 0)
+
+    def test_resume_after_crash(self):
+        """الاستيراد يكمل من آخر دفعة محفوظة بعد التوقف"""
+        self.write([self.course(i) for i in range(5)])
+
+        def crash(batch):
+            raise RuntimeError('killed')
+
+        with self.assertRaises(RuntimeError):
+            import_courses(self.path, batch_size=2, on_batch=crash)
+        self.assertEqual(Course.query.count(), 2)
+        report = import_courses(self.path, batch_size=2)
+        self.assertEqual((report.skipped, report.inserted), (2, 3))
+        self.assertEqual([c.course_link for c in Course.query.order_by(Course.id)],
+                         [f'course-{i}' for i in range(5)])
+
+    def test_replaced_file_starts_over(self):
+        """ملف جديد بنفس المسار لا يستخدم نقطة الحفظ القديمة"""
+        self.write([self.course(i) for i in range(3)])
+        import_courses(self.path)
+        self.assertEqual(import_courses(self.path).inserted, 0)
+        self.write([self.course(i, 'ملف جديد') for i in range(10, 13)])
+        report = import_courses(self.path)
+        self.assertEqual((report.skipped, report.inserted), (0, 3))
+        self.assertEqual(ImportCheckpoint.query.count(), 2)
+
+    def test_imported_courses_searchable(self):
+        """الكورسات المستوردة تدخل فهرس البحث في نفس المعاملة"""
+        web = SearchIndex()
+        web.backend = Fts5Backend()
+        web.rebuild()
+        web.version.check_interval = 0
+        self.assertEqual(web.search('بايثون'), [])
+        self.write([self.course(1, 'بايثون للمبتدئين')])
+        # The importer CLI runs in its own process with its own index object.
+        with patch('importer.search_index', SearchIndex()):
+            import_courses(self.path)
+        self.assertEqual([r['course_link'] for r in web.search('بايثون')], ['course-1'])
+        # Cached pages in every worker are retired as well.
+        self.assertEqual(db.session.get(CacheVersion, 'pages').version, 1)
+
+if __name__ == '__main__':
+    unittest.main()
\ No newline at end of file
@@ -0,0 +1,103 @@
+import asyncio
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+from flask import Flask, jsonify, render_template_string
+from model import db, User, Message
+from instrumentation import Instrumentation, span
+import ai
+
+class TestInstrumentation(unittest.TestCase):
+    def setUp(self):
+        self.flask_app = Flask(__name__)
+        self.flask_app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
+        self.flask_app.config['INSTRUMENTATION'] = True
+        db.init_app(self.flask_app)
+        self.profile_dir = tempfile.TemporaryDirectory()
+        self.instrumentation = Instrumentation(profile_sample_rate=0, profile_dir=self.profile_dir.name)
+        self.instrumentation.init_app(self.flask_app)
+        self.ctx = self.flask_app.app_context()
+        self.ctx.push()
+        db.create_all()
+        for i in range(10):
+            db.session.add(User(username=f'user{i}', email=f'user{i}@example.com', password='x'))
+        db.session.flush()
+        for i in range(10):
+            db.session.add(Message(user_id=i + 1, content=f'message {i}'))
+        db.session.commit()
+
+        @self.flask_app.route('/messages')
+        def messages():
+            # يحمل المستخدم لكل رسالة على حدة
+            names = [message.user.username for message in Message.query.all()]
+            return render_template_string('{{ names|join(",") }}', names=names)
+
+        @self.flask_app.route('/ai')
+        def ask():
+            return jsonify(asyncio.run(ai.get_ai_response('سؤال')))
+
+        self.client = self.flask_app.test_client()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.ctx.pop()
+        self.profile_dir.cleanup()
+
+    def test_db_and_render_spans(self):
+        """تسجيل زمن قاعدة البيانات والعرض وعدد الاستعلامات"""
+        db.session.remove()
+        response = self.client.get('/messages')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.headers['X-DB-Statements'], '11')
+        timing = response.headers['Server-Timing']
+        self.assertIn('db;dur=', timing)
+        self.assertIn('render;dur=', timing)
+
+    def test_n_plus_one_detected(self):
+        """اكتشاف تحميل المستخدم لكل رسالة"""
+        db.session.remove()
+        with self.assertLogs(level='WARNING') as logs:
+            self.client.get('/messages')
+        self.assertIn('Possible N+1 on messages', logs.output[0])
+        self.assertEqual(self.instrumentation.n_plus_one['messages'], 1)
+
+    def test_outbound_http_span(self):
+        """زمن طلب الذكاء الاصطناعي يظهر كجزء مستقل"""
+        async def fake_ask(prompt):
+            await asyncio.sleep(0.01)
+            return 'answer'
+        with patch.object(ai.ai_service, 'ask', fake_ask):
+            response = self.client.get('/ai')
+        self.assertIn('http;dur=', response.headers['Server-Timing'])
+
+    def test_metrics_endpoint(self):
+        """عرض الإحصائيات بصيغة Prometheus"""
+        self.client.get('/messages')
+        body = self.client.get('/metrics').get_data(as_text=True)
+        self.assertIn('# TYPE http_request_duration_seconds histogram', body)
+        self.assertIn('http_request_duration_seconds_count{endpoint="messages",method="GET",status="200"} 1', body)
+        self.assertIn('db_statements_per_request_bucket{endpoint="messages",le="+Inf"} 1', body)
+        self.assertIn('n_plus_one_requests_total{endpoint="messages"} 1', body)
+
+    def test_slow_requests_profiled(self):
+        """حفظ ملف cProfile للطلبات البطيئة المختارة"""
+        self.instrumentation.profile_sample_rate = 1.0
+        self.instrumentation.profile_slow_ms = 0
+        self.client.get('/messages')
+        files = os.listdir(self.profile_dir.name)
+        self.assertEqual(len(files), 1)
+        self.assertTrue(files[0].endswith('.prof'))
+
+    def test_disabled_adds_nothing(self):
+        """بدون تفعيل لا تضاف أي خطافات"""
+        plain = Flask(__name__)
+        Instrumentation().init_app(plain)
+        self.assertNotIn('metrics', plain.view_functions)
+        self.assertEqual(plain.before_request_funcs, {})
+        with span('http'):
+            pass
+
+if __name__ == '__main__':
+    unittest.main()
\ No newline at end of file
@@ -0,0 +1,131 @@
+from datetime import datetime, timedelta
+import os
+import tempfile
+import threading
+import unittest
+from unittest.mock import patch
+from flask import Flask
+from model import db, Job
+from jobs import JobQueue, job
+import operations
+
+calls = []
+gate = threading.Event()
+
+@job('test_record', max_attempts=3)
+def record(value):
+    calls.append(value)
+
+@job('test_flaky', max_attempts=3)
+def flaky(fail_times):
+    calls.append('try')
+    if len(calls) <= fail_times:
+        raise RuntimeError('upstream down')
+
+@job('test_slow')
+def slow(value):
+    gate.wait(5)
+    calls.append(value)
+
+class TestJobQueue(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.flask_app = Flask(__name__)
+        self.flask_app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{os.path.join(self.tmp.name, "jobs.db")}'
+        db.init_app(self.flask_app)
+        self.ctx = self.flask_app.app_context()
+        self.ctx.push()
+        db.create_all()
+        self.queue = JobQueue(workers=2, poll_interval=0.05)
+        calls.clear()
+        gate.clear()
+
+    def tearDown(self):
+        self.queue.stop(timeout=1)
+        db.session.remove()
+        db.drop_all()
+        self.ctx.pop()
+        self.tmp.cleanup()
+
+    def test_idempotency_key(self):
+        """المهمة بنفس المفتاح لا تضاف مرتين"""
+        self.assertTrue(self.queue.enqueue('test_record', {'value': 1}, key='k1'))
+        self.assertFalse(self.queue.enqueue('test_record', {'value': 1}, key='k1'))
+        self.assertEqual(calls, [1])
+        self.assertEqual(Job.query.count(), 1)
+        self.assertEqual(self.queue.stats()['duplicates'], 1)
+
+    def test_retry_with_backoff_then_success(self):
+        """إعادة المحاولة بعد الفشل مع تأخير متزايد"""
+        with patch('jobs.backoff', return_value=60):
+            self.queue.enqueue('test_flaky', {'fail_times': 1})
+        row = Job.query.one()
+        self.assertEqual((row.status, row.attempts), ('queued', 1))
+        self.assertGreater(row.run_at, datetime.utcnow() + timedelta(seconds=50))
+        self.assertIn('upstream down', row.last_error)
+        self.assertEqual(self.queue.run_pending(), 0)
+
+        row.run_at = datetime.utcnow()
+        db.session.commit()
+        self.assertEqual(self.queue.run_pending(), 1)
+        self.assertEqual(Job.query.one().status, 'done')
+
+    def test_gives_up_after_max_attempts(self):
+        """المهمة تفشل نهائيا بعد عدد المحاولات المسموح"""
+        with patch('jobs.backoff', return_value=0):
+            self.queue.enqueue('test_flaky', {'fail_times': 10})
+            self.queue.run_pending()
+        row = Job.query.one()
+        self.assertEqual((row.status, row.attempts), ('failed', 3))
+        self.assertEqual(self.queue.stats()['failed'], 1)
+
+    def test_workers_and_drain(self):
+        """العمال ينفذون المهام ويفرغون الطابور عند الإيقاف"""
+        self.queue.start(self.flask_app)
+        for i in range(10):
+            self.queue.enqueue('test_slow', {'value': i})
+        gate.set()
+        self.queue.stop(timeout=5)
+        self.assertEqual(sorted(calls), list(range(10)))
+        self.assertEqual(self.queue.depth()['done'], 10)
+        self.assertIn('job_queue_depth{status="done"} 10', '\n'.join(self.queue.metrics()))
+
+    def test_recover_stale_running_jobs(self):
+        """المهام العالقة من عامل متوقف تعود للطابور"""
+        db.session.add(Job(name='test_record', payload='{"value": 7}', status='running', attempts=1,
+                           started_at=datetime.utcnow() - timedelta(hours=1)))
+        db.session.commit()
+        self.assertEqual(self.queue.recover(), 1)
+        self.assertEqual(self.queue.run_pending(), 1)
+        self.assertEqual(calls, [7])
+
+    def test_inline_runs_only_new_job(self):
+        """بدون عمال تنفذ المهمة الجديدة فقط ولا يفرغ الطابور كله في خيط الطلب"""
+        db.session.add(Job(name='test_record', payload='{"value": 1}'))
+        db.session.commit()
+        self.queue.enqueue('test_record', {'value': 2})
+        self.assertEqual(calls, [2])
+        self.assertEqual(self.queue.depth()['queued'], 1)
+
+    def test_prune_finished_jobs(self):
+        """المهام المنتهية القديمة تحذف والحديثة والمنتظرة تبقى"""
+        now = datetime.utcnow()
+        for status, age in (('done', 8), ('done', 1), ('failed', 8), ('failed', 31), ('queued', 40)):
+            finished = now - timedelta(days=age) if status != 'queued' else None
+            db.session.add(Job(name='test_record', payload='{}', status=status, finished_at=finished,
+                               created_at=now - timedelta(days=age)))
+        db.session.commit()
+        self.assertEqual(self.queue.prune(batch_size=1), 2)
+        self.assertEqual(sorted((job.status, (now - job.created_at).days) for job in Job.query),
+                         [('done', 1), ('failed', 8), ('queued', 40)])
+
+    def test_operations_enqueue_side_effects(self):
+        """تسجيل المستخدم يضيف مهمة رسالة الترحيب"""
+        with patch('operations.hashing_service.workers', 0), patch('operations.enqueue', self.queue.enqueue):
+            operations.register_user('newuser', 'new@example.com', 'pass')
+        row = Job.query.filter_by(name='welcome_email').one()
+        self.assertEqual(row.status, 'done')
+        self.assertTrue(row.idempotency_key.startswith('welcome_email:1:'))
+
+if __name__ == '__main__':
+    unittest.main()
\ No newline at end of file
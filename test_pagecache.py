@@ -0,0 +1,168 @@
+import tempfile
+import unittest
+from unittest.mock import patch
+from flask import Flask, flash, get_flashed_messages, session
+from model import db, Course
+from pagecache import PageCache, MemoryBackend, DiskBackend
+import operations
+
+class TestPageCache(unittest.TestCase):
+    def setUp(self):
+        self.flask_app = Flask(__name__)
+        self.flask_app.secret_key = 'test'
+        self.flask_app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
+        db.init_app(self.flask_app)
+        self.ctx = self.flask_app.app_context()
+        self.ctx.push()
+        db.create_all()
+        self.cache = PageCache(MemoryBackend())
+        self.renders = 0
+
+        @self.flask_app.route('/')
+        @self.cache.cached()
+        def home():
+            self.renders += 1
+            cards = self.cache.fragment('course_cards', lambda: ','.join(c.title for c in Course.query.all()))
+            return f'<ul>{cards}</ul>'
+
+        @self.flask_app.route('/login')
+        def login():
+            session['token'] = 'x'
+            return 'ok'
+
+        self.client = self.flask_app.test_client()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.ctx.pop()
+
+    def test_anonymous_page_cached(self):
+        """الصفحة تعرض مرة واحدة للزوار غير المسجلين"""
+        for _ in range(3):
+            response = self.client.get('/')
+            self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.renders, 1)
+        self.assertIsNotNone(response.headers.get('ETag'))
+        self.assertIsNotNone(response.headers.get('Last-Modified'))
+
+    def test_conditional_requests(self):
+        """إرجاع 304 عند تطابق ETag أو Last-Modified"""
+        first = self.client.get('/')
+        response = self.client.get('/', headers={'If-None-Match': first.headers['ETag']})
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.data, b'')
+        response = self.client.get('/', headers={'If-Modified-Since': first.headers['Last-Modified']})
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(self.cache.stats()['not_modified'], 2)
+
+    def test_logged_in_users_use_fragments(self):
+        """المستخدم المسجل يحصل على صفحة جديدة مع كاش الأجزاء"""
+        self.client.get('/login')
+        self.client.get('/')
+        self.client.get('/')
+        self.assertEqual(self.renders, 2)
+        stats = self.cache.stats()
+        self.assertEqual((stats['fragment_misses'], stats['fragment_hits']), (1, 1))
+
+    def test_course_changes_invalidate(self):
+        """إضافة أو حذف كورس يبطل الكاش"""
+        self.assertEqual(self.client.get('/').data, b'<ul></ul>')
+        with patch('operations.page_cache', self.cache):
+            operations.add_course('Python', 'desc', 'python.jpg', 'programming')
+            self.assertEqual(self.client.get('/').data, b'<ul>Python</ul>')
+            operations.delete_course(1)
+        self.assertEqual(self.client.get('/').data, b'<ul></ul>')
+        self.assertEqual(self.renders, 3)
+
+    def test_disk_backend(self):
+        """التخزين على القرص مشترك بين النسخ"""
+        with tempfile.TemporaryDirectory() as directory:
+            DiskBackend(directory).set('page:1:/', {'body': b'x'}, ttl=60)
+            self.assertEqual(DiskBackend(directory).get('page:1:/'), {'body': b'x'})
+            DiskBackend(directory).set('old', 'x', ttl=-1)
+            self.assertIsNone(DiskBackend(directory).get('old'))
+            DiskBackend(directory).clear()
+            self.assertEqual(len(DiskBackend(directory)), 0)
+
+    def test_version_moves_forward(self):
+        """الإصدار يزيد مع كل إبطال حتى في نفس الثانية"""
+        versions = [self.cache.version()]
+        for _ in range(3):
+            self.cache.invalidate()
+            versions.append(self.cache.version())
+        self.assertEqual(versions, sorted(set(versions)))
+
+    def test_change_in_other_process(self):
+        """تعديل الكورسات من عملية أخرى يبطل صفحات هذه العملية"""
+        self.cache.shared_version.check_interval = 0
+        self.client.get('/')
+        # Stands in for another worker or the importer CLI with its own cache object.
+        PageCache(MemoryBackend()).invalidate()
+        self.client.get('/')
+        self.assertEqual(self.renders, 2)
+
+    def test_render_during_change_not_stored(self):
+        """صفحة بدأ عرضها قبل تعديل الكورسات لا تخزن"""
+        @self.flask_app.route('/busy')
+        @self.cache.cached()
+        def busy():
+            self.renders += 1
+            self.cache.invalidate()
+            return 'old'
+
+        self.client.get('/busy')
+        self.client.get('/busy')
+        self.assertEqual(self.renders, 2)
+
+    def test_flash_not_shared(self):
+        """رسالة flash لزائر لا تظهر لبقية الزوار"""
+        @self.flask_app.route('/notice')
+        @self.cache.cached()
+        def notice():
+            return 'notices:' + ','.join(get_flashed_messages())
+
+        @self.flask_app.route('/save')
+        def save():
+            flash('تم الحفظ')
+            return 'ok'
+
+        visitor = self.flask_app.test_client()
+        visitor.get('/save')
+        self.assertEqual(visitor.get('/notice').text, 'notices:تم الحفظ')
+        self.assertEqual(self.client.get('/notice').text, 'notices:')
+        self.assertEqual(visitor.get('/notice').text, 'notices:')
+        self.assertEqual(self.cache.stats()['hits'], 1)
+
+    def test_query_parameters(self):
+        """المعاملات غير المسموحة لا تخزن والمسموحة تدخل في المفتاح"""
+        @self.flask_app.route('/list')
+        @self.cache.cached(query=('page',))
+        def listing():
+            self.renders += 1
+            return f'page {self.renders}'
+
+        for _ in range(2):
+            self.client.get('/?utm_source=x')
+        self.assertEqual(self.renders, 2)
+        first = self.client.get('/list?page=2').text
+        self.assertEqual(self.client.get('/list?page=2').text, first)
+        self.assertNotEqual(self.client.get('/list?page=3').text, first)
+        self.client.get('/list?page=2&x=1')
+        self.assertEqual(self.renders, 5)
+
+    def test_disk_backend_bounded(self):
+        """حجم التخزين على القرص محدود ويحذف الأقدم أولا"""
+        with tempfile.TemporaryDirectory() as directory:
+            backend = DiskBackend(directory, max_entries=10)
+            for i in range(25):
+                backend.set(f'page:{i}', 'x' * 100, ttl=60)
+            self.assertEqual(backend.prune(), 16)
+            self.assertEqual(len(backend), 9)
+            self.assertEqual(backend.get('page:24'), 'x' * 100)
+            backend.max_entries, backend.max_bytes = 100, 500
+            backend.prune()
+            self.assertLessEqual(len(backend), 4)
+
+if __name__ == '__main__':
+    unittest.main()
\ No newline at end of file
@@ -0,0 +1,91 @@
+import unittest
+from unittest.mock import patch
+from flask import Flask
+from model import db, Course
+from search import SearchIndex, MemoryBackend, tokenize, search_bp
+import search
+
+class TestCourseSearch(unittest.TestCase):
+    def setUp(self):
+        self.flask_app = Flask(__name__)
+        self.flask_app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
+        db.init_app(self.flask_app)
+        self.flask_app.register_blueprint(search_bp)
+        self.ctx = self.flask_app.app_context()
+        self.ctx.push()
+        db.create_all()
+        courses = [
+            ('أساسيات البرمجة بلغة بايثون', 'دورة للمبتدئين في البرمجة'),
+            ('تصميم الواجهات', 'مبادئ التصميم وتجربة المستخدم'),
+            ('Python for Data Science', 'pandas, numpy and برمجة'),
+        ]
+        for i, (title, description) in enumerate(courses):
+            db.session.add(Course(title=title, description=description,
+                                  course_type='programming', course_link=f'course-{i}'))
+        db.session.commit()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.ctx.pop()
+
+    def make_index(self, backend):
+        index = SearchIndex()
+        index.backend = backend
+        index.rebuild()
+        return index
+
+    def test_arabic_normalisation(self):
+        """توحيد الهمزات والتشكيل وأداة التعريف"""
+        self.assertEqual(tokenize('البرمجةُ'), tokenize('برمجة'))
+        self.assertEqual(tokenize('أساسيات'), tokenize('اساسيات'))
+        self.assertEqual(tokenize('والتصميم ١٢'), ['تصميم', '12'])
+
+    def test_ranking_matches_between_backends(self):
+        """ترتيب النتائج متطابق بين FTS5 والفهرس الداخلي"""
+        fts = self.make_index(search.Fts5Backend())
+        memory = self.make_index(MemoryBackend())
+        for query in ('البرمجة', 'بايثون', 'python'):
+            self.assertEqual([r['id'] for r in fts.search(query)],
+                             [r['id'] for r in memory.search(query)])
+        self.assertEqual(memory.search('البرمجة')[0]['id'], 1)
+
+    def test_incremental_updates_and_cache(self):
+        """تحديث الفهرس عند الإضافة والحذف وإبطال الكاش"""
+        index = self.make_index(MemoryBackend())
+        self.assertEqual(index.search('تصميم')[0]['id'], 2)
+        index.search('تصميم')
+        self.assertEqual(index.cache_hits, 1)
+
+        course = Course(title='تصميم الشعارات', description='شعارات', course_type='design',
+                        course_link='logos')
+        db.session.add(course)
+        db.session.commit()
+        index.add_course(course)
+        self.assertEqual(len(index.search('تصميم')), 2)
+
+        index.remove_course(2)
+        self.assertEqual([r['id'] for r in index.search('تصميم')], [course.id])
+
+    def test_change_in_other_process(self):
+        """تعديل الفهرس في عملية أخرى يبطل الكاش هنا ويعيد بناء الفهرس الداخلي"""
+        worker = self.make_index(MemoryBackend())
+        worker.version.check_interval = 0
+        self.assertEqual(len(worker.search('تصميم')), 1)
+        course = Course(title='تصميم الشعارات', description='شعارات', course_type='design',
+                        course_link='logos')
+        db.session.add(course)
+        db.session.commit()
+        # The job worker in another process indexes the course with its own SearchIndex.
+        self.make_index(MemoryBackend()).add_course(course)
+        self.assertEqual(len(worker.search('تصميم')), 2)
+
+    def test_search_endpoint(self):
+        """واجهة البحث تعيد النتائج مرتبة"""
+        with patch('search.search_index', self.make_index(MemoryBackend())):
+            response = self.flask_app.test_client().get('/api/search', query_string={'q': 'بايثون'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json['results'][0]['id'], 1)
+
+if __name__ == '__main__':
+    unittest.main()
\ No newline at end of file
@@ -0,0 +1,81 @@
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+from flask import Flask
+from sqlalchemy.exc import OperationalError
+from model import db, Course
+from storage import Storage
+
+class TestStorage(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, 'store.db')
+        self.flask_app = Flask(__name__)
+        self.flask_app.config['DATABASE_PATH'] = self.path
+        self.storage = Storage()
+
+    def tearDown(self):
+        self.storage.dispose()
+        with self.flask_app.app_context():
+            db.session.remove()
+            db.engine.dispose()
+        self.tmp.cleanup()
+
+    def test_pragmas_applied(self):
+        """إعدادات SQLite تطبق على كل اتصال"""
+        self.storage.init_app(self.flask_app)
+        with self.flask_app.app_context():
+            stats = self.storage.stats()
+        self.assertEqual(stats['journal_mode'], 'wal')
+        self.assertEqual(stats['synchronous'], 1)
+        self.assertEqual(stats['busy_timeout'], 5000)
+        self.assertEqual(stats['read_path'], 'separate')
+
+    def test_app_config_wins_over_environment(self):
+        """قاعدة البيانات المحددة في إعدادات التطبيق تتقدم على متغيرات البيئة"""
+        production = os.path.join(self.tmp.name, 'production.db')
+        with patch('storage.DATABASE_URL', f'sqlite:///{production}'), \
+                patch('storage.DATABASE_READ_URL', f'sqlite:///{production}'):
+            self.storage.init_app(self.flask_app)
+        self.assertEqual(self.storage.url.database, self.path)
+        self.assertNotIn('production', str(self.storage.read_engine.url))
+        self.assertFalse(os.path.exists(production))
+
+    def test_read_session_is_read_only(self):
+        """جلسة القراءة ترى البيانات المحفوظة ولا تكتب"""
+        self.storage.init_app(self.flask_app)
+        with self.flask_app.app_context():
+            db.create_all()
+            db.session.add(Course(title='كورس', description='وصف', course_type='data', course_link='c'))
+            db.session.commit()
+            with self.storage.read_session() as session:
+                self.assertEqual(session.query(Course.title).scalar(), 'كورس')
+                with self.assertRaises(OperationalError):
+                    session.add(Course(title='x', description='x', course_type='x', course_link='x'))
+                    session.commit()
+
+    def test_relative_path_reads_writer_file(self):
+        """المسار النسبي يفتح نفس ملف الكتابة في مسار القراءة"""
+        self.flask_app = Flask(__name__, instance_path=os.path.join(self.tmp.name, 'instance'))
+        self.flask_app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///relative.db'
+        self.storage.init_app(self.flask_app)
+        self.assertEqual(self.storage.url.database, os.path.join(self.tmp.name, 'instance', 'relative.db'))
+        with self.flask_app.app_context():
+            db.create_all()
+            db.session.add(Course(title='كورس', description='وصف', course_type='data', course_link='c'))
+            db.session.commit()
+            with self.storage.read_session() as session:
+                self.assertEqual(session.query(Course.title).scalar(), 'كورس')
+
+    def test_memory_database_shares_session(self):
+        """قاعدة البيانات في الذاكرة لا تفتح مسار قراءة منفصلا"""
+        self.flask_app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
+        self.storage.init_app(self.flask_app)
+        self.assertIsNone(self.storage.read_engine)
+        with self.flask_app.app_context():
+            with self.storage.read_session() as session:
+                self.assertIs(session, db.session)
+
+if __name__ == '__main__':
+    unittest.main()
\ No newline at end of file
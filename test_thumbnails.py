@@ -0,0 +1,184 @@
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+from unittest.mock import patch
+from flask import Flask
+from model import db, Course, CourseImage
+from thumbnails import ThumbnailService, thumbnails_bp
+import operations
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+try:
+    import httpx
+except ImportError:
+    httpx = None
+
+def make_image(path, color, size=(1200, 800)):
+    Image.new('RGB', size, color).save(path, 'JPEG')
+
+@unittest.skipIf(Image is None, 'Pillow غير مثبت')
+class TestThumbnails(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.source_dir = os.path.join(self.tmp, 'static')
+        os.makedirs(self.source_dir)
+        self.flask_app = Flask(__name__)
+        self.flask_app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
+        db.init_app(self.flask_app)
+        self.flask_app.register_blueprint(thumbnails_bp)
+        self.service = ThumbnailService(directory=os.path.join(self.tmp, 'thumbs'),
+                                        source_dir=self.source_dir, workers=0)
+        self.ctx = self.flask_app.test_request_context()
+        self.ctx.push()
+        db.create_all()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.ctx.pop()
+        self.service.shutdown()
+        shutil.rmtree(self.tmp)
+
+    def add_courses(self, images):
+        for i, image in enumerate(images):
+            db.session.add(Course(title=f'course {i}', description='d', course_type='programming',
+                                  course_link=f'course-{i}', image_url=image))
+        db.session.commit()
+        return [course.id for course in Course.query.order_by(Course.id)]
+
+    def test_identical_images_rendered_once(self):
+        """الصور المتطابقة تولد مرة واحدة وتشترك في نفس الملفات"""
+        make_image(os.path.join(self.source_dir, 'a.jpg'), 'red')
+        shutil.copy(os.path.join(self.source_dir, 'a.jpg'), os.path.join(self.source_dir, 'copy.jpg'))
+        ids = self.add_courses(['a.jpg', 'copy.jpg', 'a.jpg'])
+        report = self.service.warm(ids)
+        self.assertEqual((report['generated'], report['deduplicated']), (1, 2))
+        self.assertEqual(len({row.digest for row in CourseImage.query}), 1)
+        files = [name for _, _, names in os.walk(self.service.directory) for name in names]
+        self.assertEqual(len(files), 8)  # 4 widths x webp/jpeg
+
+        # A later course with the same bytes reuses the files already on disk.
+        new_id = self.add_courses(['copy.jpg'])[-1]
+        self.assertEqual(self.service.generate(new_id)['deduplicated'], 1)
+
+    def test_cold_cache_warm_up(self):
+        """تسخين الكاش البارد ثم إعادة التشغيل بدون توليد جديد"""
+        colors = ['red', 'green', 'blue', 'yellow', 'purple', 'orange', 'black', 'white']
+        for color in colors:
+            make_image(os.path.join(self.source_dir, f'{color}.jpg'), color)
+        ids = self.add_courses([f'{color}.jpg' for color in colors])
+        start = time.perf_counter()
+        report = self.service.warm(ids)
+        cold = time.perf_counter() - start
+        self.assertEqual(report['generated'], len(colors))
+
+        start = time.perf_counter()
+        report = self.service.warm(ids)
+        warm = time.perf_counter() - start
+        self.assertEqual(report['cached'], len(colors))
+        self.assertLess(warm, cold / 5)
+        self.assertLess(cold, 10)
+
+    def test_srcset_and_serving(self):
+        """روابط srcset وترويسات التخزين الطويل والرد 304"""
+        make_image(os.path.join(self.source_dir, 'small.jpg'), 'red', size=(400, 300))
+        course_id = self.add_courses(['small.jpg'])[0]
+        self.service.generate(course_id)
+        course = db.session.get(Course, course_id)
+        srcset = self.service.srcset(course)
+        self.assertEqual([part.split()[1] for part in srcset.split(', ')], ['160w', '320w'])
+        self.assertIn('<picture>', self.service.picture(course))
+
+        url = srcset.split()[0]
+        with patch('thumbnails.thumbnail_service', self.service):
+            client = self.flask_app.test_client()
+            response = client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.mimetype, 'image/webp')
+            self.assertIn('immutable', response.headers['Cache-Control'])
+            self.assertIn('max-age=31536000', response.headers['Cache-Control'])
+            etag = response.headers['ETag']
+            response.close()
+            self.assertEqual(client.get(url, headers={'If-None-Match': etag}).status_code, 304)
+            self.assertEqual(client.get('/thumbs/../../etc/passwd').status_code, 404)
+
+        course.image_url = 'other.jpg'
+        self.assertEqual(self.service.srcset(course), '')
+
+    def test_add_course_queues_thumbnails(self):
+        """إضافة كورس تولد صوره المصغرة عبر طابور المهام"""
+        make_image(os.path.join(self.source_dir, 'new.jpg'), 'blue')
+        with patch('thumbnails.thumbnail_service', self.service):
+            operations.add_course('New', 'desc', 'new.jpg', 'design')
+        self.assertEqual(CourseImage.query.count(), 1)
+        operations.delete_course(1)
+        self.assertEqual(CourseImage.query.count(), 0)
+
+    def test_update_course(self):
+        """تعديل الكورس يجدد الصور عند تغيير الصورة والحقل غير المعروف لا يترك تعديلا ناقصا"""
+        make_image(os.path.join(self.source_dir, 'red.jpg'), 'red')
+        make_image(os.path.join(self.source_dir, 'blue.jpg'), 'blue')
+        with patch('thumbnails.thumbnail_service', self.service), \
+                patch('operations.thumbnail_service', self.service):
+            operations.add_course('Old', 'desc', 'red.jpg', 'design')
+            first = CourseImage.query.one().digest
+            with self.assertRaises(ValueError):
+                operations.update_course(1, title='New', likes=5)
+            db.session.commit()
+            self.assertEqual(db.session.get(Course, 1).title, 'Old')
+            course = operations.update_course(1, title='New', image_url='blue.jpg')
+            self.assertEqual(db.session.get(Course, 1).title, 'New')
+            self.assertNotEqual(CourseImage.query.one().digest, first)
+        self.assertEqual(course.image_url, 'blue.jpg')
+        self.assertIsNone(operations.update_course(99, title='x'))
+
+class RemoteImage(BaseHTTPRequestHandler):
+    """يرسل صورة كبيرة على دفعات مع Content-Length أو بدونه"""
+    chunks = 64
+
+    def do_GET(self):
+        self.send_response(200)
+        if self.path == '/declared':
+            self.send_header('Content-Length', str(self.chunks * 1024))
+        self.end_headers()
+        try:
+            for _ in range(self.chunks):
+                self.wfile.write(b'x' * 1024)
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+    def log_message(self, *args):
+        pass
+
+@unittest.skipIf(httpx is None, 'httpx غير مثبت')
+class TestRemoteSource(unittest.TestCase):
+    def setUp(self):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), RemoteImage)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.base = f'http://127.0.0.1:{self.server.server_port}'
+        self.service = ThumbnailService(workers=0)
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_size_cap(self):
+        """الصورة البعيدة الأكبر من الحد لا تنزل كاملة"""
+        with patch('thumbnails.MAX_SOURCE_BYTES', 4 * 1024):
+            with self.assertRaises(ValueError):
+                self.service._read_source(f'{self.base}/declared')
+            with self.assertRaises(ValueError):
+                self.service._read_source(f'{self.base}/chunked')
+        with patch('thumbnails.MAX_SOURCE_BYTES', 128 * 1024):
+            self.assertEqual(len(self.service._read_source(f'{self.base}/small')), 64 * 1024)
+
+if __name__ == '__main__':
+    unittest.main()
\ No newline at end of file
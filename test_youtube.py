@@ -0,0 +1,124 @@
+from datetime import datetime, timedelta
+import asyncio
+import unittest
+from flask import Flask
+from model import db, YouTubeStat
+from youtube import YouTubeStatsService
+
+class FakeRequest:
+    def __init__(self, api, kind, ids):
+        self.api = api
+        self.kind = kind
+        self.ids = ids
+
+    def execute(self):
+        self.api.calls.append((self.kind, self.ids))
+        if self.api.fail:
+            raise RuntimeError('quotaExceeded')
+        return {'items': [{'id': item_id, 'statistics': {'viewCount': '100', 'subscriberCount': '7',
+                                                         'videoCount': '3'}}
+                          for item_id in self.ids if not item_id.startswith('gone')]}
+
+class FakeResource:
+    def __init__(self, api, kind):
+        self.api = api
+        self.kind = kind
+
+    def list(self, part, id, maxResults):
+        ids = id.split(',')
+        assert part == 'statistics' and len(ids) <= maxResults == 50
+        return FakeRequest(self.api, self.kind, ids)
+
+class FakeYouTube:
+    """نسخة محلية من واجهة YouTube Data API"""
+    def __init__(self):
+        self.calls = []
+        self.fail = False
+
+    def channels(self):
+        return FakeResource(self, 'channel')
+
+    def videos(self):
+        return FakeResource(self, 'video')
+
+class TestYouTubeStats(unittest.TestCase):
+    def setUp(self):
+        self.flask_app = Flask(__name__)
+        self.flask_app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
+        db.init_app(self.flask_app)
+        self.ctx = self.flask_app.app_context()
+        self.ctx.push()
+        db.create_all()
+        self.api = FakeYouTube()
+        self.service = YouTubeStatsService(client_factory=lambda: self.api, calls_per_minute=6000)
+        self.service.init_app(self.flask_app)
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.ctx.pop()
+
+    def test_request_path_never_calls_api(self):
+        """قراءة الإحصائيات من الكاش فقط وطلب التحديث في الخلفية"""
+        self.assertEqual(self.service.get_stats('channel', ['a', 'b']), {})
+        self.assertEqual(self.api.calls, [])
+        self.assertEqual(self.service.stats()['queued'], 2)
+
+    def test_refresh_batches_ids(self):
+        """تجميع المعرفات في دفعات من 50"""
+        ids = [f'ch{i}' for i in range(120)]
+        self.service.get_stats('channel', ids)
+        self.service.get_stats('video', ['v1', 'gone1'])
+        refreshed = asyncio.run(self.service.refresh_once())
+        self.assertEqual(refreshed, 122)
+        self.assertEqual([len(batch) for _, batch in self.api.calls], [50, 50, 20, 2])
+        stats = self.service.get_stats('channel', ids)
+        self.assertEqual(stats['ch0']['subscriber_count'], 7)
+        self.assertIsNone(self.service.get_stats('video', ['gone1'])['gone1']['view_count'])
+
+    def test_ttl_controls_refetch(self):
+        """الإدخالات الحديثة لا يعاد جلبها والقديمة تحدث"""
+        self.service.get_stats('channel', ['a', 'b'])
+        asyncio.run(self.service.refresh_once())
+        self.service.get_stats('channel', ['a', 'b'])
+        self.assertEqual(asyncio.run(self.service.refresh_once()), 0)
+
+        row = YouTubeStat.query.filter_by(item_id='a').first()
+        row.fetched_at = datetime.utcnow() - timedelta(hours=2)
+        db.session.commit()
+        self.assertEqual(asyncio.run(self.service.refresh_once()), 1)
+        self.assertEqual(self.api.calls[-1], ('channel', ['a']))
+
+    def test_only_recently_requested_refreshed(self):
+        """المعرفات التي لم يطلبها أحد مؤخرا لا تستهلك الحصة"""
+        self.service.get_stats('channel', ['old', 'recent'])
+        asyncio.run(self.service.refresh_once())
+        long_ago = datetime.utcnow() - timedelta(days=30)
+        YouTubeStat.query.update({YouTubeStat.fetched_at: long_ago, YouTubeStat.requested_at: long_ago})
+        db.session.commit()
+        self.assertEqual(asyncio.run(self.service.refresh_once()), 0)
+
+        self.service.get_stats('channel', ['recent'])
+        self.assertEqual(asyncio.run(self.service.refresh_once()), 1)
+        # Stale again later: still refreshed in the background because it was asked for.
+        YouTubeStat.query.update({YouTubeStat.fetched_at: long_ago})
+        db.session.commit()
+        self.assertEqual(asyncio.run(self.service.refresh_once()), 1)
+        self.assertEqual(self.api.calls[-1], ('channel', ['recent']))
+
+    def test_quota_and_errors_requeue(self):
+        """نفاد الحصة أو فشل الطلب يعيد المعرفات للطابور"""
+        self.service.daily_quota = 1
+        self.service.get_stats('channel', [f'ch{i}' for i in range(60)])
+        asyncio.run(self.service.refresh_once())
+        self.assertEqual(len(self.api.calls), 1)
+        self.assertEqual(self.service.stats()['queued'], 10)
+
+        self.service.daily_quota = 10
+        self.api.fail = True
+        asyncio.run(self.service.refresh_once())
+        self.assertEqual(self.service.stats()['api_errors'], 1)
+        self.assertEqual(self.service.stats()['queued'], 10)
+
+if __name__ == '__main__':
+    unittest.main()
\ No newline at end of file
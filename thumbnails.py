@@ -0,0 +1,286 @@
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+import atexit
+import hashlib
+import importlib.util
+import io
+import logging
+import os
+import re
+import threading
+import time
+from flask import Blueprint, abort, send_from_directory, url_for
+from markupsafe import Markup, escape
+from model import db, Course, CourseImage
+from jobs import job
+
+THUMBNAIL_DIR = os.environ.get('THUMBNAIL_DIR', 'thumbnails')
+SOURCE_DIR = os.environ.get('THUMBNAIL_SOURCE_DIR', 'static')
+THUMBNAIL_WORKERS = int(os.environ.get('THUMBNAIL_WORKERS', os.cpu_count() or 1))
+WIDTHS = (160, 320, 640, 960)
+FORMATS = {'webp': 'WEBP', 'jpeg': 'JPEG'}
+QUALITY = 80
+MAX_SOURCE_BYTES = 20 * 1024 * 1024
+CACHE_MAX_AGE = 365 * 24 * 3600  # names are content hashes, so a file never changes
+LOOKUP_CACHE_SIZE = 4096
+MISSING_TTL = 60  # how long a course without variants is remembered as such
+DEFAULT_SIZES = '(max-width: 600px) 100vw, 320px'
+VARIANT_NAME = re.compile(r'^[0-9a-f]{64}-\d+\.(webp|jpeg)$')
+
+thumbnails_bp = Blueprint('thumbnails', __name__)
+
+def variant_name(digest, width, fmt):
+    return f'{digest}-{width}.{fmt}'
+
+def variant_path(directory, digest, width, fmt):
+    # Two-level fan-out keeps each directory small.
+    return os.path.join(directory, digest[:2], variant_name(digest, width, fmt))
+
+def target_widths(source_width, widths=WIDTHS):
+    # Never upscale; a source smaller than every size gets one variant at its own width.
+    return [width for width in widths if width <= source_width] or [source_width]
+
+def render_variants(data, digest, directory, widths=WIDTHS, quality=QUALITY):
+    # Runs in a worker process; Pillow is only imported where images are actually made.
+    from PIL import Image
+    image = Image.open(io.BytesIO(data))
+    image.load()
+    if image.mode not in ('RGB', 'RGBA'):
+        image = image.convert('RGBA' if 'transparency' in image.info else 'RGB')
+    made = target_widths(image.width, widths)
+    os.makedirs(os.path.join(directory, digest[:2]), exist_ok=True)
+    for width in made:
+        resized = image.copy()
+        resized.thumbnail((width, image.height), Image.LANCZOS)
+        for fmt, pil_format in FORMATS.items():
+            path = variant_path(directory, digest, width, fmt)
+            if os.path.exists(path):
+                continue
+            frame = resized
+            if pil_format == 'JPEG' and frame.mode == 'RGBA':
+                frame = Image.new('RGB', frame.size, 'white')
+                frame.paste(resized, mask=resized.getchannel('A'))
+            tmp_path = f'{path}.{os.getpid()}.tmp'
+            frame.save(tmp_path, pil_format, quality=quality, optimize=True)
+            os.replace(tmp_path, path)
+    return made
+
+class ThumbnailService:
+    def __init__(self, directory=THUMBNAIL_DIR, source_dir=SOURCE_DIR, widths=WIDTHS, workers=THUMBNAIL_WORKERS):
+        # workers=0 renders on the calling thread (tests, scripts).
+        self.directory = os.path.abspath(directory)
+        self.source_dir = os.path.abspath(source_dir)
+        self.widths = widths
+        self.workers = workers
+        self._pool = None
+        self._pool_lock = threading.Lock()
+        self._lock = threading.Lock()
+        self._lookup = OrderedDict()
+        self._missing = {}
+        self.generated = 0
+        self.deduplicated = 0
+        self.cached = 0
+        self.missing = 0
+
+    @property
+    def available(self):
+        # Pillow is optional: without it no variants are made and pages keep the original image_url.
+        return importlib.util.find_spec('PIL') is not None
+
+    def init_app(self, app):
+        self.directory = os.path.abspath(app.config.get('THUMBNAIL_DIR', self.directory))
+        self.source_dir = os.path.abspath(app.config.get('THUMBNAIL_SOURCE_DIR', self.source_dir))
+        app.jinja_env.globals['thumbnail_srcset'] = self.srcset
+        app.jinja_env.globals['course_picture'] = self.picture
+
+    def _get_pool(self):
+        with self._pool_lock:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(self.workers)
+                atexit.register(self.shutdown)
+            return self._pool
+
+    def _read_source(self, source):
+        if source.startswith(('http://', 'https://')):
+            import httpx
+            # Streamed so an oversized image is abandoned at the cap instead of
+            # being downloaded into memory first.
+            with httpx.stream('GET', source, follow_redirects=True, timeout=30) as response:
+                response.raise_for_status()
+                length = response.headers.get('Content-Length', '')
+                if length.isdigit() and int(length) > MAX_SOURCE_BYTES:
+                    raise ValueError(f'Image too large: {source}')
+                data = bytearray()
+                for chunk in response.iter_bytes():
+                    data += chunk
+                    if len(data) > MAX_SOURCE_BYTES:
+                        raise ValueError(f'Image too large: {source}')
+                return bytes(data)
+        path = os.path.normpath(os.path.join(self.source_dir, source.lstrip('/')))
+        if not path.startswith(self.source_dir + os.sep) or not os.path.isfile(path):
+            return None
+        with open(path, 'rb') as f:
+            return f.read(MAX_SOURCE_BYTES + 1)[:MAX_SOURCE_BYTES]
+
+    def _complete(self, digest, widths):
+        return all(os.path.exists(variant_path(self.directory, digest, width, fmt))
+                   for width in widths for fmt in FORMATS)
+
+    def warm(self, course_ids):
+        # Reads every source, renders each distinct image once across the pool,
+        # and points courses with identical bytes at the same files.
+        if not self.available:
+            return {'generated': 0, 'deduplicated': 0, 'cached': 0, 'missing': 0}
+        courses = db.session.query(Course.id, Course.image_url).filter(Course.id.in_(list(course_ids))).all()
+        existing = {row.course_id: row for row in
+                    CourseImage.query.filter(CourseImage.course_id.in_([c.id for c in courses]))}
+        report = {'generated': 0, 'deduplicated': 0, 'cached': 0, 'missing': 0}
+        pending = {}
+        assignments = []
+        for course in courses:
+            if not course.image_url:
+                continue
+            row = existing.get(course.id)
+            if row is not None and row.source == course.image_url and \
+                    self._complete(row.digest, _split(row.widths)):
+                report['cached'] += 1
+                continue
+            data = self._read_source(course.image_url)
+            if data is None:
+                logging.warning(f'Thumbnail source not found for course {course.id}: {course.image_url}')
+                report['missing'] += 1
+                continue
+            digest = hashlib.sha256(data).hexdigest()
+            assignments.append((course, digest))
+            if digest in pending:
+                report['deduplicated'] += 1
+                continue
+            known = CourseImage.query.filter_by(digest=digest).first()
+            if known is not None and self._complete(digest, _split(known.widths)):
+                pending[digest] = _split(known.widths)
+                report['deduplicated'] += 1
+                continue
+            if self.workers:
+                pending[digest] = self._get_pool().submit(render_variants, data, digest, self.directory, self.widths)
+            else:
+                pending[digest] = render_variants(data, digest, self.directory, self.widths)
+            report['generated'] += 1
+        widths = {digest: value if isinstance(value, list) else value.result()
+                  for digest, value in pending.items()}
+        for course, digest in assignments:
+            row = existing.get(course.id)
+            if row is None:
+                row = CourseImage(course_id=course.id)
+                db.session.add(row)
+            row.source = course.image_url
+            row.digest = digest
+            row.widths = ','.join(str(width) for width in widths[digest])
+            self._remember(course.id, (row.source, digest, widths[digest]))
+        db.session.commit()
+        with self._lock:
+            for name, count in report.items():
+                setattr(self, name, getattr(self, name) + count)
+        return report
+
+    def generate(self, course_id):
+        return self.warm([course_id])
+
+    def _remember(self, course_id, info):
+        with self._lock:
+            self._missing.pop(course_id, None)
+            self._lookup[course_id] = info
+            self._lookup.move_to_end(course_id)
+            while len(self._lookup) > LOOKUP_CACHE_SIZE:
+                self._lookup.popitem(last=False)
+
+    def prime(self, courses):
+        # One query for a whole page of cards instead of one per srcset() call.
+        now = time.time()
+        wanted = [course.id for course in courses
+                  if course.id not in self._lookup and self._missing.get(course.id, 0) < now]
+        if not wanted:
+            return
+        found = set()
+        for row in CourseImage.query.filter(CourseImage.course_id.in_(wanted)):
+            self._remember(row.course_id, (row.source, row.digest, _split(row.widths)))
+            found.add(row.course_id)
+        with self._lock:
+            if len(self._missing) > LOOKUP_CACHE_SIZE:
+                self._missing.clear()
+            for course_id in wanted:
+                if course_id not in found:
+                    self._missing[course_id] = now + MISSING_TTL
+
+    def lookup(self, course):
+        info = self._lookup.get(course.id)
+        if info is not None and info[0] != course.image_url:
+            # The image changed; another process may have made the new variants already.
+            self.forget(course.id)
+            info = None
+        if info is None:
+            self.prime([course])
+            info = self._lookup.get(course.id)
+        if info is None or info[0] != course.image_url:
+            return None
+        return info
+
+    def forget(self, course_id):
+        with self._lock:
+            self._lookup.pop(course_id, None)
+            self._missing.pop(course_id, None)
+
+    def srcset(self, course, fmt='webp'):
+        info = self.lookup(course)
+        if info is None:
+            return ''
+        _, digest, widths = info
+        return ', '.join(f'{url_for("thumbnails.thumbnail", name=variant_name(digest, width, fmt))} {width}w'
+                         for width in widths)
+
+    def picture(self, course, sizes=DEFAULT_SIZES, alt=None):
+        alt = escape(alt if alt is not None else course.title)
+        info = self.lookup(course)
+        if info is None:
+            return Markup(f'<img src="{escape(course.image_url or "")}" alt="{alt}" loading="lazy">')
+        _, digest, widths = info
+        fallback = url_for('thumbnails.thumbnail', name=variant_name(digest, widths[0], 'jpeg'))
+        return Markup(
+            f'<picture><source type="image/webp" srcset="{self.srcset(course, "webp")}" sizes="{sizes}">'
+            f'<img src="{fallback}" srcset="{self.srcset(course, "jpeg")}" sizes="{sizes}" '
+            f'alt="{alt}" loading="lazy" decoding="async"></picture>')
+
+    def stats(self):
+        return {
+            'available': self.available,
+            'workers': self.workers,
+            'generated': self.generated,
+            'deduplicated': self.deduplicated,
+            'cached': self.cached,
+            'missing': self.missing,
+        }
+
+    def shutdown(self):
+        with self._pool_lock:
+            if self._pool is not None:
+                self._pool.shutdown()
+                self._pool = None
+
+def _split(widths):
+    return [int(width) for width in widths.split(',')]
+
+thumbnail_service = ThumbnailService()
+
+@job('course_thumbnails')
+def course_thumbnails(course_id):
+    thumbnail_service.forget(course_id)
+    thumbnail_service.generate(course_id)
+
+@thumbnails_bp.route('/thumbs/<name>')
+def thumbnail(name):
+    if not VARIANT_NAME.match(name):
+        abort(404)
+    response = send_from_directory(os.path.join(thumbnail_service.directory, name[:2]), name,
+                                   max_age=CACHE_MAX_AGE, conditional=True, etag=True)
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
\ No newline at end of file
@@ -0,0 +1,45 @@
+import threading
+import time
+from sqlalchemy import update
+from sqlalchemy.exc import IntegrityError
+from model import db, CacheVersion
+
+CHECK_INTERVAL = 2.0  # how long another process's change can go unnoticed
+
+class SharedVersion:
+    # A counter row in the database. Caches that live inside one process key
+    # themselves on it, so a change made by another worker, a job or the
+    # importer CLI reaches every process within CHECK_INTERVAL.
+    def __init__(self, name, check_interval=CHECK_INTERVAL):
+        self.name = name
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._value = None
+        self._checked = 0.0
+
+    def current(self):
+        now = time.monotonic()
+        with self._lock:
+            if self._value is not None and now - self._checked < self.check_interval:
+                return self._value
+        value = db.session.query(CacheVersion.version).filter_by(name=self.name).scalar() or 0
+        with self._lock:
+            self._value = value
+            self._checked = now
+        return value
+
+    def bump(self):
+        statement = (update(CacheVersion).where(CacheVersion.name == self.name)
+                     .values(version=CacheVersion.version + 1))
+        if not db.session.execute(statement).rowcount:
+            db.session.add(CacheVersion(name=self.name, version=1))
+            try:
+                db.session.commit()
+            except IntegrityError:
+                # Another process created the row first.
+                db.session.rollback()
+                db.session.execute(statement)
+        db.session.commit()
+        with self._lock:
+            self._value = None
+        return self.current()
\ No newline at end of file